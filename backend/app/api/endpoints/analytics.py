@@ -0,0 +1,36 @@
+from typing import Optional
+from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...db.base import get_read_db
+from ...services.comparison import ComparisonService
+from ...schemas.analytics import ComparisonResponse
+from ...schemas.test import CellType
+
+router = APIRouter()
+
+@router.get("/analytics/compare", response_model=ComparisonResponse)
+async def compare_banks(
+    cell_type: Optional[CellType] = None,
+    customer_name: Optional[str] = None,
+    start_from: Optional[datetime] = Query(None, description="Only tests starting on or after this time"),
+    start_to: Optional[datetime] = Query(None, description="Only tests starting before this time"),
+    bins: int = Query(20, ge=1, le=200),
+    low: float = Query(0.0, description="Lower edge of the voltage histogram"),
+    high: float = Query(2.0, description="Upper edge of the voltage histogram"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Compare voltage distributions per reading number across all matching banks."""
+    if high <= low:
+        raise HTTPException(status_code=400, detail="high must be greater than low")
+    service = ComparisonService(db)
+    return await service.compare(
+        cell_type=cell_type.value if cell_type else None,
+        customer_name=customer_name,
+        start_from=start_from,
+        start_to=start_to,
+        bins=bins,
+        low=low,
+        high=high,
+    )
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...db.base import get_read_db
+from ...services.change_feed import ChangeFeedService
+from ...schemas.changes import ChangesResponse
+
+router = APIRouter()
+
+@router.get("/changes", response_model=ChangesResponse)
+async def get_changes(
+    since: int = Query(0, ge=0, description="Cursor returned by the previous call; 0 for everything"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get tests, banks, cycles and readings inserted or updated after a cursor."""
+    service = ChangeFeedService(db)
+    return await service.changes_since(since, limit=limit)
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...db.base import get_read_db
+from ...services.dashboard import DashboardService
+from ...schemas.dashboard import DashboardSummaryResponse, ProgressResponse
+
+router = APIRouter()
+
+@router.get("/dashboard/summary", response_model=DashboardSummaryResponse)
+async def get_dashboard_summary(db: AsyncSession = Depends(get_read_db)):
+    """Get test counts by status, in-progress tests and readings per hour for the last day."""
+    service = DashboardService(db)
+    return await service.summary()
+
+@router.get("/dashboard/progress", response_model=ProgressResponse)
+async def get_dashboard_progress(
+    since: int = Query(0, ge=0, description="Cursor returned by the previous call; 0 for the latest readings"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get in-progress tests and statistics of the readings recorded since the last call."""
+    service = DashboardService(db)
+    return await service.progress(since)
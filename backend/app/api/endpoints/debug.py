@@ -0,0 +1,53 @@
+from enum import Enum
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+
+from ...core.config import settings
+from ...core.profiler import run_profile
+
+router = APIRouter()
+
+bearer = HTTPBearer(auto_error=False)
+
+class ProfileFormat(str, Enum):
+    COLLAPSED = "collapsed"
+    SPEEDSCOPE = "speedscope"
+
+def require_debug_token(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> dict:
+    """Accept a bearer JWT signed with SECRET_KEY whose scope includes "debug"."""
+    if credentials is None or not settings.SECRET_KEY:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    try:
+        claims = jwt.decode(credentials.credentials, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+    if "debug" not in str(claims.get("scope", "")).split():
+        raise HTTPException(status_code=403, detail="Token lacks the debug scope")
+    return claims
+
+@router.get("/debug/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=settings.PROFILER_MAX_SECONDS),
+    format: ProfileFormat = Query(ProfileFormat.COLLAPSED),
+    path: Optional[str] = Query(None, description="Only profile requests whose path starts with this"),
+    _: dict = Depends(require_debug_token),
+):
+    """Sample this worker's stacks for a number of seconds and return a flamegraph profile."""
+    try:
+        profiler = await run_profile(seconds, settings.PROFILER_INTERVAL_MS / 1000, path)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    name = f"profile {path or 'all'} {seconds:g}s"
+    if format == ProfileFormat.SPEEDSCOPE:
+        return JSONResponse(
+            profiler.speedscope(name),
+            headers={"Content-Disposition": 'attachment; filename="profile.speedscope.json"'},
+        )
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed.txt"'},
+    )
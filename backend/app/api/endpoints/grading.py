@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ...db.base import get_read_db
+from ...services.grading import GradingService
+from ...schemas.grading import GradingRequest, GradingResponse
+
+router = APIRouter()
+
+@router.post("/grading", response_model=GradingResponse)
+async def grade_cells(
+    request: GradingRequest,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Grade the cells of one or more banks and form matched groups for bank assembly."""
+    service = GradingService(db)
+    result = await service.grade(request)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Bank not found")
+    return result
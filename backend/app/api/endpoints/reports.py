@@ -0,0 +1,116 @@
+from pathlib import Path
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from uuid import UUID
+
+from ...core.compression import precompressed_file_response
+from ...db.base import get_read_db
+from ...db.models import Test, TestStatus
+from ..ranges import parse_range
+from ...services.reports import (
+    FINAL_ARTIFACTS, REPORT_FORMATS, ReportService, build_final_artifacts,
+    final_artifact_path, format_available, load_final_manifest, load_job,
+)
+from ...schemas.reports import FinalReportResponse, ReportCreate, ReportJobResponse
+
+router = APIRouter()
+
+# Artifact URLs carry the test version, so their content never changes
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+def _job_response(job: dict, request: Request) -> dict:
+    response = {key: value for key, value in job.items() if key != "artifact"}
+    if job["status"] == "completed":
+        response["download_url"] = str(request.url_for("download_report", job_id=job["id"]))
+    return response
+
+@router.post("/reports", response_model=ReportJobResponse, status_code=202)
+async def create_report(
+    report_data: ReportCreate,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Queue a report for background rendering."""
+    if not format_available(report_data.format.value):
+        raise HTTPException(status_code=400, detail=f"{report_data.format.value} reports are not available on this server")
+    cells = parse_range(report_data.cells, "cells") if report_data.cells else None
+    readings = parse_range(report_data.readings, "readings") if report_data.readings else None
+    service = ReportService(db)
+    job = await service.enqueue(report_data.test_id, report_data.bank_id, report_data.format.value, cells, readings)
+    if not job:
+        raise HTTPException(status_code=404, detail="Test not found")
+    return _job_response(job, request)
+
+@router.get("/reports/{job_id}", response_model=ReportJobResponse)
+async def get_report(job_id: UUID, request: Request):
+    """Get the status and progress of a report job."""
+    job = load_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    return _job_response(job, request)
+
+@router.get("/reports/{job_id}/download", name="download_report")
+async def download_report(job_id: UUID, request: Request):
+    """Download a finished report."""
+    job = load_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Report job not found")
+    if job["status"] != "completed" or not Path(job["artifact"]).exists():
+        raise HTTPException(status_code=409, detail="Report is not ready")
+    return precompressed_file_response(
+        request,
+        Path(job["artifact"]),
+        media_type=REPORT_FORMATS[job["format"]],
+        filename=Path(job["artifact"]).name,
+    )
+
+@router.get("/reports/final/{test_id}", response_model=FinalReportResponse)
+async def get_final_report(
+    test_id: UUID,
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """List the stored report artifacts of a completed test."""
+    test = await db.get(Test, test_id)
+    if not test:
+        raise HTTPException(status_code=404, detail="Test not found")
+    if test.status != TestStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail="Test is not completed")
+    version = await ReportService(db).test_version(test_id)
+    # Tests completed before artifacts existed are built on first request, from the primary
+    manifest = load_final_manifest(test_id, version) or await build_final_artifacts(test_id)
+    if manifest is None:
+        # Deleted on the primary since the replica was read
+        raise HTTPException(status_code=404, detail="Test not found")
+
+    def url(bank_id: str, artifact: str) -> str:
+        return str(request.url_for(
+            "get_final_artifact", test_id=test_id, version=manifest["version"], bank_id=bank_id, artifact=artifact
+        ))
+
+    response.headers["Cache-Control"] = "no-cache"
+    return {
+        "test_id": test_id,
+        "version": manifest["version"],
+        "created_at": manifest["created_at"],
+        "banks": [
+            {
+                **bank,
+                "report_url": url(bank["bank_id"], "report.csv"),
+                "statistics_url": url(bank["bank_id"], "statistics.json"),
+                "series_url": url(bank["bank_id"], "series.json"),
+            }
+            for bank in manifest["banks"]
+        ],
+    }
+
+@router.get("/reports/final/{test_id}/{version}/{bank_id}/{artifact}", name="get_final_artifact")
+async def get_final_artifact(test_id: UUID, version: str, bank_id: UUID, artifact: str, request: Request):
+    """Serve a stored artifact of a completed test."""
+    if artifact not in FINAL_ARTIFACTS or not version.isalnum():
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    path = final_artifact_path(test_id, version, bank_id, artifact)
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail="Artifact not found")
+    return precompressed_file_response(request, path, FINAL_ARTIFACTS[artifact], headers={"Cache-Control": IMMUTABLE_CACHE})
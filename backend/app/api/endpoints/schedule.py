@@ -0,0 +1,14 @@
+from typing import List
+from fastapi import APIRouter, Query
+
+from ...services.scheduler import scheduler
+from ...schemas.schedule import DueReadingResponse
+
+router = APIRouter()
+
+@router.get("/schedule/due", response_model=List[DueReadingResponse])
+async def get_due_readings(
+    horizon_minutes: int = Query(0, ge=0, description="Also include readings due within this many minutes")
+):
+    """List readings that are due and not yet taken, across all active tests."""
+    return scheduler.due(horizon=horizon_minutes * 60)
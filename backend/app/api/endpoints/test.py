@@ -1,22 +1,60 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List, Optional
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
-from ...db.base import get_db
+from ...core.compression import precompressed_file_response
+from ...core.config import settings
+from ...db.base import get_db, get_read_db
+from ...db.models import Test, TestStatus
+from ..ranges import Range, cell_range, reading_range
 from ...services.test_service import TestService
+from ...services.analysis import flag_names
+from ...services.ingest import decode_cell_values, validate_cell_values
+from ...services.capacity import CapacityService
+from ...services.series import SeriesService
+from ...services.reports import ReportService, schedule_final_artifacts
 from ...schemas.test import (
     TestCreate,
+    TestFullCreate,
     TestResponse,
     TestUpdate,
+    TestSummaryResponse,
+    TestListResponse,
     BankCreate,
     BankResponse,
     ReadingCreate,
-    ReadingResponse
+    ReadingResponse,
+    ReadingBatchCreate,
+    ReadingBatchResponse,
+    ReadingBatchStatus,
+    ReadingSummaryResponse,
+    BinaryEncoding,
+    CellAnomalyResponse,
+    BankCapacityResponse,
+    BankSeriesResponse,
+    CellSeriesResponse,
+    SeriesMethod,
+    LimitsResponse
 )
 
 router = APIRouter()
 
+@router.get("/limits", response_model=LimitsResponse)
+async def get_limits():
+    """Get the configured setup limits, the cell page size, the readings per cycle and the accepted cell voltages."""
+    return {
+        "max_banks_per_test": settings.MAX_BANKS_PER_TEST,
+        "max_cells_per_bank": settings.MAX_CELLS_PER_BANK,
+        "max_cycles_per_test": settings.MAX_CYCLES_PER_TEST,
+        "cell_page_size": settings.CELL_PAGE_SIZE,
+        "readings_per_cycle": settings.READINGS_PER_CYCLE,
+        "cell_voltage_min": settings.CELL_VOLTAGE_MIN,
+        "cell_voltage_max": settings.CELL_VOLTAGE_MAX,
+    }
+
 @router.post("/tests", response_model=TestResponse)
 async def create_test(
     test_data: TestCreate,
@@ -30,27 +68,65 @@ async def create_test(
         raise HTTPException(status_code=400, detail="Job number already exists")
     return await service.create_test(test_data)
 
-@router.get("/tests", response_model=List[TestResponse])
+@router.post("/tests/full", response_model=TestResponse)
+async def create_test_full(
+    test_data: TestFullCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """Create a test with its banks and cycles in one transaction."""
+    service = TestService(db)
+    # Check if job number already exists
+    existing_test = await service.get_test_by_job_number(test_data.job_number)
+    if existing_test:
+        raise HTTPException(status_code=400, detail="Job number already exists")
+    return await service.create_test_full(test_data)
+
+@router.get("/tests", response_model=List[TestListResponse])
 async def list_tests(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """List all tests with pagination."""
     service = TestService(db)
     return await service.list_tests(skip=skip, limit=limit)
 
+@router.get("/tests/search", response_model=List[TestSummaryResponse])
+async def search_tests(
+    q: str = Query(..., min_length=1, description="Part of a job number or customer name"),
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Search tests by job number or customer name for typeahead selectors."""
+    service = TestService(db)
+    return await service.search_tests(q, limit=limit)
+
 @router.get("/tests/{test_id}", response_model=TestResponse)
 async def get_test(
     test_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get a specific test by ID."""
-    service = TestService(db)
-    test = await service.get_test(test_id)
-    if not test:
+    """Get a specific test by ID; a completed test is served from its stored copy, others are streamed as read."""
+    stored = await ReportService(db).final_tree(test_id)
+    if stored:
+        path, version = stored
+        # The URL is not versioned, so clients revalidate against the data version
+        etag = f'"{version}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return precompressed_file_response(request, path, "application/json", headers=headers)
+
+    # Dependencies with yield are closed after the response is sent, so the session
+    # stays open while the body streams and is closed even if it never starts
+    body = await TestService(db).stream_test(test_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="Test not found")
-    return test
+    if (await db.get(Test, test_id)).status == TestStatus.COMPLETED:
+        # Completed before stored copies existed, or the copy is being built
+        schedule_final_artifacts([test_id])
+    return StreamingResponse(body, media_type="application/json")
 
 @router.patch("/tests/{test_id}", response_model=TestResponse)
 async def update_test(
@@ -73,23 +149,81 @@ async def create_bank(
     """Create a new bank for a test."""
     service = TestService(db)
     # Verify test exists
-    test = await service.get_test(bank_data.test_id)
-    if not test:
+    if not await service.test_exists(bank_data.test_id):
         raise HTTPException(status_code=404, detail="Test not found")
     return await service.create_bank(bank_data)
 
 @router.get("/banks/{bank_id}", response_model=BankResponse)
 async def get_bank(
     bank_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    cells: Range = Depends(cell_range),
+    readings: Optional[Range] = Depends(reading_range),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get a specific bank by ID."""
+    """Get a specific bank by ID, with the cell values of one page of cells."""
     service = TestService(db)
-    bank = await service.get_bank(bank_id)
+    bank = await service.get_bank(bank_id, cells, readings)
     if not bank:
         raise HTTPException(status_code=404, detail="Bank not found")
     return bank
 
+@router.get("/banks/{bank_id}/anomalies", response_model=List[CellAnomalyResponse])
+async def get_bank_anomalies(
+    bank_id: UUID,
+    reading_id: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the cells flagged as weak, fast-dropping, reversed or dead for a bank."""
+    service = TestService(db)
+    if not await service.bank_exists(bank_id):
+        raise HTTPException(status_code=404, detail="Bank not found")
+    rows = await service.get_bank_anomalies(bank_id, reading_id)
+    return [
+        {**row._mapping, "flag_names": flag_names(row.flags)}
+        for row in rows
+    ]
+
+@router.get("/banks/{bank_id}/capacity", response_model=BankCapacityResponse)
+async def get_bank_capacity(
+    bank_id: UUID,
+    cutoff_voltage: Optional[float] = Query(None, gt=0, description="End-of-discharge voltage, defaults to CUTOFF_VOLTAGE"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get per-cell delivered capacity, time to cutoff and capacity trend for a bank."""
+    bank = await TestService(db).get_bank_row(bank_id)
+    if not bank:
+        raise HTTPException(status_code=404, detail="Bank not found")
+    return await CapacityService(db).get_bank_capacity(bank, cutoff_voltage)
+
+@router.get("/banks/{bank_id}/series", response_model=BankSeriesResponse)
+async def get_bank_series(
+    bank_id: UUID,
+    cells: Range = Depends(cell_range),
+    points: int = Query(500, ge=10, le=5000, description="Approximate points per cell"),
+    method: SeriesMethod = Query(SeriesMethod.LTTB),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get downsampled voltage-over-time series for a range of cells."""
+    service = TestService(db)
+    if not await service.bank_exists(bank_id):
+        raise HTTPException(status_code=404, detail="Bank not found")
+    series = await SeriesService(db).get_cell_series(bank_id, cells, points, method.value)
+    return {"bank_id": bank_id, "method": method, "cells": series}
+
+@router.get("/banks/{bank_id}/cells/{cell_number}/series", response_model=CellSeriesResponse)
+async def get_cell_series(
+    bank_id: UUID,
+    cell_number: int,
+    points: int = Query(500, ge=10, le=5000, description="Approximate number of points"),
+    method: SeriesMethod = Query(SeriesMethod.LTTB),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get the downsampled voltage-over-time series of one cell."""
+    series = await SeriesService(db).get_single_cell_series(bank_id, cell_number, points, method.value)
+    if not series:
+        raise HTTPException(status_code=404, detail="No readings found for this cell")
+    return series
+
 @router.post("/readings", response_model=ReadingResponse)
 async def create_reading(
     reading_data: ReadingCreate,
@@ -98,20 +232,100 @@ async def create_reading(
     """Create a new reading for a cycle."""
     service = TestService(db)
     # Verify cycle exists
-    cycle = await service.get_cycle(reading_data.cycle_id)
-    if not cycle:
+    number_of_cells = await service.get_cycle_cell_count(reading_data.cycle_id)
+    if number_of_cells is None:
+        raise HTTPException(status_code=404, detail="Cycle not found")
+    error = validate_cell_values(np.asarray(reading_data.cell_values, dtype=np.float64), number_of_cells)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+    try:
+        reading, _ = await service.create_reading_once(reading_data)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return reading
+
+@router.post("/readings/batch", response_model=ReadingBatchResponse)
+async def create_readings_batch(
+    batch: ReadingBatchCreate,
+    db: AsyncSession = Depends(get_db)
+):
+    """Create several readings, each at most once per idempotency key; failures do not stop the rest."""
+    service = TestService(db)
+    results = []
+    for reading_data in batch.readings:
+        result = {"idempotency_key": reading_data.idempotency_key}
+        number_of_cells = await service.get_cycle_cell_count(reading_data.cycle_id)
+        error = "Cycle not found" if number_of_cells is None else validate_cell_values(
+            np.asarray(reading_data.cell_values, dtype=np.float64), number_of_cells
+        )
+        if error:
+            results.append({**result, "status": ReadingBatchStatus.REJECTED, "detail": error})
+            continue
+        try:
+            reading, created = await service.create_reading_once(reading_data)
+        except ValueError as e:
+            results.append({**result, "status": ReadingBatchStatus.REJECTED, "detail": str(e)})
+            continue
+        results.append({
+            **result,
+            "status": ReadingBatchStatus.CREATED if created else ReadingBatchStatus.DUPLICATE,
+            "reading_id": reading.id,
+            "flagged_cells": [value.cell_number for value in reading.cell_values if value.flags],
+        })
+    return {"results": results}
+
+@router.post(
+    "/readings/binary",
+    response_model=ReadingSummaryResponse,
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}},
+    }},
+)
+async def create_reading_binary(
+    request: Request,
+    cycle_id: UUID = Query(...),
+    reading_number: int = Query(..., ge=1),
+    is_ocv: bool = Query(...),
+    encoding: BinaryEncoding = Query(BinaryEncoding.FLOAT32, description="float32 volts or int16 millivolts, little-endian"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Create a reading from a packed array of cell values, one per cell in cell order."""
+    service = TestService(db)
+    number_of_cells = await service.get_cycle_cell_count(cycle_id)
+    if number_of_cells is None:
         raise HTTPException(status_code=404, detail="Cycle not found")
-    return await service.create_reading(reading_data, reading_data.cycle_id)
+    try:
+        values = decode_cell_values(await request.body(), encoding.value)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    error = validate_cell_values(values, number_of_cells)
+    if error:
+        raise HTTPException(status_code=422, detail=error)
+    try:
+        reading, flags = await service.create_reading_values(cycle_id, reading_number, is_ocv, values)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {
+        "id": reading.id,
+        "cycle_id": cycle_id,
+        "reading_number": reading_number,
+        "is_ocv": is_ocv,
+        "timestamp": reading.timestamp,
+        "cell_count": int(values.size),
+        "flagged_cells": (np.flatnonzero(flags) + 1).tolist(),
+    }
 
 @router.get("/readings/cycle/{cycle_id}", response_model=List[ReadingResponse])
 async def get_cycle_readings(
     cycle_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    cells: Range = Depends(cell_range),
+    readings: Optional[Range] = Depends(reading_range),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get all readings for a specific cycle."""
+    """Get the readings for a specific cycle, with the cell values of one page of cells."""
     service = TestService(db)
     # Verify cycle exists
-    cycle = await service.get_cycle(cycle_id)
-    if not cycle:
+    if not await service.cycle_exists(cycle_id):
         raise HTTPException(status_code=404, detail="Cycle not found")
-    return await service.get_readings_by_cycle(cycle_id) 
\ No newline at end of file
+    return await service.get_readings_by_cycle(cycle_id, cells, readings) 
\ No newline at end of file
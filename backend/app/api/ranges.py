@@ -0,0 +1,35 @@
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Query
+
+from ..core.config import settings
+
+Range = Tuple[int, int]
+
+def parse_range(value: str, name: str) -> Range:
+    """Parse an inclusive range such as `1-500` (or a single number)."""
+    first, separator, last = value.partition("-")
+    try:
+        start = int(first)
+        end = int(last) if separator else start
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name} must be a range like 1-500")
+    if start < 1 or end < start:
+        raise HTTPException(status_code=400, detail=f"{name} must be an increasing range starting at 1")
+    return start, end
+
+def cell_range(
+    cells: Optional[str] = Query(None, description="Inclusive cell numbers such as 1-500; defaults to the first page")
+) -> Range:
+    """Cells to return, at most CELL_PAGE_SIZE so responses for large banks stay bounded."""
+    if cells is None:
+        return 1, settings.CELL_PAGE_SIZE
+    start, end = parse_range(cells, "cells")
+    if end - start + 1 > settings.CELL_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {settings.CELL_PAGE_SIZE} cells can be requested at once")
+    return start, end
+
+def reading_range(
+    readings: Optional[str] = Query(None, description="Inclusive reading numbers such as 2-5")
+) -> Optional[Range]:
+    return parse_range(readings, "readings") if readings else None
@@ -0,0 +1,185 @@
+import asyncio
+import math
+import time
+from typing import Collection, Dict, Optional, Tuple
+
+from jose import JWTError, jwt
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+INGEST, INTERACTIVE, EXPORT = "ingest", "interactive", "export"
+
+def classify(method: str, path: str) -> str:
+    """Budget a request is admitted under."""
+    if "/reports" in path or path.endswith(("/series", "/grading")):
+        return EXPORT
+    if method in ("POST", "PUT", "PATCH", "DELETE"):
+        return INGEST
+    return INTERACTIVE
+
+class AdmissionGate:
+    """Concurrency limit with a bounded wait queue for one class of requests."""
+
+    def __init__(self, concurrency: int, queue_depth: int, queue_timeout: float):
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting in the queue if needed; False when the queue is full or the wait times out."""
+        if self.in_flight >= self.concurrency and self.waiting >= self.queue_depth:
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+class TokenBuckets:
+    """Per-client token buckets; each request takes one token."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, key: str) -> float:
+        """Take a token; returns 0 if allowed, else seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[key] = (tokens - 1, now)
+        if len(self._buckets) > 10000:
+            # Forget clients whose bucket has refilled completely
+            self._buckets = {
+                k: (t, at) for k, (t, at) in self._buckets.items()
+                if t + (now - at) * self.rate < self.burst
+            }
+        return 0.0
+
+class ClientIdentity:
+    """Rate-limit key of a caller, built only from what the caller cannot choose.
+
+    A bearer token signed with the server key identifies its subject. Otherwise the
+    caller is its address: the peer, or the address a trusted proxy forwarded. A
+    trusted proxy calling on its own behalf, such as the Streamlit frontend, may
+    split its bucket per user session with X-Client-Id.
+    """
+
+    def __init__(self, trusted_proxies: Collection[str], token_key: str = "", token_algorithm: str = "HS256"):
+        self.trusted_proxies = set(trusted_proxies)
+        self.token_key = token_key
+        self.token_algorithm = token_algorithm
+
+    def _subject(self, authorization: str) -> Optional[str]:
+        scheme, _, token = authorization.partition(" ")
+        if not self.token_key or scheme.lower() != "bearer" or not token:
+            return None
+        try:
+            subject = jwt.decode(token, self.token_key, algorithms=[self.token_algorithm]).get("sub")
+        except JWTError:
+            return None
+        return str(subject) if subject else None
+
+    def key(self, request: Request) -> str:
+        subject = self._subject(request.headers.get("authorization", ""))
+        if subject:
+            return f"sub:{subject}"
+        peer = request.client.host if request.client else ""
+        if peer not in self.trusted_proxies:
+            return peer
+        forwarded = [address.strip() for address in request.headers.get("x-forwarded-for", "").split(",") if address.strip()]
+        if forwarded:
+            # The rightmost address not added by one of our own proxies is the client
+            untrusted = [address for address in forwarded if address not in self.trusted_proxies]
+            return untrusted[-1] if untrusted else forwarded[0]
+        session = request.headers.get("x-client-id")
+        return f"{peer}/{session}" if session else peer
+
+class AdmissionMiddleware:
+    """Admission control for API requests.
+
+    Ingest, interactive reads and exports each get their own concurrency budget so
+    a burst of one kind cannot take every database connection. Requests beyond a
+    budget wait in a bounded queue; past the queue depth or wait timeout they are
+    rejected with 429 and Retry-After, as are clients that exceed their token bucket.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        path_prefix: str,
+        budgets: Dict[str, int],
+        queue_depth: int,
+        queue_timeout: float,
+        client_rate: float,
+        client_burst: int,
+        identity: Optional[ClientIdentity] = None,
+        retry_after: int = 1,
+        metrics: bool = False,
+    ):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.gates = {name: AdmissionGate(limit, queue_depth, queue_timeout) for name, limit in budgets.items()}
+        self.buckets = TokenBuckets(client_rate, client_burst) if client_rate > 0 else None
+        self.identity = identity or ClientIdentity(())
+        self.retry_after = retry_after
+        self.rejections: Optional[object] = None
+        if metrics:
+            # Imported here so the client library is not loaded when metrics are disabled
+            from prometheus_client import Counter, Gauge
+
+            self.rejections = Counter(
+                "admission_rejections_total", "Requests rejected by admission control", ["budget", "reason"]
+            )
+            queued = Gauge("admission_queue_depth", "Requests waiting for a slot", ["budget"])
+            in_flight = Gauge("admission_in_flight", "Requests being served", ["budget"])
+            for name, gate in self.gates.items():
+                queued.labels(name).set_function(lambda gate=gate: gate.waiting)
+                in_flight.labels(name).set_function(lambda gate=gate: gate.in_flight)
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send, budget: str, reason: str, retry_after: float) -> None:
+        if self.rejections is not None:
+            self.rejections.labels(budget, reason).inc()
+        response = JSONResponse(
+            status_code=429,
+            content={"detail": "Server is busy, retry later" if reason == "queue" else "Too many requests"},
+            headers={"Retry-After": str(max(math.ceil(retry_after), 1))},
+        )
+        await response(scope, receive, send)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        budget = classify(scope["method"], scope["path"])
+
+        if self.buckets is not None:
+            wait = self.buckets.take(self.identity.key(Request(scope)))
+            if wait:
+                await self._reject(scope, receive, send, budget, "rate", wait)
+                return
+
+        gate = self.gates[budget]
+        if not await gate.acquire():
+            await self._reject(scope, receive, send, budget, "queue", self.retry_after)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            gate.release()
@@ -0,0 +1,240 @@
+import gzip
+import hashlib
+import os
+import uuid
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import FileResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml", "image/svg+xml")
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+def _brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=5)
+
+def _zstd(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+# Preferred first when the client accepts several with equal weight
+CODECS: Dict[str, Callable[[bytes], bytes]] = {}
+if zstandard is not None:
+    CODECS["zstd"] = _zstd
+if brotli is not None:
+    CODECS["br"] = _brotli
+CODECS["gzip"] = _gzip
+
+# File suffix of each codec's precompressed sibling
+SUFFIXES = {"zstd": ".zst", "br": ".br", "gzip": ".gz"}
+
+def negotiate(accept_encoding: str, supported=CODECS) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header."""
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+    candidates = [
+        (weights.get(name, weights.get("*", 0.0)), -index, name)
+        for index, name in enumerate(supported)
+    ]
+    quality, _, name = max(candidates)
+    return name if quality > 0 else None
+
+def precompress(path: Path) -> None:
+    """Write a compressed sibling of a file for every available codec.
+
+    Meant for files that never change once written, so each is compressed once at
+    render time instead of on every download.
+    """
+    data = path.read_bytes()
+    for name, codec in CODECS.items():
+        sibling = path.with_name(path.name + SUFFIXES[name])
+        tmp = path.with_name(f".{sibling.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_bytes(codec(data))
+        os.replace(tmp, sibling)
+
+def precompressed_variant(path: Path, accept_encoding: str) -> Tuple[Path, Optional[str]]:
+    """The best precompressed sibling of a file the client accepts, else the file itself."""
+    available = [name for name in CODECS if path.with_name(path.name + SUFFIXES[name]).is_file()]
+    encoding = negotiate(accept_encoding, available) if available else None
+    if encoding is None:
+        return path, None
+    return path.with_name(path.name + SUFFIXES[encoding]), encoding
+
+def precompressed_file_response(request: Request, path: Path, media_type: str, **kwargs) -> FileResponse:
+    """Serve a file, or the precompressed sibling of it that the client accepts."""
+    served, encoding = precompressed_variant(path, request.headers.get("accept-encoding", ""))
+    headers = {**kwargs.pop("headers", {}), "Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(served, media_type=media_type, headers=headers, **kwargs)
+
+class CompressedCache:
+    """LRU of compressed bodies keyed by (encoding, body digest), bounded in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: "OrderedDict[Tuple[str, bytes], bytes]" = OrderedDict()
+
+    def get(self, key: Tuple[str, bytes]) -> Optional[bytes]:
+        value = self._entries.get(key)
+        if value is not None:
+            self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Tuple[str, bytes], value: bytes) -> None:
+        if len(value) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = value
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+class CompressionMiddleware:
+    """Negotiated zstd/Brotli/gzip compression.
+
+    Bodies are compressed in a worker thread so large responses do not block the event
+    loop, and compressed GET 200 bodies are cached by content digest so an unchanged
+    payload is served without recompressing. Streamed bodies are never collected, so
+    a streaming endpoint keeps its bounded memory; they are compressed incrementally
+    with gzip and not cached.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1000, cache_bytes: int = 64 * 1024 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cache = CompressedCache(cache_bytes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        encoding = negotiate(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(
+            self, encoding,
+            cacheable=scope["method"] == "GET",
+            stream_gzip=negotiate(accept_encoding, ("gzip",)) is not None,
+        )
+        await self.app(scope, receive, responder.wrap(send))
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, cacheable: bool, stream_gzip: bool):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.cacheable = cacheable
+        self.stream_gzip = stream_gzip
+        self.start_message: Optional[Message] = None
+        self.skip = False
+        self.streaming = None
+
+    def wrap(self, send: Send) -> Send:
+        async def wrapped(message: Message) -> None:
+            await self.send(message, send)
+        return wrapped
+
+    async def send(self, message: Message, send: Send) -> None:
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            self.skip = (
+                "content-encoding" in headers
+                or "content-range" in headers
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            )
+            self.cacheable = self.cacheable and message["status"] == 200
+            self.start_message = message
+            if self.skip:
+                await send(message)
+            return
+        if message["type"] != "http.response.body" or self.skip:
+            if not self.skip and self.streaming is None:
+                # e.g. http.response.pathsend: pass the response through untouched
+                self.skip = True
+                await send(self.start_message)
+            await send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.streaming is None and not more_body:
+            await self._send_whole(body, send)
+            return
+
+        if self.stream_gzip:
+            await self._send_chunk(body, more_body, send)
+        else:
+            # The client does not take gzip, the only streaming codec; send as is
+            self.skip = True
+            await send(self.start_message)
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+    async def _send_whole(self, body: bytes, send: Send) -> None:
+        if len(body) < self.middleware.minimum_size:
+            await send(self.start_message)
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        compressed = None
+        key = None
+        if self.cacheable:
+            key = (self.encoding, hashlib.blake2b(body, digest_size=16).digest())
+            compressed = self.middleware.cache.get(key)
+        if compressed is None:
+            compressed = await anyio.to_thread.run_sync(CODECS[self.encoding], body)
+            if key is not None:
+                self.middleware.cache.put(key, compressed)
+
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(compressed))
+        headers.add_vary_header("Accept-Encoding")
+        await send(self.start_message)
+        await send({"type": "http.response.body", "body": compressed})
+
+    async def _send_chunk(self, body: bytes, more_body: bool, send: Send) -> None:
+        if self.streaming is None:
+            # wbits 31 produces a gzip container
+            self.streaming = zlib.compressobj(6, zlib.DEFLATED, 31)
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            headers["Content-Encoding"] = "gzip"
+            headers.add_vary_header("Accept-Encoding")
+            del headers["Content-Length"]
+            await send(self.start_message)
+        chunk = self.streaming.compress(body)
+        if not more_body:
+            chunk += self.streaming.flush()
+        elif chunk:
+            chunk += self.streaming.flush(zlib.Z_SYNC_FLUSH)
+        await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
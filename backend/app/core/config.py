@@ -1,10 +1,11 @@
 from typing import List
+from pathlib import Path
 from pydantic_settings import BaseSettings
 from pydantic import AnyHttpUrl, validator
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+# The .env file lives at the repository root; pydantic-settings reads it directly
+ENV_FILE = Path(__file__).resolve().parents[3] / ".env"
 
 class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
@@ -21,8 +22,37 @@ class Settings(BaseSettings):
             return v
         raise ValueError(v)
 
-    # Database
+    # Database: a postgresql+asyncpg URL, or sqlite+aiosqlite for an embedded database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "")
+    DATABASE_ECHO: bool = False  # log every SQL statement
+    # Server-wide budgets, split evenly across the WEB_CONCURRENCY worker processes
+    DATABASE_POOL_SIZE: int = 20
+    DATABASE_MAX_OVERFLOW: int = 10
+    WEB_CONCURRENCY: int = 1  # backend worker processes, set by scripts/run.py
+
+    def per_worker(self, total: int) -> int:
+        """Share of a server-wide budget for one worker process.
+
+        At least one, so a budget smaller than WEB_CONCURRENCY admits one per worker.
+        """
+        return max(total // max(self.WEB_CONCURRENCY, 1), 1)
+
+    def per_worker_rate(self, total: float) -> float:
+        """Share of a server-wide rate for one worker process."""
+        return total / max(self.WEB_CONCURRENCY, 1)
+
+    # Read replicas, a comma-separated list of URLs (empty means primary only)
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "")
+    # Seconds a client keeps reading from the primary after it writes
+    READ_YOUR_WRITES_SECONDS: float = 5.0
+    # Seconds an unreachable replica is skipped before it is tried again
+    REPLICA_RETRY_SECONDS: float = 30.0
+    REPLICA_CONNECT_TIMEOUT: float = 3.0  # seconds to open a replica connection
+    REPLICA_STATEMENT_TIMEOUT: float = 30.0  # seconds a replica query may run
+
+    @property
+    def database_read_urls(self) -> List[str]:
+        return [url.strip() for url in self.DATABASE_READ_URL.split(",") if url.strip()]
     
     # Supabase
     SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
@@ -37,7 +67,83 @@ class Settings(BaseSettings):
     # Monitoring
     ENABLE_METRICS: bool = True
 
+    # On-demand sampling profiler at /debug/profile, for bearer tokens signed with
+    # SECRET_KEY that carry the "debug" scope; profiles the worker serving the call
+    PROFILER_ENABLED: bool = False
+    PROFILER_MAX_SECONDS: int = 60
+    PROFILER_INTERVAL_MS: float = 5.0
+
+    # Response compression
+    COMPRESSION_MIN_SIZE: int = 1000
+    COMPRESSION_CACHE_MB: int = 64  # compressed bodies kept per worker
+
+    # Startup warm-up of the connection pool and OpenAPI schema
+    WARMUP_ON_STARTUP: bool = True
+
+    # Admission control: concurrent API requests per budget across all workers (together
+    # within the database pool), then a bounded wait queue, then 429 with Retry-After.
+    # Budgets, client rate and burst are split across workers; each worker keeps at
+    # least one slot per budget and one token of burst, so budgets below
+    # WEB_CONCURRENCY are exceeded, and a client on one keep-alive connection gets
+    # only its worker's share of the rate
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_INGEST_CONCURRENCY: int = 8
+    ADMISSION_INTERACTIVE_CONCURRENCY: int = 5
+    ADMISSION_EXPORT_CONCURRENCY: int = 2
+    ADMISSION_QUEUE_DEPTH: int = 50  # waiting requests per budget and worker
+    ADMISSION_QUEUE_TIMEOUT: float = 10.0  # seconds a request may wait for a slot
+    ADMISSION_CLIENT_RATE: float = 20.0  # requests per second per client across all workers, 0 disables
+    ADMISSION_CLIENT_BURST: int = 40
+    # Comma-separated peer addresses whose X-Forwarded-For is believed and whose own
+    # requests may carry a per-session X-Client-Id (the frontend runs on this host)
+    TRUSTED_PROXIES: str = "127.0.0.1,::1"
+
+    @property
+    def trusted_proxies(self) -> List[str]:
+        return [address.strip() for address in self.TRUSTED_PROXIES.split(",") if address.strip()]
+
+    # Scale limits for test setup, and the cell page served when no range is requested
+    MAX_BANKS_PER_TEST: int = 2  # highest accepted bank number
+    MAX_CELLS_PER_BANK: int = 200
+    MAX_CYCLES_PER_TEST: int = 5
+    CELL_PAGE_SIZE: int = 500
+
+    # Streaming reads of whole test trees
+    STREAM_YIELD_PER: int = 2000  # rows fetched per round trip
+    STREAM_CHUNK_BYTES: int = 64 * 1024  # JSON buffered before a chunk is sent
+
+    # Cycle scheduler
+    SCHEDULER_ENABLED: bool = True
+    READINGS_PER_CYCLE: int = 5  # OCV followed by CCV readings, one per time_interval
+    SCHEDULER_RESYNC_SECONDS: float = 60.0  # reloads tests, cycles and readings written by other workers
+
+    # Accepted cell voltages at ingest, also enforced by the Readings page through GET /limits;
+    # zero means a cell was not measured
+    CELL_VOLTAGE_MIN: float = 0.0  # lower it to accept reversed cells
+    CELL_VOLTAGE_MAX: float = 10.0
+
+    # Cell anomaly detection at ingest
+    ANOMALY_Z_THRESHOLD: float = 3.0
+    ANOMALY_MAD_THRESHOLD: float = 3.5
+    ANOMALY_DROP_THRESHOLD: float = 3.0  # robust z-score of the per-cell voltage drop
+    DEAD_CELL_VOLTAGE: float = 0.1
+
+    # Capacity analytics
+    CUTOFF_VOLTAGE: float = 1.0  # end-of-discharge voltage per cell
+    CAPACITY_CACHE_SIZE: int = 256  # banks kept in the per-worker analytics cache
+    ANALYTICS_CACHE_SECONDS: float = 300.0  # lifetime of cached comparison results
+    ANALYTICS_CACHE_SIZE: int = 128  # comparison results kept per worker
+    DASHBOARD_CACHE_SECONDS: float = 15.0  # lifetime of the cached dashboard summary
+
+    # Background report rendering
+    REPORTS_DIR: str = str(ENV_FILE.parent / "report_cache")
+    REPORT_WORKERS: int = max((os.cpu_count() or 2) // 2, 1)  # across all backend workers
+    REPORT_JOB_TIMEOUT_SECONDS: float = 600.0  # an unfinished job without progress for this long is failed
+    FINAL_SERIES_POINTS: int = 500  # points per cell in the chart series stored for completed tests
+
     class Config:
         case_sensitive = True
+        env_file = ENV_FILE
+        extra = "ignore"
 
 settings = Settings() 
\ No newline at end of file
@@ -0,0 +1,150 @@
+import asyncio
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+Frame = Tuple[str, str, int]
+
+# The profile currently running in this worker, if any
+_active: Optional["SamplingProfiler"] = None
+
+def _frame_key(frame) -> Frame:
+    code = frame.f_code
+    return getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno
+
+def _walk(frame, max_depth: int = 256) -> List[Frame]:
+    """Frames of a stack, outermost first."""
+    stack = []
+    while frame is not None and len(stack) < max_depth:
+        stack.append(_frame_key(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+def _route_label(scope: Scope) -> str:
+    # The router stores the matched route in the scope, giving one root per endpoint
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+class SamplingProfiler:
+    """Samples thread stacks from a background thread at a fixed interval.
+
+    Stacks sampled on the event loop thread are rooted at the asyncio task running at
+    that moment, labelled with its request's route when the task serves one, so time
+    spent by different requests interleaved on the loop stays apart. With a path
+    prefix only loop samples taken while a matching request runs are kept.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, interval: float, path_prefix: Optional[str] = None):
+        self.loop = loop
+        self.interval = interval
+        self.path_prefix = path_prefix
+        self.loop_thread = threading.get_ident()
+        # Request tasks in flight, mapped to their scope
+        self.requests: Dict[asyncio.Task, Scope] = {}
+        self.samples: List[Tuple[List[Frame], float]] = []
+        self.started = self.stopped = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def matches(self, path: str) -> bool:
+        return self.path_prefix is None or path.startswith(self.path_prefix)
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.perf_counter()
+
+    def _task_root(self) -> Optional[Frame]:
+        task = asyncio.current_task(self.loop)
+        scope = self.requests.get(task) if task is not None else None
+        if scope is not None:
+            return _route_label(scope), "<request>", 0
+        if self.path_prefix is not None:
+            return None
+        return (f"task {task.get_name()}" if task is not None else "event loop"), "<task>", 0
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                if thread_id == self.loop_thread:
+                    root = self._task_root()
+                    if root is None:
+                        continue
+                    self.samples.append(([root] + _walk(frame), weight))
+                elif self.path_prefix is None:
+                    self.samples.append(([(f"thread {names.get(thread_id, thread_id)}", "<thread>", 0)] + _walk(frame), weight))
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed stack format, as read by flamegraph.pl and speedscope."""
+        counts = Counter(";".join(name.replace(";", ":") for name, _, _ in stack) for stack, _ in self.samples)
+        return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+    def speedscope(self, name: str) -> dict:
+        """Sampled profile in the speedscope file format, weighted in seconds."""
+        frames: Dict[Frame, int] = {}
+        samples = [[frames.setdefault(frame, len(frames)) for frame in stack] for stack, _ in self.samples]
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": name,
+            "exporter": "battery-test-api",
+            "activeProfileIndex": 0,
+            "shared": {"frames": [{"name": n, "file": f, "line": line} for n, f, line in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.stopped - self.started,
+                "samples": samples,
+                "weights": [weight for _, weight in self.samples],
+            }],
+        }
+
+async def run_profile(seconds: float, interval: float, path_prefix: Optional[str] = None) -> SamplingProfiler:
+    """Profile this worker for `seconds`; raises RuntimeError if a profile is already running."""
+    global _active
+    if _active is not None:
+        raise RuntimeError("A profile is already running")
+    profiler = SamplingProfiler(asyncio.get_running_loop(), interval, path_prefix)
+    _active = profiler
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+        _active = None
+    return profiler
+
+class ProfilerMiddleware:
+    """Tags request tasks with their scope while a profile runs; a no-op otherwise."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        profiler = _active
+        if scope["type"] != "http" or profiler is None or not profiler.matches(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        profiler.requests[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.requests.pop(task, None)
@@ -1,18 +1,53 @@
+import asyncio
+import itertools
+import time
+from typing import List, Optional
+
+from fastapi import Request
+from sqlalchemy import event, make_url, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession
+from sqlalchemy.pool import QueuePool, StaticPool
 
 from ..core.config import settings
 
+def is_sqlite(url: str) -> bool:
+    return make_url(url).get_backend_name() == "sqlite"
+
+def engine_options(url: str) -> dict:
+    """Pool settings for a database URL.
+
+    An in-memory SQLite database lives in a single connection, so every session
+    has to share it.
+    """
+    if not is_sqlite(url):
+        return {
+            "pool_size": settings.per_worker(settings.DATABASE_POOL_SIZE),
+            "max_overflow": settings.per_worker(settings.DATABASE_MAX_OVERFLOW),
+        }
+    if make_url(url).database in (None, "", ":memory:"):
+        return {"poolclass": StaticPool}
+    return {}
+
+def make_engine(url: str, **kwargs) -> AsyncEngine:
+    """Create an async engine for Postgres or an embedded SQLite database."""
+    new_engine = create_async_engine(url, **engine_options(url), **kwargs)
+    if is_sqlite(url):
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def configure_sqlite(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA foreign_keys=ON")
+            # WAL lets readers proceed while a worker writes
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute("PRAGMA busy_timeout=5000")
+            cursor.close()
+    return new_engine
+
 # Create async engine
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    poolclass=QueuePool,
-    pool_size=5,
-    max_overflow=10,
-    echo=True,
-)
+engine = make_engine(settings.DATABASE_URL, echo=settings.DATABASE_ECHO)
 
 # Create async session factory
 AsyncSessionLocal = sessionmaker(
@@ -21,11 +56,124 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 
+def replica_connect_args(url: str) -> dict:
+    """Timeouts so a replica that hangs fails fast and is marked down instead of stalling reads."""
+    if is_sqlite(url):
+        return {}
+    return {
+        "timeout": settings.REPLICA_CONNECT_TIMEOUT,
+        "command_timeout": settings.REPLICA_STATEMENT_TIMEOUT,
+    }
+
+# Create read replica engines and session factories
+read_engines = [
+    make_engine(url, pool_pre_ping=True, connect_args=replica_connect_args(url))
+    for url in settings.database_read_urls
+]
+ReadSessionFactories = [
+    sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+    for read_engine in read_engines
+]
+
 # Create declarative base
 Base = declarative_base()
 
+async def warm_up_pool(connections: int = 5) -> None:
+    """Open pooled connections up front so the first requests skip the handshake."""
+    async def touch(target_engine):
+        async with target_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    async def fill(target_engine):
+        # Hold the connections concurrently, otherwise the pool reuses a single one
+        count = connections if isinstance(target_engine.pool, QueuePool) else 1
+        await asyncio.gather(*(touch(target_engine) for _ in range(count)), return_exceptions=True)
+
+    await asyncio.gather(*(fill(target_engine) for target_engine in [engine, *read_engines]))
+
+# Pin issued after a write, echoed back as a cookie or header so any worker can honour it
+PIN_COOKIE = "read_primary_until"
+PIN_HEADER = "X-Read-Primary-Until"
+
+class ReplicaRouter:
+    """Round-robin replica selection with primary fallback."""
+
+    def __init__(self, factories: List[sessionmaker], retry_seconds: float):
+        self.factories = factories
+        self.retry_seconds = retry_seconds
+        self._next = itertools.count()
+        self._down_until: List[float] = [0.0] * len(factories)
+
+    async def open_replica_session(self) -> Optional[AsyncSession]:
+        """Open a session on the next healthy replica, or None if none is usable."""
+        if not self.factories:
+            return None
+        start = next(self._next)
+        now = time.monotonic()
+        for offset in range(len(self.factories)):
+            index = (start + offset) % len(self.factories)
+            if self._down_until[index] > now:
+                continue
+            session = self.factories[index]()
+            try:
+                await session.connection()
+                return session
+            except (DBAPIError, OSError, asyncio.TimeoutError):
+                await session.close()
+                self._down_until[index] = time.monotonic() + self.retry_seconds
+        return None
+
+replica_router = ReplicaRouter(ReadSessionFactories, retry_seconds=settings.REPLICA_RETRY_SECONDS)
+
+def is_pinned(request: Request) -> bool:
+    """Whether the caller wrote recently enough that it must read from the primary."""
+    value = request.cookies.get(PIN_COOKIE) or request.headers.get(PIN_HEADER)
+    try:
+        return value is not None and float(value) > time.time()
+    except ValueError:
+        return False
+
+class ReadYourWritesMiddleware:
+    """Send a primary pin with every successful write.
+
+    The pin is the wall-clock time until which the client reads from the primary,
+    set as a cookie and a response header. Clients that keep cookies, or echo the
+    header, read their own writes whichever worker serves the next request.
+    """
+
+    def __init__(self, app, pin_seconds: float):
+        self.app = app
+        self.pin_seconds = pin_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message):
+            if (
+                message["type"] == "http.response.start"
+                and message["status"] < 400
+                and scope.get("state", {}).get("wrote")
+            ):
+                until = f"{time.time() + self.pin_seconds:.3f}"
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (PIN_HEADER.lower().encode(), until.encode()),
+                    (
+                        b"set-cookie",
+                        f"{PIN_COOKIE}={until}; Max-Age={int(self.pin_seconds) + 1}; Path=/; HttpOnly; SameSite=Lax".encode(),
+                    ),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
+
 # Dependency to get DB session
-async def get_db() -> AsyncSession:
+async def get_db(request: Request) -> AsyncSession:
+    if request.method not in ("GET", "HEAD"):
+        # Read by ReadYourWritesMiddleware once the response starts
+        request.state.wrote = True
     async with AsyncSessionLocal() as session:
         try:
             yield session
@@ -34,4 +182,19 @@ async def get_db() -> AsyncSession:
             await session.rollback()
             raise
         finally:
-            await session.close() 
\ No newline at end of file
+            await session.close()
+
+async def open_read_session(request: Request) -> AsyncSession:
+    """Open a session on a replica when possible, else the primary; the caller closes it."""
+    session = None
+    if not is_pinned(request):
+        session = await replica_router.open_replica_session()
+    return session if session is not None else AsyncSessionLocal()
+
+# Dependency to get a read-only DB session, served by a replica when possible
+async def get_read_db(request: Request) -> AsyncSession:
+    session = await open_read_session(request)
+    try:
+        yield session
+    finally:
+        await session.close()
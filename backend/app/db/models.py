@@ -1,5 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Enum
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, Integer, BigInteger, String, Float, DateTime, Boolean, ForeignKey, Enum, Index, UniqueConstraint, Uuid, DDL, event
 from sqlalchemy.orm import relationship
 import uuid
 import enum
@@ -17,29 +16,45 @@ class CellType(str, enum.Enum):
     KPM = "KPM"
     KPH = "KPH"
 
+class CellFlag(enum.IntFlag):
+    """Anomaly flags stored as a bitmask on each cell value."""
+    DEVIATION_Z = 1      # far from the bank mean in standard deviations
+    DEVIATION_MAD = 2    # far from the bank median in median absolute deviations
+    FAST_DROP = 4        # dropped much faster than its peers since the previous CCV
+    REVERSED = 8         # negative voltage
+    DEAD = 16            # at or near zero volts
+
 class Test(Base):
     __tablename__ = "tests"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
     job_number = Column(String, unique=True, index=True)
-    customer_name = Column(String)
-    start_date = Column(DateTime)
+    customer_name = Column(String, index=True)
+    start_date = Column(DateTime, index=True)
     start_time = Column(DateTime)
     number_of_cycles = Column(Integer)
     time_interval = Column(Integer)  # in hours
-    status = Column(String, default=TestStatus.SCHEDULED)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    status = Column(String, default=TestStatus.SCHEDULED, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
 
     # Relationships
     banks = relationship("Bank", back_populates="test", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Trigram indexes serve the typeahead search's prefix and substring matches (needs pg_trgm)
+        Index("ix_tests_job_number_trgm", "job_number", postgresql_using="gin",
+              postgresql_ops={"job_number": "gin_trgm_ops"}),
+        Index("ix_tests_customer_name_trgm", "customer_name", postgresql_using="gin",
+              postgresql_ops={"customer_name": "gin_trgm_ops"}),
+    )
+
 class Bank(Base):
     __tablename__ = "banks"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    test_id = Column(UUID(as_uuid=True), ForeignKey("tests.id"))
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    test_id = Column(Uuid, ForeignKey("tests.id"), index=True)
     bank_number = Column(Integer)
-    cell_type = Column(String)
+    cell_type = Column(String, index=True)
     cell_rate = Column(Float)
     percentage_capacity = Column(Float)
     discharge_current = Column(Float)
@@ -52,8 +67,8 @@ class Bank(Base):
 class Cycle(Base):
     __tablename__ = "cycles"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    bank_id = Column(UUID(as_uuid=True), ForeignKey("banks.id"))
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    bank_id = Column(Uuid, ForeignKey("banks.id"), index=True)
     cycle_number = Column(Integer)
     reading_type = Column(String)  # charge/discharge
     start_time = Column(DateTime)
@@ -67,23 +82,56 @@ class Cycle(Base):
 class Reading(Base):
     __tablename__ = "readings"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    cycle_id = Column(UUID(as_uuid=True), ForeignKey("cycles.id"))
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    cycle_id = Column(Uuid, ForeignKey("cycles.id"), index=True)
     reading_number = Column(Integer)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     is_ocv = Column(Boolean, default=False)
+    # Client-chosen key; a retried submission with the same key does not create a second reading
+    idempotency_key = Column(String, unique=True, nullable=True)
 
     # Relationships
     cycle = relationship("Cycle", back_populates="readings")
     cell_values = relationship("CellValue", back_populates="reading", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # One reading per slot; the scheduler derives taken slots from reading numbers
+        UniqueConstraint("cycle_id", "reading_number", name="uq_readings_cycle_reading_number"),
+    )
+
 class CellValue(Base):
     __tablename__ = "cell_values"
 
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    reading_id = Column(UUID(as_uuid=True), ForeignKey("readings.id"))
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    reading_id = Column(Uuid, ForeignKey("readings.id"), index=True)
     cell_number = Column(Integer)
     value = Column(Float)
+    flags = Column(Integer, default=0)  # CellFlag bitmask
 
     # Relationships
-    reading = relationship("Reading", back_populates="cell_values") 
\ No newline at end of file
+    reading = relationship("Reading", back_populates="cell_values") 
+
+class Change(Base):
+    """Append-only log of writes, read by the change feed in commit order."""
+    __tablename__ = "changes"
+
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity_type = Column(String)  # test/bank/cycle/reading
+    entity_id = Column(Uuid)
+    operation = Column(String)  # insert/update
+    changed_at = Column(DateTime, default=datetime.utcnow, index=True)
+    # Writing transaction, filled in by PostgreSQL; ids are taken at flush and may
+    # commit out of order, so the feed cursor follows this instead
+    txid = Column(BigInteger)
+
+    __table_args__ = (
+        Index("ix_changes_txid_id", "txid", "id"),
+    )
+
+# A server default that calls pg_current_xact_id() cannot be declared portably
+event.listen(
+    Change.__table__,
+    "after_create",
+    DDL("ALTER TABLE changes ALTER COLUMN txid SET DEFAULT pg_current_xact_id()::text::bigint")
+    .execute_if(dialect="postgresql"),
+)
@@ -1,18 +1,64 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from fastapi.middleware.gzip import GZipMiddleware
-from prometheus_client import make_asgi_app
 
 from .core.config import settings
-from .api.endpoints import test
+from .core.compression import CompressionMiddleware
+from .core.admission import AdmissionMiddleware, ClientIdentity, EXPORT, INGEST, INTERACTIVE
+from .core.profiler import ProfilerMiddleware
+from .api.endpoints import test, schedule, analytics, changes, reports, dashboard, grading, debug
+from .db.base import ReadYourWritesMiddleware, warm_up_pool
+from .services.scheduler import scheduler
+from .services.reports import shutdown_executor
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up lazily built state and run the cycle scheduler for the app's lifetime."""
+    if settings.WARMUP_ON_STARTUP:
+        # Generating the OpenAPI document builds every route's schema once
+        app.openapi()
+        await warm_up_pool()
+    if settings.SCHEDULER_ENABLED:
+        scheduler.start()
+    yield
+    await scheduler.stop()
+    shutdown_executor()
 
 # Create FastAPI app
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
+# Add admission control (inside CORS so 429 responses carry CORS headers)
+if settings.ADMISSION_ENABLED:
+    app.add_middleware(
+        AdmissionMiddleware,
+        path_prefix=settings.API_V1_STR,
+        budgets={
+            INGEST: settings.per_worker(settings.ADMISSION_INGEST_CONCURRENCY),
+            INTERACTIVE: settings.per_worker(settings.ADMISSION_INTERACTIVE_CONCURRENCY),
+            EXPORT: settings.per_worker(settings.ADMISSION_EXPORT_CONCURRENCY),
+        },
+        queue_depth=settings.ADMISSION_QUEUE_DEPTH,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        client_rate=settings.per_worker_rate(settings.ADMISSION_CLIENT_RATE),
+        client_burst=settings.per_worker(settings.ADMISSION_CLIENT_BURST),
+        identity=ClientIdentity(settings.trusted_proxies, settings.SECRET_KEY, settings.ALGORITHM),
+        metrics=settings.ENABLE_METRICS,
+    )
+
+# Add request tagging for the sampling profiler
+if settings.PROFILER_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
+# Pin writers to the primary while replicas catch up
+if settings.database_read_urls:
+    app.add_middleware(ReadYourWritesMiddleware, pin_seconds=settings.READ_YOUR_WRITES_SECONDS)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -22,16 +68,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Add Gzip compression
-app.add_middleware(GZipMiddleware, minimum_size=1000)
+# Add negotiated zstd/Brotli/gzip compression
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    cache_bytes=settings.COMPRESSION_CACHE_MB * 1024 * 1024,
+)
 
 # Add Prometheus metrics
 if settings.ENABLE_METRICS:
+    # Imported here so the client library is not loaded when metrics are disabled
+    from prometheus_client import make_asgi_app
+
     metrics_app = make_asgi_app()
     app.mount("/metrics", metrics_app)
 
 # Include routers
 app.include_router(test.router, prefix=settings.API_V1_STR, tags=["tests"])
+app.include_router(schedule.router, prefix=settings.API_V1_STR, tags=["schedule"])
+app.include_router(analytics.router, prefix=settings.API_V1_STR, tags=["analytics"])
+app.include_router(changes.router, prefix=settings.API_V1_STR, tags=["changes"])
+app.include_router(reports.router, prefix=settings.API_V1_STR, tags=["reports"])
+app.include_router(dashboard.router, prefix=settings.API_V1_STR, tags=["dashboard"])
+app.include_router(grading.router, prefix=settings.API_V1_STR, tags=["grading"])
+if settings.PROFILER_ENABLED:
+    app.include_router(debug.router, tags=["debug"])
 
 @app.get("/health")
 async def health_check():
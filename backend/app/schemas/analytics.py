@@ -0,0 +1,25 @@
+from pydantic import BaseModel
+from typing import Optional, List, Dict
+from datetime import datetime
+
+from .test import CellType
+
+class ReadingDistribution(BaseModel):
+    is_ocv: bool
+    reading_number: int
+    banks: int
+    cells: int
+    mean: float
+    std: Optional[float]
+    min: float
+    max: float
+    percentiles: Dict[str, float]
+    histogram: List[int]
+
+class ComparisonResponse(BaseModel):
+    cell_type: Optional[CellType]
+    customer_name: Optional[str]
+    start_from: Optional[datetime]
+    start_to: Optional[datetime]
+    histogram_edges: List[float]
+    readings: List[ReadingDistribution]
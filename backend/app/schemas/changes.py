@@ -0,0 +1,63 @@
+from pydantic import BaseModel, UUID4
+from typing import Optional, List
+from datetime import datetime
+
+from .test import TestStatus, CellValueResponse
+
+class ChangedTest(BaseModel):
+    id: UUID4
+    job_number: str
+    customer_name: str
+    number_of_cycles: int
+    time_interval: int
+    start_date: datetime
+    start_time: datetime
+    status: TestStatus
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ChangedBank(BaseModel):
+    id: UUID4
+    test_id: UUID4
+    bank_number: int
+    cell_type: str
+    cell_rate: float
+    percentage_capacity: float
+    discharge_current: Optional[float]
+    number_of_cells: int
+
+    class Config:
+        from_attributes = True
+
+class ChangedCycle(BaseModel):
+    id: UUID4
+    bank_id: UUID4
+    cycle_number: int
+    reading_type: str
+    start_time: datetime
+    end_time: Optional[datetime]
+    duration: Optional[int]
+
+    class Config:
+        from_attributes = True
+
+class ChangedReading(BaseModel):
+    id: UUID4
+    cycle_id: UUID4
+    reading_number: int
+    is_ocv: bool
+    timestamp: datetime
+    cell_values: List[CellValueResponse]
+
+    class Config:
+        from_attributes = True
+
+class ChangesResponse(BaseModel):
+    cursor: int
+    has_more: bool
+    tests: List[ChangedTest]
+    banks: List[ChangedBank]
+    cycles: List[ChangedCycle]
+    readings: List[ChangedReading]
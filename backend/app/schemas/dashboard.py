@@ -0,0 +1,51 @@
+from pydantic import BaseModel, UUID4
+from typing import Dict, List, Optional
+from datetime import datetime
+
+from .test import TestSummaryResponse
+
+class ActiveTest(BaseModel):
+    id: UUID4
+    job_number: str
+    customer_name: str
+    start_time: Optional[datetime]
+    latest_reading_at: Optional[datetime]
+    readings: int
+
+class HourlyReadings(BaseModel):
+    hour: datetime
+    readings: int
+
+class DashboardSummaryResponse(BaseModel):
+    generated_at: datetime
+    status_counts: Dict[str, int]
+    active_tests: List[ActiveTest]
+    readings_per_hour: List[HourlyReadings]
+    readings_last_24h: int
+    recent_tests: List[TestSummaryResponse]
+
+class ProgressTest(BaseModel):
+    id: UUID4
+    job_number: str
+    customer_name: str
+    number_of_cycles: int
+    start_time: Optional[datetime]
+
+class ProgressReading(BaseModel):
+    test_id: UUID4
+    bank_id: UUID4
+    bank_number: int
+    cycle_number: int
+    reading_number: int
+    is_ocv: bool
+    timestamp: datetime
+    cells: int
+    min: Optional[float]
+    mean: Optional[float]
+    max: Optional[float]
+    flagged: int
+
+class ProgressResponse(BaseModel):
+    cursor: int
+    tests: List[ProgressTest]
+    readings: List[ProgressReading]
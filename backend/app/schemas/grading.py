@@ -0,0 +1,65 @@
+from pydantic import BaseModel, UUID4, Field, model_validator
+from typing import Optional, List, Dict
+from enum import Enum
+
+class GroupingMethod(str, Enum):
+    WINDOW = "window"    # consecutive cells after sorting on the match metric
+    CLUSTER = "cluster"  # consecutive cells along the principal axis of all metrics
+
+class MatchMetric(str, Enum):
+    CAPACITY = "capacity_percent"
+    END_VOLTAGE = "end_voltage"
+    OCV = "ocv"
+
+class GradeThreshold(BaseModel):
+    grade: str
+    min_ocv: Optional[float] = Field(None, description="Lowest accepted OCV")
+    min_end_voltage: Optional[float] = Field(None, description="Lowest accepted voltage at the last CCV reading")
+    min_capacity_percent: Optional[float] = Field(None, description="Lowest accepted capacity in percent of rated")
+
+def default_grades() -> List[GradeThreshold]:
+    return [
+        GradeThreshold(grade="A", min_capacity_percent=100.0),
+        GradeThreshold(grade="B", min_capacity_percent=90.0),
+        GradeThreshold(grade="C", min_capacity_percent=80.0),
+    ]
+
+class GradingRequest(BaseModel):
+    bank_ids: List[UUID4] = Field(default_factory=list)
+    test_ids: List[UUID4] = Field(default_factory=list, description="Grade every bank of these tests")
+    cycle_number: Optional[int] = Field(None, ge=1, description="Cycle graded; defaults to each bank's last cycle with readings")
+    cutoff_voltage: Optional[float] = Field(None, gt=0, description="End-of-discharge voltage, defaults to CUTOFF_VOLTAGE")
+    grades: List[GradeThreshold] = Field(default_factory=default_grades, min_length=1,
+                                         description="Checked in order; a cell gets the first grade it meets")
+    group_size: int = Field(..., ge=2, le=1000, description="Cells per matched group")
+    method: GroupingMethod = GroupingMethod.WINDOW
+    match_on: MatchMetric = MatchMetric.CAPACITY
+
+    @model_validator(mode="after")
+    def require_banks(self):
+        if not self.bank_ids and not self.test_ids:
+            raise ValueError("bank_ids or test_ids is required")
+        return self
+
+class GradedCell(BaseModel):
+    bank_id: UUID4
+    cell_number: int
+    ocv: Optional[float]
+    end_voltage: Optional[float]
+    capacity_percent: Optional[float]
+    grade: Optional[str]
+    group: Optional[int]
+
+class MatchedGroup(BaseModel):
+    group: int
+    grade: str
+    spread: Optional[float] = Field(..., description="Range of the match metric within the group")
+    cells: List[int] = Field(..., description="Indexes into cells")
+
+class GradingResponse(BaseModel):
+    banks: int
+    grade_counts: Dict[str, int]
+    rejected: int
+    unmatched: int
+    cells: List[GradedCell]
+    groups: List[MatchedGroup]
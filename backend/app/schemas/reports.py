@@ -0,0 +1,48 @@
+from pydantic import BaseModel, UUID4, Field
+from typing import List, Optional
+from datetime import datetime
+from enum import Enum
+
+class ReportFormat(str, Enum):
+    CSV = "csv"
+    XLSX = "xlsx"
+    PDF = "pdf"
+
+class ReportStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+class ReportCreate(BaseModel):
+    test_id: UUID4
+    bank_id: Optional[UUID4] = None
+    format: ReportFormat = ReportFormat.CSV
+    cells: Optional[str] = Field(None, description="Inclusive cell numbers such as 1-500; all cells if omitted")
+    readings: Optional[str] = Field(None, description="Inclusive reading numbers such as 2-5; all readings if omitted")
+
+class ReportJobResponse(BaseModel):
+    id: UUID4
+    test_id: UUID4
+    bank_id: Optional[UUID4]
+    format: ReportFormat
+    cells: Optional[str] = None
+    readings: Optional[str] = None
+    status: ReportStatus
+    progress: float
+    error: Optional[str]
+    created_at: datetime
+    download_url: Optional[str] = None
+
+class FinalBankArtifacts(BaseModel):
+    bank_id: UUID4
+    bank_number: int
+    report_url: str
+    statistics_url: str
+    series_url: str
+
+class FinalReportResponse(BaseModel):
+    test_id: UUID4
+    version: str
+    created_at: datetime
+    banks: List[FinalBankArtifacts]
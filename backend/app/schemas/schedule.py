@@ -0,0 +1,12 @@
+from pydantic import BaseModel, UUID4
+from typing import List
+from datetime import datetime
+
+class DueReadingResponse(BaseModel):
+    test_id: UUID4
+    job_number: str
+    cycle_number: int
+    reading_number: int
+    is_ocv: bool
+    due_at: datetime
+    cycle_ids: List[UUID4]
@@ -1,8 +1,10 @@
-from pydantic import BaseModel, UUID4, Field, validator
+from pydantic import BaseModel, UUID4, Field, model_validator
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
 
+from ..core.config import settings
+
 class TestStatus(str, Enum):
     SCHEDULED = "scheduled"
     IN_PROGRESS = "in_progress"
@@ -17,21 +19,21 @@ class CellType(str, Enum):
 class TestBase(BaseModel):
     job_number: str = Field(..., description="Unique job number for the test")
     customer_name: str = Field(..., description="Name of the customer")
-    number_of_cycles: int = Field(..., ge=1, le=5, description="Number of test cycles")
+    number_of_cycles: int = Field(..., ge=1, le=settings.MAX_CYCLES_PER_TEST, description="Number of test cycles")
     time_interval: int = Field(..., ge=1, le=2, description="Time interval in hours")
 
 class BankBase(BaseModel):
-    bank_number: int = Field(..., ge=1, le=2, description="Bank number (1 or 2)")
+    bank_number: int = Field(..., ge=1, le=settings.MAX_BANKS_PER_TEST, description="Bank number")
     cell_type: CellType
     cell_rate: float = Field(..., gt=0, description="Cell rate in Ah")
     percentage_capacity: float = Field(..., gt=0, le=100, description="Percentage capacity")
-    number_of_cells: int = Field(..., ge=10, le=200, description="Number of cells")
+    number_of_cells: int = Field(..., ge=10, le=settings.MAX_CELLS_PER_BANK, description="Number of cells")
+    discharge_current: Optional[float] = Field(None, description="Discharge current in A, derived from cell rate and percentage capacity")
 
-    @validator("discharge_current", pre=True, always=True)
-    def calculate_discharge_current(cls, v, values):
-        if "percentage_capacity" in values and "cell_rate" in values:
-            return (values["percentage_capacity"] * values["cell_rate"]) / 100
-        return v
+    @model_validator(mode="after")
+    def calculate_discharge_current(self):
+        self.discharge_current = (self.percentage_capacity * self.cell_rate) / 100
+        return self
 
 class ReadingBase(BaseModel):
     reading_number: int = Field(..., ge=1, description="Reading sequence number")
@@ -46,17 +48,74 @@ class TestCreate(TestBase):
 class BankCreate(BankBase):
     test_id: UUID4
 
+class TestFullCreate(TestCreate):
+    banks: List[BankBase] = Field(..., min_length=1, description="Banks created with the test")
+
+    @model_validator(mode="after")
+    def check_bank_numbers(self):
+        numbers = [bank.bank_number for bank in self.banks]
+        if len(set(numbers)) != len(numbers):
+            raise ValueError("Bank numbers must be unique within a test")
+        return self
+
 class ReadingCreate(ReadingBase):
     cycle_id: UUID4
+    idempotency_key: Optional[str] = Field(None, max_length=64, description="Resubmitting with the same key returns the existing reading")
+
+class ReadingBatchItem(ReadingCreate):
+    idempotency_key: str = Field(..., min_length=1, max_length=64)
+
+class ReadingBatchCreate(BaseModel):
+    readings: List[ReadingBatchItem] = Field(..., min_length=1, max_length=100)
 
 # Response schemas
 class CellValueResponse(BaseModel):
     cell_number: int
     value: float
+    flags: int = 0
 
     class Config:
         from_attributes = True
 
+class BinaryEncoding(str, Enum):
+    FLOAT32 = "float32"
+    INT16_MV = "int16_mv"
+
+class ReadingSummaryResponse(BaseModel):
+    id: UUID4
+    cycle_id: UUID4
+    reading_number: int
+    is_ocv: bool
+    timestamp: datetime
+    cell_count: int
+    flagged_cells: List[int]
+
+class ReadingBatchStatus(str, Enum):
+    CREATED = "created"
+    DUPLICATE = "duplicate"    # created by an earlier submission with the same key
+    REJECTED = "rejected"      # will not succeed on retry
+
+class ReadingBatchResult(BaseModel):
+    idempotency_key: str
+    status: ReadingBatchStatus
+    reading_id: Optional[UUID4] = None
+    flagged_cells: List[int] = []
+    detail: Optional[str] = None
+
+class ReadingBatchResponse(BaseModel):
+    results: List[ReadingBatchResult]
+
+class CellAnomalyResponse(BaseModel):
+    reading_id: UUID4
+    cycle_number: int
+    reading_number: int
+    is_ocv: bool
+    timestamp: datetime
+    cell_number: int
+    value: float
+    flags: int
+    flag_names: List[str]
+
 class ReadingResponse(ReadingBase):
     id: UUID4
     timestamp: datetime
@@ -77,6 +136,27 @@ class CycleResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class CycleListResponse(BaseModel):
+    """A cycle without its readings, for listings."""
+    id: UUID4
+    cycle_number: int
+    reading_type: str
+    start_time: datetime
+    end_time: Optional[datetime]
+    duration: Optional[int]
+
+    class Config:
+        from_attributes = True
+
+class BankListResponse(BankBase):
+    id: UUID4
+    test_id: UUID4
+    discharge_current: float
+    cycles: List[CycleListResponse]
+
+    class Config:
+        from_attributes = True
+
 class BankResponse(BankBase):
     id: UUID4
     test_id: UUID4
@@ -95,6 +175,64 @@ class TestResponse(TestBase):
     class Config:
         from_attributes = True
 
+class TestListResponse(TestBase):
+    """A test with its banks and cycles but no readings; GET /tests/{id} has those."""
+    id: UUID4
+    status: TestStatus
+    created_at: datetime
+    banks: List[BankListResponse]
+
+    class Config:
+        from_attributes = True
+
+class TestSummaryResponse(BaseModel):
+    id: UUID4
+    job_number: str
+    customer_name: str
+    status: TestStatus
+    start_date: datetime
+
+    class Config:
+        from_attributes = True
+
+class CycleCapacityResponse(BaseModel):
+    cycle_number: int
+    time_to_cutoff_hours: List[Optional[float]]
+    reached_cutoff: List[bool]
+    capacity_ah: List[Optional[float]]
+    percent_of_rated: List[Optional[float]]
+
+class BankCapacityResponse(BaseModel):
+    bank_id: UUID4
+    cutoff_voltage: float
+    discharge_current: float
+    cycles: List[CycleCapacityResponse]
+    capacity_trend_ah_per_cycle: List[Optional[float]]
+
+class SeriesMethod(str, Enum):
+    LTTB = "lttb"
+    MINMAX = "minmax"
+
+class CellSeriesResponse(BaseModel):
+    cell_number: int
+    total_points: int
+    timestamps: List[datetime]
+    voltages: List[float]
+
+class BankSeriesResponse(BaseModel):
+    bank_id: UUID4
+    method: SeriesMethod
+    cells: List[CellSeriesResponse]
+
+class LimitsResponse(BaseModel):
+    max_banks_per_test: int
+    max_cells_per_bank: int
+    max_cycles_per_test: int
+    cell_page_size: int
+    readings_per_cycle: int
+    cell_voltage_min: float
+    cell_voltage_max: float
+
 # Update schemas
 class TestUpdate(BaseModel):
     status: Optional[TestStatus]
@@ -0,0 +1,64 @@
+from typing import Optional
+
+import numpy as np
+
+from ..core.config import settings
+from ..db.models import CellFlag
+
+# Scale the median and mean absolute deviations to estimate a normal standard deviation
+MAD_SCALE = 1.4826
+MEAN_AD_SCALE = 1.2533
+
+def _robust_z(values: np.ndarray) -> np.ndarray:
+    """Distance from the median in scaled median absolute deviations."""
+    median = np.median(values)
+    deviations = np.abs(values - median)
+    mad = np.median(deviations) * MAD_SCALE
+    if mad == 0:
+        # More than half the cells are identical; fall back to the mean absolute deviation
+        mad = deviations.mean() * MEAN_AD_SCALE
+    if mad == 0:
+        return np.zeros_like(values)
+    return (values - median) / mad
+
+def detect_anomalies(values: np.ndarray, previous_ccv: Optional[np.ndarray] = None) -> np.ndarray:
+    """Return a CellFlag bitmask for every cell of one reading.
+
+    `values` holds one voltage per cell in cell order. `previous_ccv` is the
+    preceding CCV reading of the same cycle, used to find the fastest-dropping cells.
+    Reversed and dead cells are excluded from the bank statistics so they do not
+    mask weaker but still live cells.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flags = np.zeros(values.shape, dtype=np.int64)
+
+    reversed_cells = values < 0
+    dead_cells = ~reversed_cells & (values <= settings.DEAD_CELL_VOLTAGE)
+    flags[reversed_cells] |= CellFlag.REVERSED
+    flags[dead_cells] |= CellFlag.DEAD
+
+    live = ~(reversed_cells | dead_cells)
+    live_values = values[live]
+    if live_values.size >= 3:
+        std = live_values.std()
+        if std > 0:
+            z = np.abs(live_values - live_values.mean()) / std
+            flags[live] |= np.where(z > settings.ANOMALY_Z_THRESHOLD, int(CellFlag.DEVIATION_Z), 0)
+        robust = np.abs(_robust_z(live_values))
+        flags[live] |= np.where(robust > settings.ANOMALY_MAD_THRESHOLD, int(CellFlag.DEVIATION_MAD), 0)
+
+    if previous_ccv is not None:
+        previous_ccv = np.asarray(previous_ccv, dtype=np.float64)
+        if previous_ccv.shape == values.shape:
+            both_live = live & (previous_ccv > settings.DEAD_CELL_VOLTAGE)
+            drops = previous_ccv[both_live] - values[both_live]
+            if drops.size >= 3:
+                # Only a drop well above the typical drop is flagged, never a smaller one
+                drop_z = _robust_z(drops)
+                flags[both_live] |= np.where(drop_z > settings.ANOMALY_DROP_THRESHOLD, int(CellFlag.FAST_DROP), 0)
+
+    return flags
+
+def flag_names(flags: int) -> list:
+    """Names of the flags set in a bitmask."""
+    return [flag.name for flag in CellFlag if flags & flag]
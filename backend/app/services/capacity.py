@@ -0,0 +1,164 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.models import Bank, Cycle, Reading, CellValue
+
+# Results keyed by (bank_id, cutoff); each entry carries the readings version it was built from
+_cache: "OrderedDict[Tuple[UUID, float], Tuple[tuple, dict]]" = OrderedDict()
+
+def build_voltage_matrices(readings: Sequence, values: Sequence, number_of_cells: int) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """Pivot a bank's readings into one voltage matrix per cycle.
+
+    `readings` are (reading_id, cycle_number, timestamp) rows already ordered by
+    cycle, OCV first, then time; `values` are (reading_id, cell_number, value) rows.
+    Returns cycle_number -> (hours since the cycle's first reading, readings x cells
+    matrix), with NaN for missing cells.
+    """
+    if not readings:
+        return {}
+    reading_ids, cycle_col, time_col = zip(*readings)
+    rank = {reading_id: index for index, reading_id in enumerate(reading_ids)}
+    cycles = np.asarray(cycle_col, dtype=np.int64)
+    seconds = np.asarray(time_col, dtype="datetime64[us]").astype(np.int64) / 1e6
+
+    matrix = np.full((len(reading_ids), number_of_cells), np.nan)
+    if values:
+        value_readings, cell_col, value_col = zip(*values)
+        rows = np.fromiter((rank[r] for r in value_readings), dtype=np.int64, count=len(value_readings))
+        cells = np.asarray(cell_col, dtype=np.int64) - 1
+        in_range = (cells >= 0) & (cells < number_of_cells)
+        matrix[rows[in_range], cells[in_range]] = np.asarray(value_col, dtype=np.float64)[in_range]
+
+    result = {}
+    boundaries = np.flatnonzero(np.diff(cycles)) + 1
+    for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, cycles.size]):
+        hours = (seconds[start:end] - seconds[start]) / 3600.0
+        result[int(cycles[start])] = (hours, matrix[start:end])
+    return result
+
+def time_to_cutoff(hours: np.ndarray, voltages: np.ndarray, cutoff: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Interpolated hours until each cell first drops below `cutoff`.
+
+    Returns (hours, reached); cells that never cross are NaN with reached False.
+    """
+    below = voltages < cutoff
+    reached = below.any(axis=0)
+    first = below.argmax(axis=0)
+    previous = np.maximum(first - 1, 0)
+    cells = np.arange(voltages.shape[1])
+
+    v0, v1 = voltages[previous, cells], voltages[first, cells]
+    t0, t1 = hours[previous], hours[first]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fraction = np.clip((v0 - cutoff) / (v0 - v1), 0.0, 1.0)
+    crossing = np.where((first > 0) & np.isfinite(fraction), t0 + fraction * (t1 - t0), t1)
+    return np.where(reached, crossing, np.nan), reached
+
+def capacity_trend(cycle_numbers: np.ndarray, capacities: np.ndarray) -> np.ndarray:
+    """Least-squares slope of capacity per cycle for every cell (NaN with fewer than 2 cycles)."""
+    if cycle_numbers.size < 2:
+        return np.full(capacities.shape[1], np.nan)
+    x = cycle_numbers - cycle_numbers.mean()
+    y = capacities - capacities.mean(axis=0)
+    return (x @ y) / (x @ x)
+
+def analyze_bank(matrices: Dict[int, Tuple[np.ndarray, np.ndarray]], discharge_current: float,
+                 cell_rate: float, cutoff: float) -> dict:
+    """Delivered capacity, time to cutoff and capacity trend for every cell of a bank."""
+    cycles = []
+    for cycle_number in sorted(matrices):
+        hours, voltages = matrices[cycle_number]
+        to_cutoff, reached = time_to_cutoff(hours, voltages, cutoff)
+        # Cells still above cutoff delivered at least the capacity up to the last reading
+        discharge_hours = np.where(reached, to_cutoff, hours[-1])
+        capacity = discharge_current * discharge_hours
+        cycles.append({
+            "cycle_number": cycle_number,
+            "time_to_cutoff_hours": to_cutoff,
+            "reached_cutoff": reached,
+            "capacity_ah": capacity,
+            "percent_of_rated": capacity / cell_rate * 100 if cell_rate else np.full_like(capacity, np.nan),
+        })
+
+    number_of_cells = next(iter(matrices.values()))[1].shape[1] if matrices else 0
+    trend = capacity_trend(
+        np.asarray([c["cycle_number"] for c in cycles], dtype=np.float64),
+        np.vstack([c["capacity_ah"] for c in cycles]) if cycles else np.empty((0, number_of_cells)),
+    )
+    return {"cycles": cycles, "capacity_trend_ah_per_cycle": trend}
+
+def discharge_current(bank: Bank) -> float:
+    """The bank's discharge current, derived from its rate and percentage if not stored."""
+    return bank.discharge_current or bank.cell_rate * bank.percentage_capacity / 100
+
+def _to_json(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+class CapacityService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _readings_version(self, bank_id: UUID) -> tuple:
+        """Cheap fingerprint of a bank's readings, changes whenever a reading is added."""
+        query = (
+            select(func.count(Reading.id), func.max(Reading.timestamp))
+            .join(Cycle, Reading.cycle_id == Cycle.id)
+            .where(Cycle.bank_id == bank_id)
+        )
+        result = await self.db.execute(query)
+        return tuple(result.one())
+
+    async def get_bank_capacity(self, bank: Bank, cutoff: Optional[float] = None) -> dict:
+        """Capacity analytics for a bank, cached until its readings change."""
+        cutoff = settings.CUTOFF_VOLTAGE if cutoff is None else cutoff
+        key = (bank.id, cutoff)
+        version = await self._readings_version(bank.id)
+        cached = _cache.get(key)
+        if cached and cached[0] == version:
+            _cache.move_to_end(key)
+            return cached[1]
+
+        readings_query = (
+            select(Reading.id, Cycle.cycle_number, Reading.timestamp)
+            .join(Cycle, Reading.cycle_id == Cycle.id)
+            .where(Cycle.bank_id == bank.id)
+            .order_by(Cycle.cycle_number, Reading.is_ocv.desc(), Reading.timestamp)
+        )
+        values_query = (
+            select(CellValue.reading_id, CellValue.cell_number, CellValue.value)
+            .join(Reading, CellValue.reading_id == Reading.id)
+            .join(Cycle, Reading.cycle_id == Cycle.id)
+            .where(Cycle.bank_id == bank.id)
+        )
+        readings = (await self.db.execute(readings_query)).all()
+        values = (await self.db.execute(values_query)).all()
+        matrices = build_voltage_matrices(readings, values, bank.number_of_cells)
+        current = discharge_current(bank)
+        analysis = analyze_bank(matrices, current, bank.cell_rate, cutoff)
+
+        response = {
+            "bank_id": bank.id,
+            "cutoff_voltage": cutoff,
+            "discharge_current": current,
+            "cycles": [
+                {
+                    "cycle_number": c["cycle_number"],
+                    "time_to_cutoff_hours": _to_json(c["time_to_cutoff_hours"]),
+                    "reached_cutoff": c["reached_cutoff"].tolist(),
+                    "capacity_ah": _to_json(c["capacity_ah"]),
+                    "percent_of_rated": _to_json(c["percent_of_rated"]),
+                }
+                for c in analysis["cycles"]
+            ],
+            "capacity_trend_ah_per_cycle": _to_json(analysis["capacity_trend_ah_per_cycle"]),
+        }
+        _cache[key] = (version, response)
+        if len(_cache) > settings.CAPACITY_CACHE_SIZE:
+            _cache.popitem(last=False)
+        return response
@@ -0,0 +1,99 @@
+from typing import Dict, Iterable, List
+from uuid import UUID
+
+from sqlalchemy import BigInteger, Text, cast, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from ..db.models import Change, Test, Bank, Cycle, Reading
+
+ENTITY_MODELS = {
+    "test": Test,
+    "bank": Bank,
+    "cycle": Cycle,
+    "reading": Reading,
+}
+
+def record_changes(db: AsyncSession, entity_type: str, entity_ids: Iterable[UUID], operation: str) -> None:
+    """Add change log rows to the session; they commit with the write they describe."""
+    db.add_all([
+        Change(entity_type=entity_type, entity_id=entity_id, operation=operation)
+        for entity_id in entity_ids
+    ])
+
+async def record_changes_bulk(db: AsyncSession, entity_type: str, entity_ids: List[UUID], operation: str) -> None:
+    """Insert change log rows with one statement, for Core-level bulk writes."""
+    if entity_ids:
+        await db.execute(insert(Change), [
+            {"entity_type": entity_type, "entity_id": entity_id, "operation": operation}
+            for entity_id in entity_ids
+        ])
+
+def change_position(dialect: str):
+    """Column ordering changes by commit: the writing transaction on PostgreSQL.
+
+    SQLite runs one write transaction at a time, so there ids are already in commit order.
+    """
+    return Change.txid if dialect == "postgresql" else Change.id
+
+async def settled_position(db: AsyncSession) -> int:
+    """Position below which every change is committed and visible to this session.
+
+    On PostgreSQL that is the xmin of the current snapshot: every transaction with a
+    lower id has finished, so no change below it can still appear. On a replica the
+    snapshot follows replay, so transactions not yet replayed are held back too.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        xmin = func.pg_snapshot_xmin(func.pg_current_snapshot())
+        return (await db.execute(select(cast(cast(xmin, Text), BigInteger)))).scalar()
+    return ((await db.execute(select(func.max(Change.id)))).scalar() or 0) + 1
+
+class ChangeFeedService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def changes_since(self, since: int, limit: int = 1000) -> dict:
+        """Entities inserted or updated at or after cursor `since`, at most about `limit` log entries.
+
+        Pages end on a transaction boundary, so a cursor never splits a transaction;
+        a single transaction larger than `limit` is returned whole.
+        """
+        position = change_position(self.db.get_bind().dialect.name).label("position")
+        settled = await settled_position(self.db)
+        query = (
+            select(position, Change.entity_type, Change.entity_id)
+            .where(position >= since, position < settled)
+            .order_by(position, Change.id)
+        )
+        rows = (await self.db.execute(query.limit(limit + 1))).all()
+        has_more = len(rows) > limit
+        if has_more:
+            cut = rows[limit].position
+            rows = [row for row in rows[:limit] if row.position < cut]
+            cursor = cut
+            if not rows:
+                rows = (await self.db.execute(query.where(position == cut))).all()
+                cursor = cut + 1
+        else:
+            cursor = max(since, settled)
+
+        # Several changes to one entity collapse into its current state
+        changed: Dict[str, set] = {entity_type: set() for entity_type in ENTITY_MODELS}
+        for row in rows:
+            if row.entity_type in changed:
+                changed[row.entity_type].add(row.entity_id)
+
+        result = {
+            "cursor": cursor,
+            "has_more": has_more,
+        }
+        for entity_type, model in ENTITY_MODELS.items():
+            ids = changed[entity_type]
+            if not ids:
+                result[f"{entity_type}s"] = []
+                continue
+            query = select(model).where(model.id.in_(ids))
+            if model is Reading:
+                query = query.options(selectinload(Reading.cell_values))
+            result[f"{entity_type}s"] = (await self.db.execute(query)).scalars().all()
+        return result
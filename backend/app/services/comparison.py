@@ -0,0 +1,174 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Float, func, select
+from sqlalchemy.dialects.postgresql import array
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.models import Test, Bank, Cycle, Reading, CellValue
+
+PERCENTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Query fingerprint -> (expiry, result), least recently used first
+_cache: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+
+def fingerprint(params: dict) -> str:
+    """Stable key for a set of comparison parameters."""
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+class ComparisonService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def compare(
+        self,
+        cell_type: Optional[str] = None,
+        customer_name: Optional[str] = None,
+        start_from: Optional[datetime] = None,
+        start_to: Optional[datetime] = None,
+        bins: int = 20,
+        low: float = 0.0,
+        high: float = 2.0,
+    ) -> dict:
+        """Voltage distributions per reading number across every matching bank."""
+        params = {
+            "cell_type": cell_type,
+            "customer_name": customer_name,
+            "start_from": start_from,
+            "start_to": start_to,
+            "bins": bins,
+            "low": low,
+            "high": high,
+        }
+        key = fingerprint(params)
+        cached = _cache.get(key)
+        if cached and cached[0] > time.monotonic():
+            _cache.move_to_end(key)
+            return cached[1]
+
+        filters = []
+        if cell_type:
+            filters.append(Bank.cell_type == cell_type)
+        if customer_name:
+            filters.append(Test.customer_name == customer_name)
+        if start_from:
+            filters.append(Test.start_date >= start_from)
+        if start_to:
+            filters.append(Test.start_date < start_to)
+
+        def filtered(*columns):
+            return (
+                select(*columns)
+                .select_from(CellValue)
+                .join(Reading, CellValue.reading_id == Reading.id)
+                .join(Cycle, Reading.cycle_id == Cycle.id)
+                .join(Bank, Cycle.bank_id == Bank.id)
+                .join(Test, Bank.test_id == Test.id)
+                .where(*filters)
+            )
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            readings = await self._aggregate_in_database(filtered, bins, low, high)
+        else:
+            # percentile_cont and width_bucket are Postgres-only; aggregate the values in NumPy
+            readings = await self._aggregate_in_numpy(filtered, bins, low, high)
+
+        width = (high - low) / bins
+        result = {
+            "cell_type": cell_type,
+            "customer_name": customer_name,
+            "start_from": start_from,
+            "start_to": start_to,
+            "histogram_edges": [round(low + i * width, 6) for i in range(bins + 1)],
+            "readings": readings,
+        }
+
+        now = time.monotonic()
+        for stale in [k for k, (expiry, _) in _cache.items() if expiry <= now]:
+            del _cache[stale]
+        _cache[key] = (now + settings.ANALYTICS_CACHE_SECONDS, result)
+        _cache.move_to_end(key)
+        if len(_cache) > settings.ANALYTICS_CACHE_SIZE:
+            _cache.popitem(last=False)
+        return result
+
+    async def _aggregate_in_database(self, filtered, bins: int, low: float, high: float) -> list:
+        # Plain GROUP BY rather than window functions: percentile_cont is an ordered-set
+        # aggregate Postgres does not accept OVER a window, and one row per group is all we need
+        group = (Reading.is_ocv, Reading.reading_number)
+        stats_query = filtered(
+            *group,
+            func.count(func.distinct(Bank.id)).label("banks"),
+            func.count(CellValue.value).label("cells"),
+            func.avg(CellValue.value).label("mean"),
+            func.stddev_pop(CellValue.value).label("std"),
+            func.min(CellValue.value).label("min"),
+            func.max(CellValue.value).label("max"),
+            func.percentile_cont(array(PERCENTILES, type_=Float))
+            .within_group(CellValue.value)
+            .label("percentiles"),
+        ).group_by(*group).order_by(Reading.is_ocv.desc(), Reading.reading_number)
+
+        # width_bucket puts out-of-range values in 0 and bins + 1; fold them into the edge bins
+        bucket = func.least(func.greatest(func.width_bucket(CellValue.value, low, high, bins), 1), bins)
+        histogram_query = filtered(*group, bucket.label("bucket"), func.count().label("count")).group_by(*group, bucket)
+
+        stats = (await self.db.execute(stats_query)).all()
+        histograms: Dict[Tuple[bool, int], list] = {}
+        for row in (await self.db.execute(histogram_query)).all():
+            counts = histograms.setdefault((row.is_ocv, row.reading_number), [0] * bins)
+            counts[row.bucket - 1] = row.count
+
+        return [
+            {
+                "is_ocv": row.is_ocv,
+                "reading_number": row.reading_number,
+                "banks": row.banks,
+                "cells": row.cells,
+                "mean": row.mean,
+                "std": row.std,
+                "min": row.min,
+                "max": row.max,
+                "percentiles": {f"p{round(p * 100)}": v for p, v in zip(PERCENTILES, row.percentiles)},
+                "histogram": histograms.get((row.is_ocv, row.reading_number), [0] * bins),
+            }
+            for row in stats
+        ]
+
+    async def _aggregate_in_numpy(self, filtered, bins: int, low: float, high: float) -> list:
+        query = filtered(Reading.is_ocv, Reading.reading_number, Bank.id, CellValue.value).where(
+            CellValue.value.is_not(None)
+        )
+        rows = (await self.db.execute(query)).all()
+        groups: Dict[Tuple[bool, int], Tuple[set, list]] = {}
+        for is_ocv, reading_number, bank_id, value in rows:
+            bank_ids, values = groups.setdefault((bool(is_ocv), reading_number), (set(), []))
+            bank_ids.add(bank_id)
+            values.append(value)
+
+        readings = []
+        for (is_ocv, reading_number), (bank_ids, values) in sorted(groups.items(), key=lambda item: (not item[0][0], item[0][1])):
+            values = np.asarray(values, dtype=np.float64)
+            buckets = np.clip(np.floor((values - low) / (high - low) * bins).astype(np.int64), 0, bins - 1)
+            readings.append({
+                "is_ocv": is_ocv,
+                "reading_number": reading_number,
+                "banks": len(bank_ids),
+                "cells": int(values.size),
+                "mean": float(values.mean()),
+                "std": float(values.std()),
+                "min": float(values.min()),
+                "max": float(values.max()),
+                "percentiles": {
+                    f"p{round(p * 100)}": float(v)
+                    for p, v in zip(PERCENTILES, np.percentile(values, [p * 100 for p in PERCENTILES]))
+                },
+                "histogram": np.bincount(buckets, minlength=bins).tolist(),
+            })
+        return readings
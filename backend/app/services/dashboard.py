@@ -0,0 +1,142 @@
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.models import Test, Bank, Cycle, Reading, CellValue, Change, TestStatus
+from .change_feed import change_position, settled_position
+
+# (expiry, summary); one summary serves every visitor until it expires
+_cache: Optional[Tuple[float, dict]] = None
+
+def _hour(column, dialect: str):
+    """Truncate a timestamp column to the hour in the database."""
+    if dialect == "postgresql":
+        return func.date_trunc("hour", column)
+    return func.strftime("%Y-%m-%d %H:00:00", column)
+
+def _as_datetime(value) -> datetime:
+    # SQLite returns the strftime bucket as text
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+class DashboardService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def summary(self) -> dict:
+        """Status counts, active tests and ingest rate, cached for DASHBOARD_CACHE_SECONDS."""
+        global _cache
+        if _cache and _cache[0] > time.monotonic():
+            return _cache[1]
+
+        status_rows = await self.db.execute(select(Test.status, func.count()).group_by(Test.status))
+        status_counts = {status.value: 0 for status in TestStatus}
+        status_counts.update({status: count for status, count in status_rows.all()})
+
+        active_query = (
+            select(
+                Test.id, Test.job_number, Test.customer_name, Test.start_time,
+                func.max(Reading.timestamp).label("latest_reading_at"),
+                func.count(Reading.id).label("readings"),
+            )
+            .outerjoin(Bank, Bank.test_id == Test.id)
+            .outerjoin(Cycle, Cycle.bank_id == Bank.id)
+            .outerjoin(Reading, Reading.cycle_id == Cycle.id)
+            .where(Test.status == TestStatus.IN_PROGRESS.value)
+            .group_by(Test.id, Test.job_number, Test.customer_name, Test.start_time)
+            .order_by(Test.start_time)
+        )
+        active_tests = [dict(row._mapping) for row in (await self.db.execute(active_query)).all()]
+
+        since = datetime.utcnow().replace(minute=0, second=0, microsecond=0) - timedelta(hours=23)
+        hour = _hour(Reading.timestamp, self.db.get_bind().dialect.name).label("hour")
+        hourly_query = (
+            select(hour, func.count().label("readings"))
+            .where(Reading.timestamp >= since)
+            .group_by(hour)
+            .order_by(hour)
+        )
+        readings_per_hour = [
+            {"hour": _as_datetime(row.hour), "readings": row.readings}
+            for row in (await self.db.execute(hourly_query)).all()
+        ]
+
+        recent_query = select(Test).order_by(Test.created_at.desc()).limit(10)
+        recent_tests = (await self.db.execute(recent_query)).scalars().all()
+
+        summary = {
+            "generated_at": datetime.utcnow(),
+            "status_counts": status_counts,
+            "active_tests": active_tests,
+            "readings_per_hour": readings_per_hour,
+            "readings_last_24h": sum(row["readings"] for row in readings_per_hour),
+            "recent_tests": recent_tests,
+        }
+        _cache = (time.monotonic() + settings.DASHBOARD_CACHE_SECONDS, summary)
+        return summary
+
+    async def progress(self, since: int = 0) -> dict:
+        """In-progress tests and statistics of their readings recorded after change feed cursor `since`.
+
+        The first call (since=0) returns only each bank's latest reading, so a new viewer
+        does not download history; later calls return only what was recorded since.
+        """
+        cursor = max(since, await settled_position(self.db))
+
+        tests_query = (
+            select(Test.id, Test.job_number, Test.customer_name, Test.number_of_cycles, Test.start_time)
+            .where(Test.status == TestStatus.IN_PROGRESS.value)
+            .order_by(Test.start_time)
+        )
+        tests = [dict(row._mapping) for row in (await self.db.execute(tests_query)).all()]
+
+        readings_query = (
+            select(
+                Test.id.label("test_id"), Bank.id.label("bank_id"), Bank.bank_number, Cycle.cycle_number,
+                Reading.reading_number, Reading.is_ocv, Reading.timestamp,
+                func.count(CellValue.id).label("cells"),
+                func.min(CellValue.value).label("min"),
+                func.avg(CellValue.value).label("mean"),
+                func.max(CellValue.value).label("max"),
+                func.coalesce(func.sum(case((CellValue.flags != 0, 1), else_=0)), 0).label("flagged"),
+            )
+            .join(Bank, Bank.test_id == Test.id)
+            .join(Cycle, Cycle.bank_id == Bank.id)
+            .join(Reading, Reading.cycle_id == Cycle.id)
+            .outerjoin(CellValue, CellValue.reading_id == Reading.id)
+            .where(Test.status == TestStatus.IN_PROGRESS.value)
+            .group_by(
+                Test.id, Bank.id, Bank.bank_number, Cycle.cycle_number,
+                Reading.id, Reading.reading_number, Reading.is_ocv, Reading.timestamp,
+            )
+            .order_by(Reading.timestamp)
+        )
+        if since:
+            position = change_position(self.db.get_bind().dialect.name)
+            readings_query = readings_query.where(Reading.id.in_(
+                select(Change.entity_id)
+                .where(Change.entity_type == "reading", position >= since, position < cursor)
+            ))
+        else:
+            # One reading per bank of an in-progress test, even when timestamps tie
+            ranked = (
+                select(
+                    Reading.id,
+                    func.row_number().over(
+                        partition_by=Cycle.bank_id, order_by=(Reading.timestamp.desc(), Reading.reading_number.desc(), Reading.id.desc())
+                    ).label("rank"),
+                )
+                .join(Cycle, Cycle.id == Reading.cycle_id)
+                .join(Bank, Bank.id == Cycle.bank_id)
+                .join(Test, Test.id == Bank.test_id)
+                .where(Test.status == TestStatus.IN_PROGRESS.value)
+                .subquery()
+            )
+            readings_query = readings_query.where(
+                Reading.id.in_(select(ranked.c.id).where(ranked.c.rank == 1))
+            )
+        readings = [dict(row._mapping) for row in (await self.db.execute(readings_query)).all()]
+        return {"cursor": cursor, "tests": tests, "readings": readings}
@@ -0,0 +1,230 @@
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..db.models import Bank, Cycle, Reading, CellValue
+from ..schemas.grading import GradingRequest, GroupingMethod
+from .capacity import analyze_bank, build_voltage_matrices, discharge_current
+
+# Metric -> GradeThreshold field holding its minimum
+THRESHOLDS = {
+    "ocv": "min_ocv",
+    "end_voltage": "min_end_voltage",
+    "capacity_percent": "min_capacity_percent",
+}
+
+def assign_grades(metrics: Dict[str, np.ndarray], grades: List[dict]) -> np.ndarray:
+    """Index of the first grade each cell meets, -1 for none.
+
+    A cell with a missing (NaN) metric fails every threshold set on that metric.
+    """
+    size = next(iter(metrics.values())).size
+    passes = np.ones((len(grades), size), dtype=bool)
+    for index, grade in enumerate(grades):
+        for metric, field in THRESHOLDS.items():
+            if grade.get(field) is not None:
+                passes[index] &= metrics[metric] >= grade[field]
+    return np.where(passes.any(axis=0), passes.argmax(axis=0), -1)
+
+def window_groups(values: np.ndarray, k: int) -> List[np.ndarray]:
+    """Split cells into as many groups of k as possible with the least total spread.
+
+    Groups are runs of k consecutive cells in sorted order. Of the n mod k cells left
+    over, the ones dropped are chosen by dynamic programming over (group, cells
+    skipped so far), so a straggler at either end or in a gap is left out instead of
+    widening a group. Returns the indexes of each group's cells.
+    """
+    order = np.argsort(values, kind="stable")
+    ordered = values[order]
+    groups, leftover = divmod(ordered.size, k)
+    if groups == 0:
+        return []
+    spreads = ordered[k - 1:] - ordered[:ordered.size - k + 1]
+    # cost[g, s]: spread of group g when s cells were skipped before it
+    cost = spreads[np.arange(groups)[:, None] * k + np.arange(leftover + 1)]
+    best = np.empty_like(cost)
+    best[0] = cost[0]
+    for group in range(1, groups):
+        best[group] = cost[group] + np.minimum.accumulate(best[group - 1])
+
+    skipped = int(best[-1].argmin())
+    result = []
+    for group in range(groups - 1, -1, -1):
+        start = group * k + skipped
+        result.append(order[start:start + k])
+        if group:
+            skipped = int(best[group - 1][:skipped + 1].argmin())
+    result.reverse()
+    return result
+
+def cluster_groups(features: np.ndarray, k: int) -> List[np.ndarray]:
+    """Groups of k cells that are close on several metrics at once.
+
+    Metrics are standardized and cells ordered along their principal axis, the
+    direction in which they differ most, then split like `window_groups`.
+    """
+    std = features.std(axis=0)
+    varying = std > 0
+    if not varying.any():
+        return window_groups(np.zeros(features.shape[0]), k)
+    scaled = (features[:, varying] - features[:, varying].mean(axis=0)) / std[varying]
+    _, _, components = np.linalg.svd(scaled, full_matrices=False)
+    return window_groups(scaled @ components[0], k)
+
+def _optional(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+class GradingService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def _banks(self, bank_ids: List[UUID], test_ids: List[UUID]) -> Optional[List[Bank]]:
+        """Requested banks and every bank of the requested tests; None if a bank does not exist."""
+        query = (
+            select(Bank)
+            .where(or_(Bank.id.in_(bank_ids), Bank.test_id.in_(test_ids)))
+            .order_by(Bank.test_id, Bank.bank_number)
+        )
+        banks = (await self.db.execute(query)).scalars().all()
+        if set(bank_ids) - {bank.id for bank in banks}:
+            return None
+        return banks
+
+    async def _cycle_metrics(
+        self, banks: List[Bank], cycle_number: Optional[int], cutoff: float
+    ) -> Dict[UUID, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """Per bank: first OCV, last CCV and capacity percent of every cell in the graded cycle (NaN if missing).
+
+        The graded cycle is `cycle_number`, or each bank's latest cycle with readings.
+        Two queries cover every bank, whatever their number.
+        """
+        readings = (await self.db.execute(
+            select(Cycle.bank_id, Cycle.cycle_number, Reading.id, Reading.timestamp, Reading.is_ocv)
+            .join(Reading, Reading.cycle_id == Cycle.id)
+            .where(Cycle.bank_id.in_([bank.id for bank in banks]))
+            .order_by(Cycle.bank_id, Cycle.cycle_number, Reading.is_ocv.desc(), Reading.timestamp)
+        )).all()
+
+        graded: Dict[UUID, int] = {}
+        for bank_id, number, _, _, _ in readings:
+            if cycle_number is None or number == cycle_number:
+                graded[bank_id] = number  # the last one seen is the bank's latest cycle
+        # Rows of each bank's graded cycle, in the order build_voltage_matrices expects
+        cycle_readings: Dict[UUID, list] = {}
+        for bank_id, number, reading_id, timestamp, is_ocv in readings:
+            if graded.get(bank_id) == number:
+                cycle_readings.setdefault(bank_id, []).append((reading_id, number, timestamp, is_ocv))
+
+        bank_of = {row[0]: bank_id for bank_id, rows in cycle_readings.items() for row in rows}
+        values = (await self.db.execute(
+            select(CellValue.reading_id, CellValue.cell_number, CellValue.value)
+            .where(CellValue.reading_id.in_(list(bank_of)))
+        )).all() if bank_of else []
+        bank_values: Dict[UUID, list] = {}
+        for row in values:
+            bank_values.setdefault(bank_of[row.reading_id], []).append(row)
+
+        result = {}
+        for bank in banks:
+            missing = np.full(bank.number_of_cells, np.nan)
+            rows = cycle_readings.get(bank.id)
+            if not rows:
+                result[bank.id] = (missing, missing, missing)
+                continue
+            matrices = build_voltage_matrices([row[:3] for row in rows], bank_values.get(bank.id, []), bank.number_of_cells)
+            _, matrix = matrices[graded[bank.id]]
+            analysis = analyze_bank(matrices, discharge_current(bank), bank.cell_rate, cutoff)
+            # OCV readings sort first, so the first row is an OCV and the last a CCV when there are any
+            result[bank.id] = (
+                matrix[0] if rows[0][3] else missing,
+                matrix[-1] if not rows[-1][3] else missing,
+                np.asarray(analysis["cycles"][0]["percent_of_rated"], dtype=np.float64),
+            )
+        return result
+
+    async def grade(self, request: GradingRequest) -> Optional[dict]:
+        """Grade every cell of the requested banks and form matched groups within each grade."""
+        banks = await self._banks(request.bank_ids, request.test_ids)
+        if banks is None:
+            return None
+        cutoff = settings.CUTOFF_VOLTAGE if request.cutoff_voltage is None else request.cutoff_voltage
+        cycle_metrics = await self._cycle_metrics(banks, request.cycle_number, cutoff)
+
+        bank_index, cell_numbers, ocv, end_voltage, capacity_percent = [], [], [], [], []
+        for index, bank in enumerate(banks):
+            bank_ocv, bank_end, percent = cycle_metrics[bank.id]
+            bank_index.append(np.full(bank.number_of_cells, index))
+            cell_numbers.append(np.arange(1, bank.number_of_cells + 1))
+            ocv.append(bank_ocv)
+            end_voltage.append(bank_end)
+            capacity_percent.append(percent)
+
+        def concat(parts: list, dtype) -> np.ndarray:
+            return np.concatenate(parts).astype(dtype) if parts else np.empty(0, dtype=dtype)
+
+        metrics = {
+            "ocv": concat(ocv, np.float64),
+            "end_voltage": concat(end_voltage, np.float64),
+            "capacity_percent": concat(capacity_percent, np.float64),
+        }
+        bank_index = concat(bank_index, np.int64)
+        cell_numbers = concat(cell_numbers, np.int64)
+        grades = [grade.model_dump() for grade in request.grades]
+        grade_index = assign_grades(metrics, grades) if bank_index.size else np.empty(0, dtype=np.int64)
+
+        match = metrics[request.match_on.value]
+        if request.method == GroupingMethod.CLUSTER:
+            # Cluster on every metric that was measured for some cell
+            features = np.column_stack([m for m in metrics.values() if not np.isnan(m).all()] or [match])
+            complete = ~np.isnan(features).any(axis=1)
+        else:
+            complete = ~np.isnan(match)
+
+        group_of = np.full(bank_index.size, -1)
+        groups = []
+        for index, grade in enumerate(grades):
+            members = np.flatnonzero((grade_index == index) & complete)
+            if members.size < request.group_size:
+                continue
+            if request.method == GroupingMethod.CLUSTER:
+                local_groups = cluster_groups(features[members], request.group_size)
+            else:
+                local_groups = window_groups(match[members], request.group_size)
+            for local in local_groups:
+                cells = members[local]
+                group_of[cells] = len(groups)
+                groups.append({
+                    "group": len(groups),
+                    "grade": grade["grade"],
+                    "spread": _optional(np.ptp(match[cells])),
+                    "cells": cells.tolist(),
+                })
+
+        counts = np.bincount(grade_index[grade_index >= 0], minlength=len(grades))
+        return {
+            "banks": len(banks),
+            "grade_counts": {grade["grade"]: int(count) for grade, count in zip(grades, counts)},
+            "rejected": int((grade_index < 0).sum()),
+            "unmatched": int(((grade_index >= 0) & (group_of < 0)).sum()),
+            "cells": [
+                {
+                    "bank_id": banks[b].id,
+                    "cell_number": int(n),
+                    "ocv": _optional(o),
+                    "end_voltage": _optional(e),
+                    "capacity_percent": _optional(c),
+                    "grade": grades[g]["grade"] if g >= 0 else None,
+                    "group": int(group) if group >= 0 else None,
+                }
+                for b, n, o, e, c, g, group in zip(
+                    bank_index.tolist(), cell_numbers.tolist(), metrics["ocv"].tolist(),
+                    metrics["end_voltage"].tolist(), metrics["capacity_percent"].tolist(),
+                    grade_index.tolist(), group_of.tolist(),
+                )
+            ],
+            "groups": groups,
+        }
@@ -0,0 +1,47 @@
+from typing import Optional
+
+import numpy as np
+
+from ..core.config import settings
+
+# Little-endian encodings accepted for binary reading payloads
+BINARY_DTYPES = {
+    "float32": np.dtype("<f4"),  # volts
+    "int16_mv": np.dtype("<i2"),  # millivolts
+}
+
+def decode_cell_values(body: bytes, encoding: str) -> np.ndarray:
+    """Decode a binary payload of one value per cell, in cell order, to volts."""
+    dtype = BINARY_DTYPES[encoding]
+    if len(body) % dtype.itemsize:
+        raise ValueError(f"Payload length {len(body)} is not a multiple of {dtype.itemsize} bytes")
+    values = np.frombuffer(body, dtype=dtype).astype(np.float64)
+    if encoding == "int16_mv":
+        values /= 1000.0
+    else:
+        # Drop float32 representation noise such as 1.2000000476837158
+        values = np.round(values, 6)
+    return values
+
+def validate_cell_values(values: np.ndarray, number_of_cells: int) -> Optional[str]:
+    """Check the count, NaN/zero and voltage range of a reading; returns an error or None.
+
+    Dead cells (above zero but at most DEAD_CELL_VOLTAGE) and, when CELL_VOLTAGE_MIN
+    is negative, reversed cells are accepted for `detect_anomalies` to flag.
+    """
+    if values.shape != (number_of_cells,):
+        return f"Expected {number_of_cells} cell values, got {values.size}"
+    invalid = (
+        ~np.isfinite(values)
+        | (values == 0)
+        | (values < settings.CELL_VOLTAGE_MIN)
+        | (values > settings.CELL_VOLTAGE_MAX)
+    )
+    if invalid.any():
+        cells = np.flatnonzero(invalid) + 1
+        listed = ", ".join(map(str, cells[:10])) + (" ..." if cells.size > 10 else "")
+        return (
+            f"Cells {listed} must be non-zero and between "
+            f"{settings.CELL_VOLTAGE_MIN} and {settings.CELL_VOLTAGE_MAX} V"
+        )
+    return None
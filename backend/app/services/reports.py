@@ -0,0 +1,525 @@
+import asyncio
+import csv
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Set, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.compression import COMPRESSIBLE_TYPES, precompress
+from ..core.config import settings
+from ..db.base import AsyncSessionLocal
+from ..db.models import Test, Bank, Cycle, Reading, CellValue, TestStatus
+from .capacity import build_voltage_matrices
+from .series import minmax_downsample
+
+logger = logging.getLogger(__name__)
+
+REPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+
+# Python packages each format needs besides numpy
+FORMAT_REQUIREMENTS = {
+    "csv": [],
+    "xlsx": ["pandas", "openpyxl"],
+    "pdf": ["matplotlib"],
+}
+
+_executor: Optional[ProcessPoolExecutor] = None
+_running: Set[asyncio.Task] = set()
+_building: Set[UUID] = set()  # tests whose final artifacts this worker is building
+
+def format_available(fmt: str) -> bool:
+    return all(importlib.util.find_spec(name) for name in FORMAT_REQUIREMENTS[fmt])
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.per_worker(settings.REPORT_WORKERS))
+    return _executor
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def _jobs_dir() -> Path:
+    path = Path(settings.REPORTS_DIR) / "jobs"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def _artifacts_dir() -> Path:
+    path = Path(settings.REPORTS_DIR) / "artifacts"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+# Rendering runs in worker processes, so it only takes plain data
+
+def _metadata_rows(test: dict, bank: dict) -> List[List]:
+    return [
+        ["Job Number", test["job_number"]],
+        ["Customer Name", test["customer_name"]],
+        ["Bank Number", bank["bank_number"]],
+        ["Cell Type", bank["cell_type"]],
+        ["Cell Rate", bank["cell_rate"]],
+        ["Percentage Capacity", bank["percentage_capacity"]],
+        ["Discharge Current", bank["discharge_current"]],
+        ["Number of Cells", bank["number_of_cells"]],
+    ]
+
+def _render_csv(path: Path, test: dict, banks: List[dict]) -> None:
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, "w", newline="") as f:
+        writer = csv.writer(f)
+        for index, bank in enumerate(banks):
+            if index:
+                writer.writerow([])
+            writer.writerows(_metadata_rows(test, bank))
+            writer.writerow([])
+            writer.writerow(["Cell Number"] + bank["columns"])
+            values = np.where(np.isnan(bank["matrix"]), "", np.round(bank["matrix"], 4).astype(str))
+            for cell_number, row in enumerate(values, start=bank["first_cell"]):
+                writer.writerow([cell_number, *row])
+    os.replace(tmp, path)
+
+def _render_xlsx(path: Path, test: dict, banks: List[dict]) -> None:
+    import pandas as pd
+
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with pd.ExcelWriter(tmp, engine="openpyxl") as writer:
+        for bank in banks:
+            sheet = f"Bank {bank['bank_number']}"
+            metadata = _metadata_rows(test, bank)
+            pd.DataFrame(metadata).to_excel(writer, sheet_name=sheet, header=False, index=False)
+            table = pd.DataFrame(bank["matrix"], columns=bank["columns"])
+            table.insert(0, "Cell Number", np.arange(bank["first_cell"], bank["first_cell"] + len(table)))
+            table.to_excel(writer, sheet_name=sheet, startrow=len(metadata) + 1, index=False)
+    os.replace(tmp, path)
+
+def _render_pdf(path: Path, test: dict, banks: List[dict]) -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with PdfPages(tmp) as pdf:
+        for bank in banks:
+            matrix = bank["matrix"]
+            fig, (info, curves, spread) = plt.subplots(3, 1, figsize=(8.27, 11.69))
+            info.axis("off")
+            info.text(0, 1, "\n".join(f"{k}: {v}" for k, v in _metadata_rows(test, bank)), va="top", family="monospace")
+            if matrix.size:
+                x = np.arange(matrix.shape[1])
+                with np.errstate(all="ignore"):
+                    curves.plot(x, np.nanmean(matrix, axis=0), label="Mean")
+                    curves.fill_between(x, np.nanmin(matrix, axis=0), np.nanmax(matrix, axis=0), alpha=0.3, label="Min-max")
+                curves.set_xticks(x, bank["columns"], rotation=90, fontsize=6)
+                curves.set_ylabel("Voltage (V)")
+                curves.legend()
+                spread.boxplot([column[~np.isnan(column)] for column in matrix.T], showfliers=True)
+                spread.set_xticks(x + 1, bank["columns"], rotation=90, fontsize=6)
+                spread.set_ylabel("Voltage (V)")
+            fig.tight_layout()
+            pdf.savefig(fig)
+            plt.close(fig)
+    os.replace(tmp, path)
+
+RENDERERS = {"csv": _render_csv, "xlsx": _render_xlsx, "pdf": _render_pdf}
+
+def report_banks(bank_rows: List[dict]) -> List[dict]:
+    """Each bank's cells x readings matrix with column labels, from `load_report_data` rows."""
+    banks = []
+    for bank in bank_rows:
+        bank = dict(bank)
+        bank_readings, values, width = bank.pop("readings"), bank.pop("values"), bank.pop("width")
+        matrices = build_voltage_matrices([r[:3] for r in bank_readings], values, width)
+        matrix = (
+            np.vstack([matrices[c][1] for c in sorted(matrices)]).T
+            if matrices else np.empty((width, 0))
+        )
+
+        columns, ocv_count, ccv_count = [], 0, 0
+        for *_, is_ocv in bank_readings:
+            if is_ocv:
+                ocv_count += 1
+                columns.append("OCV" if ocv_count == 1 else f"OCV {ocv_count}")
+            else:
+                ccv_count += 1
+                columns.append(f"CCV {ccv_count}")
+
+        timestamps = np.asarray([r[2] for r in bank_readings], dtype="datetime64[us]")
+        bank.update(
+            columns=columns,
+            hours=(timestamps - timestamps[:1]).astype(np.int64) / 3.6e9 if timestamps.size else np.empty(0),
+            matrix=matrix,
+        )
+        banks.append(bank)
+    return banks
+
+def render_report(fmt: str, path: str, test: dict, bank_rows: List[dict]) -> str:
+    """Render a report file; runs in a worker process."""
+    RENDERERS[fmt](Path(path), test, report_banks(bank_rows))
+    if REPORT_FORMATS[fmt].startswith(COMPRESSIBLE_TYPES):
+        precompress(Path(path))
+    return path
+
+def _json_values(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(v) else round(float(v), 4) for v in values]
+
+def bank_statistics(bank: dict) -> dict:
+    """Per-reading count, mean, spread and quartiles over the bank's cells."""
+    readings = []
+    for label, column in zip(bank["columns"], bank["matrix"].T):
+        values = column[~np.isnan(column)]
+        summary = np.full(7, np.nan)
+        if values.size:
+            summary = np.r_[
+                values.mean(),
+                values.std(ddof=1) if values.size > 1 else np.nan,
+                np.percentile(values, [0, 25, 50, 75, 100]),
+            ]
+        mean, std, low, p25, median, p75, high = _json_values(summary)
+        readings.append({
+            "reading": label, "count": int(values.size), "mean": mean, "std": std,
+            "min": low, "p25": p25, "median": median, "p75": p75, "max": high,
+        })
+    return {"bank_id": bank["id"], "bank_number": bank["bank_number"], "readings": readings}
+
+def bank_series(bank: dict, points: int) -> dict:
+    """Chart-ready bank envelope and per-cell voltage series, each cell reduced to `points`."""
+    matrix, hours = bank["matrix"], bank["hours"]
+    with np.errstate(all="ignore"):
+        envelope = {
+            "mean": _json_values(np.nanmean(matrix, axis=0)),
+            "min": _json_values(np.nanmin(matrix, axis=0)),
+            "max": _json_values(np.nanmax(matrix, axis=0)),
+        } if matrix.size else {"mean": [], "min": [], "max": []}
+    cells = []
+    for cell_number, column in enumerate(matrix, start=bank["first_cell"]):
+        x, y = minmax_downsample(hours, column, points)
+        cells.append({"cell_number": cell_number, "hours": _json_values(x), "voltage": _json_values(y)})
+    return {
+        "bank_id": bank["id"],
+        "columns": bank["columns"],
+        "hours": _json_values(hours),
+        **envelope,
+        "cells": cells,
+    }
+
+# Artifacts stored for a completed test, per bank
+FINAL_ARTIFACTS = {
+    "report.csv": "text/csv",
+    "statistics.json": "application/json",
+    "series.json": "application/json",
+}
+
+# The whole test as GET /tests/{id} returns it, stored beside the bank artifacts
+FINAL_TREE = "test.json"
+
+def _final_dir(test_id) -> Path:
+    return Path(settings.REPORTS_DIR) / "final" / str(test_id)
+
+def render_final_artifacts(directory: str, version: str, test: dict, bank_rows: List[dict], points: int) -> dict:
+    """Write every bank's report, statistics and series; runs in a worker process.
+
+    Files are written to a scratch directory that is renamed into place, so readers
+    only ever see a complete set. Older versions of the test are removed.
+    """
+    banks = report_banks(bank_rows)
+    target = Path(directory) / version
+    target.parent.mkdir(parents=True, exist_ok=True)
+    scratch = target.with_name(f".{version}.{uuid.uuid4().hex}.tmp")
+    scratch.mkdir()
+    for bank in banks:
+        bank_dir = scratch / bank["id"]
+        bank_dir.mkdir()
+        _render_csv(bank_dir / "report.csv", test, [bank])
+        (bank_dir / "statistics.json").write_text(json.dumps(bank_statistics(bank)))
+        (bank_dir / "series.json").write_text(json.dumps(bank_series(bank, points)))
+        for artifact in FINAL_ARTIFACTS:
+            precompress(bank_dir / artifact)
+    manifest = {
+        "version": version,
+        "banks": [{"bank_id": bank["id"], "bank_number": bank["bank_number"]} for bank in banks],
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    (scratch / "manifest.json").write_text(json.dumps(manifest))
+    try:
+        os.rename(scratch, target)
+    except OSError:
+        # Another worker finished the same version first
+        shutil.rmtree(scratch, ignore_errors=True)
+    for stale in target.parent.iterdir():
+        if stale.name != version and not stale.name.startswith("."):
+            shutil.rmtree(stale, ignore_errors=True)
+    return manifest
+
+class ReportService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def test_version(self, test_id: UUID) -> Optional[str]:
+        """Fingerprint of a test's data; changes when readings, banks or status change."""
+        test = await self.db.get(Test, test_id)
+        if test is None:
+            return None
+        query = (
+            select(func.count(func.distinct(Bank.id)), func.count(Reading.id), func.max(Reading.timestamp))
+            .select_from(Bank)
+            .outerjoin(Cycle, Cycle.bank_id == Bank.id)
+            .outerjoin(Reading, Reading.cycle_id == Cycle.id)
+            .where(Bank.test_id == test_id)
+        )
+        banks, readings, latest = (await self.db.execute(query)).one()
+        key = f"{test.status}|{banks}|{readings}|{latest}"
+        return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    async def final_tree(self, test_id: UUID) -> Optional[Tuple[Path, str]]:
+        """The stored tree of a completed test and its version, if one is stored for its current data."""
+        test = await self.db.get(Test, test_id)
+        if test is None or test.status != TestStatus.COMPLETED:
+            return None
+        version = await self.test_version(test_id)
+        path = final_tree_path(test_id, version)
+        return (path, version) if path.is_file() else None
+
+    async def load_report_data(
+        self,
+        test_id: UUID,
+        bank_id: Optional[UUID] = None,
+        cells: Optional[Tuple[int, int]] = None,
+        readings: Optional[Tuple[int, int]] = None,
+    ):
+        """Test metadata and each bank's reading and cell value rows.
+
+        `cells` and `readings` narrow the rows to inclusive cell and reading number ranges.
+        The rows are pivoted by `report_banks` in the worker process, off the event loop.
+        """
+        test = await self.db.get(Test, test_id)
+        query = select(Bank).where(Bank.test_id == test_id).order_by(Bank.bank_number)
+        if bank_id is not None:
+            query = query.where(Bank.id == bank_id)
+        banks = (await self.db.execute(query)).scalars().all()
+
+        bank_rows = []
+        for bank in banks:
+            first_cell, last_cell = cells or (1, bank.number_of_cells)
+            last_cell = min(last_cell, bank.number_of_cells)
+            readings_query = (
+                select(Reading.id, Cycle.cycle_number, Reading.timestamp, Reading.is_ocv)
+                .join(Cycle, Reading.cycle_id == Cycle.id)
+                .where(Cycle.bank_id == bank.id)
+                .order_by(Cycle.cycle_number, Reading.is_ocv.desc(), Reading.timestamp)
+            )
+            # Cell numbers are shifted so the first cell in range lands in the first matrix row
+            values_query = (
+                select(CellValue.reading_id, CellValue.cell_number - first_cell + 1, CellValue.value)
+                .join(Reading, CellValue.reading_id == Reading.id)
+                .join(Cycle, Reading.cycle_id == Cycle.id)
+                .where(Cycle.bank_id == bank.id, CellValue.cell_number.between(first_cell, last_cell))
+            )
+            if readings is not None:
+                readings_query = readings_query.where(Reading.reading_number.between(*readings))
+                values_query = values_query.where(Reading.reading_number.between(*readings))
+            bank_rows.append({
+                "id": str(bank.id),
+                "bank_number": bank.bank_number,
+                "cell_type": bank.cell_type,
+                "cell_rate": bank.cell_rate,
+                "percentage_capacity": bank.percentage_capacity,
+                "discharge_current": bank.discharge_current,
+                "number_of_cells": bank.number_of_cells,
+                "first_cell": first_cell,
+                "width": max(last_cell - first_cell + 1, 0),
+                "readings": [tuple(row) for row in (await self.db.execute(readings_query)).all()],
+                "values": [tuple(row) for row in (await self.db.execute(values_query)).all()],
+            })
+        test_data = {"job_number": test.job_number, "customer_name": test.customer_name}
+        return test_data, bank_rows
+
+    async def enqueue(
+        self,
+        test_id: UUID,
+        bank_id: Optional[UUID],
+        fmt: str,
+        cells: Optional[Tuple[int, int]] = None,
+        readings: Optional[Tuple[int, int]] = None,
+    ) -> Optional[dict]:
+        """Create a report job; completed immediately if the artifact is already cached."""
+        version = await self.test_version(test_id)
+        if version is None:
+            return None
+        cells_label = f"{cells[0]}-{cells[1]}" if cells else None
+        readings_label = f"{readings[0]}-{readings[1]}" if readings else None
+        scope = f"{bank_id or 'all'}_{cells_label or 'cells'}_{readings_label or 'readings'}"
+        artifact = _artifacts_dir() / f"{test_id}_{scope}_{version}.{fmt}"
+        job = {
+            "id": str(uuid.uuid4()),
+            "test_id": str(test_id),
+            "bank_id": str(bank_id) if bank_id else None,
+            "format": fmt,
+            "cells": cells_label,
+            "readings": readings_label,
+            "status": "queued",
+            "progress": 0.0,
+            "artifact": str(artifact),
+            "error": None,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        if artifact.exists():
+            job.update(status="completed", progress=1.0)
+            save_job(job)
+            return job
+        save_job(job)
+        task = asyncio.create_task(run_job(job))
+        _running.add(task)
+        task.add_done_callback(_running.discard)
+        return job
+
+def save_job(job: dict) -> None:
+    job["updated_at"] = datetime.utcnow().isoformat()
+    _write_atomic(_jobs_dir() / f"{job['id']}.json", json.dumps(job).encode())
+
+def _stale(job: dict) -> bool:
+    """Whether an unfinished job has made no progress for REPORT_JOB_TIMEOUT_SECONDS."""
+    if job["status"] not in ("queued", "running"):
+        return False
+    updated = datetime.fromisoformat(job.get("updated_at") or job["created_at"])
+    return (datetime.utcnow() - updated).total_seconds() > settings.REPORT_JOB_TIMEOUT_SECONDS
+
+def load_job(job_id: UUID) -> Optional[dict]:
+    """Job state is kept on disk so any API worker can report on it.
+
+    A job whose worker exited mid-run would stay running forever, so one that has
+    not progressed within the timeout is reported, and saved, as failed.
+    """
+    path = _jobs_dir() / f"{job_id}.json"
+    if not path.exists():
+        return None
+    job = json.loads(path.read_text())
+    if _stale(job):
+        job.update(status="failed", error="Report job timed out")
+        save_job(job)
+    return job
+
+def _job_range(label: Optional[str]) -> Optional[Tuple[int, int]]:
+    if not label:
+        return None
+    first, _, last = label.partition("-")
+    return int(first), int(last)
+
+async def _render_job(job: dict) -> None:
+    job.update(status="running", progress=0.1)
+    save_job(job)
+    async with AsyncSessionLocal() as session:
+        test, bank_rows = await ReportService(session).load_report_data(
+            UUID(job["test_id"]),
+            UUID(job["bank_id"]) if job["bank_id"] else None,
+            _job_range(job["cells"]),
+            _job_range(job["readings"]),
+        )
+    job.update(progress=0.4)
+    save_job(job)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(get_executor(), render_report, job["format"], job["artifact"], test, bank_rows)
+
+async def run_job(job: dict) -> None:
+    try:
+        # Give up when load_job would report the job as timed out anyway
+        await asyncio.wait_for(_render_job(job), settings.REPORT_JOB_TIMEOUT_SECONDS)
+        job.update(status="completed", progress=1.0)
+    except asyncio.TimeoutError:
+        logger.error("Report job %s timed out", job["id"])
+        job.update(status="failed", error="Report job timed out")
+    except Exception as e:
+        logger.exception("Report job %s failed", job["id"])
+        job.update(status="failed", error=str(e))
+    save_job(job)
+
+def load_final_manifest(test_id: UUID, version: str) -> Optional[dict]:
+    path = _final_dir(test_id) / version / "manifest.json"
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+def final_artifact_path(test_id: UUID, version: str, bank_id: UUID, artifact: str) -> Path:
+    return _final_dir(test_id) / version / str(bank_id) / artifact
+
+def final_tree_path(test_id: UUID, version: str) -> Path:
+    return _final_dir(test_id) / version / FINAL_TREE
+
+async def _write_final_tree(test_id: UUID, path: Path) -> None:
+    # Imported here because test_service imports this module
+    from .test_service import TestService
+
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    async with AsyncSessionLocal() as session:
+        body = await TestService(session).stream_test(test_id)
+        if body is None:
+            return
+        with open(tmp, "wb") as f:
+            async for chunk in body:
+                f.write(chunk)
+    os.replace(tmp, path)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(get_executor(), precompress, path)
+
+async def build_final_artifacts(test_id: UUID) -> Optional[dict]:
+    """Precompute the stored artifacts of a completed test, reusing them if current."""
+    async with AsyncSessionLocal() as session:
+        service = ReportService(session)
+        version = await service.test_version(test_id)
+        if version is None:
+            return None
+        manifest = load_final_manifest(test_id, version)
+        if manifest is None:
+            test, bank_rows = await service.load_report_data(test_id)
+    loop = asyncio.get_running_loop()
+    if manifest is None:
+        manifest = await loop.run_in_executor(
+            get_executor(), render_final_artifacts,
+            str(_final_dir(test_id)), version, test, bank_rows, settings.FINAL_SERIES_POINTS,
+        )
+    tree = final_tree_path(test_id, manifest["version"])
+    if not tree.is_file():
+        await _write_final_tree(test_id, tree)
+    return manifest
+
+async def _build_logged(test_id: UUID) -> None:
+    try:
+        await build_final_artifacts(test_id)
+    except Exception:
+        logger.exception("Precomputing artifacts for test %s failed", test_id)
+    finally:
+        _building.discard(test_id)
+
+def schedule_final_artifacts(test_ids: List[UUID]) -> None:
+    """Start precomputing the artifacts of tests that just completed, unless already under way."""
+    for test_id in test_ids:
+        if test_id in _building:
+            continue
+        _building.add(test_id)
+        task = asyncio.create_task(_build_logged(test_id))
+        _running.add(task)
+        task.add_done_callback(_running.discard)
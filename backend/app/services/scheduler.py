@@ -0,0 +1,313 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+
+from ..core.config import settings
+from ..db.base import AsyncSessionLocal
+from ..db.models import Test, Bank, Cycle, Reading, TestStatus
+from .change_feed import record_changes_bulk
+from .reports import schedule_final_artifacts
+
+logger = logging.getLogger(__name__)
+
+def cycle_length(test: Test) -> timedelta:
+    """Length of one cycle: one reading slot per time_interval."""
+    return timedelta(hours=test.time_interval * settings.READINGS_PER_CYCLE)
+
+def build_cycles(test: Test, bank_id: UUID) -> List[Cycle]:
+    """Create the Cycle rows for a bank from the test's cycle count and interval."""
+    length = cycle_length(test)
+    return [
+        Cycle(
+            bank_id=bank_id,
+            cycle_number=number,
+            reading_type="discharge",
+            start_time=test.start_time + length * (number - 1),
+            end_time=test.start_time + length * number,
+            duration=int(length.total_seconds() // 60),
+            readings=[],
+        )
+        for number in range(1, test.number_of_cycles + 1)
+    ]
+
+@dataclass
+class TestSchedule:
+    """In-memory schedule of one active test."""
+    test_id: UUID
+    job_number: str
+    start: float
+    interval: float
+    readings_per_cycle: int
+    number_of_cycles: int
+    # bank_id -> cycle_number -> cycle_id
+    cycles: Dict[UUID, Dict[int, UUID]] = field(default_factory=dict)
+    # Latest slot with a reading, from max(reading_number) per cycle in the database
+    recorded_slot: int = -1
+    in_progress: bool = False
+    # Counter of the test's live heap entry; older entries are skipped
+    token: int = -1
+
+    @property
+    def end(self) -> float:
+        return self.start + self.interval * self.readings_per_cycle * self.number_of_cycles
+
+    def slot_at(self, now: float) -> int:
+        """Index of the reading slot in progress at `now` (-1 before start)."""
+        if now < self.start:
+            return -1
+        return int((now - self.start) // self.interval)
+
+    def slot_info(self, slot: int) -> Tuple[int, int, float]:
+        """Return (cycle_number, reading_number, due_at) for a slot index."""
+        cycle_index, reading_index = divmod(slot, self.readings_per_cycle)
+        return cycle_index + 1, reading_index + 1, self.start + slot * self.interval
+
+    def next_event(self, now: float) -> Optional[float]:
+        if now < self.start:
+            return self.start
+        if now >= self.end:
+            return None
+        return min(self.start + (self.slot_at(now) + 1) * self.interval, self.end)
+
+def _epoch(value: datetime) -> float:
+    # Naive datetimes are wall-clock times entered by technicians
+    return value.timestamp()
+
+class CycleScheduler:
+    """Asyncio timer heap that tracks reading slots and status for all active tests.
+
+    Only the next event of each test sits in the heap, so thousands of tests cost one
+    heap entry each and no per-test polling queries. Status changes that fire together
+    are written with one UPDATE per status.
+    """
+
+    def __init__(self):
+        self._schedules: Dict[UUID, TestSchedule] = {}
+        # cycle_id -> (test_id, cycle_number)
+        self._cycle_tests: Dict[UUID, Tuple[UUID, int]] = {}
+        self._heap: List[Tuple[float, int, UUID]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def _schedule_for(self, test: Test) -> TestSchedule:
+        """The test's schedule, rebuilt if its start, interval or cycle count changed."""
+        schedule = self._schedules.get(test.id)
+        timing = (_epoch(test.start_time), test.time_interval * 3600.0, test.number_of_cycles)
+        if schedule is not None and (schedule.start, schedule.interval, schedule.number_of_cycles) == timing:
+            schedule.in_progress = schedule.in_progress or test.status == TestStatus.IN_PROGRESS
+            return schedule
+        if schedule is not None:
+            self.forget(test.id)
+        schedule = TestSchedule(
+            test_id=test.id,
+            job_number=test.job_number,
+            start=timing[0],
+            interval=timing[1],
+            readings_per_cycle=settings.READINGS_PER_CYCLE,
+            number_of_cycles=test.number_of_cycles,
+            in_progress=test.status == TestStatus.IN_PROGRESS,
+        )
+        self._schedules[test.id] = schedule
+        self._push(schedule, time.time())
+        return schedule
+
+    def register(self, test: Test, banks: List[Bank]) -> None:
+        """Add or refresh a test's schedule from its banks and cycles."""
+        if test.status == TestStatus.COMPLETED or not test.start_time:
+            self.forget(test.id)
+            return
+        schedule = self._schedule_for(test)
+        for bank in banks:
+            schedule.cycles[bank.id] = {cycle.cycle_number: cycle.id for cycle in bank.cycles}
+            for cycle in bank.cycles:
+                self._cycle_tests[cycle.id] = (test.id, cycle.cycle_number)
+
+    def forget(self, test_id: UUID) -> None:
+        """Drop a test; its stale heap entry is skipped when popped."""
+        schedule = self._schedules.pop(test_id, None)
+        if schedule:
+            for bank_cycles in schedule.cycles.values():
+                for cycle_id in bank_cycles.values():
+                    self._cycle_tests.pop(cycle_id, None)
+
+    def record_reading(self, cycle_id: UUID, reading_number: int) -> None:
+        """Mark a reading's slot as taken until the next sync reloads it from the database."""
+        test_id, cycle_number = self._cycle_tests.get(cycle_id, (None, 0))
+        schedule = self._schedules.get(test_id) if test_id else None
+        if schedule:
+            slot = (cycle_number - 1) * schedule.readings_per_cycle + reading_number - 1
+            schedule.recorded_slot = max(schedule.recorded_slot, slot)
+
+    def due(self, horizon: float = 0.0) -> List[dict]:
+        """Reading slots due now (or within `horizon` seconds) that have not been taken."""
+        now = time.time()
+        entries = []
+        for schedule in self._schedules.values():
+            if now >= schedule.end:
+                continue
+            slot = max(schedule.slot_at(now), 0)
+            if slot <= schedule.recorded_slot:
+                slot = schedule.recorded_slot + 1
+            cycle_number, reading_number, due_at = schedule.slot_info(slot)
+            if due_at > now + horizon or due_at >= schedule.end:
+                continue
+            entries.append({
+                "test_id": schedule.test_id,
+                "job_number": schedule.job_number,
+                "cycle_number": cycle_number,
+                "reading_number": reading_number,
+                "is_ocv": reading_number == 1,
+                "due_at": datetime.fromtimestamp(due_at),
+                "cycle_ids": [
+                    bank_cycles[cycle_number]
+                    for bank_cycles in schedule.cycles.values()
+                    if cycle_number in bank_cycles
+                ],
+            })
+        entries.sort(key=lambda entry: entry["due_at"])
+        return entries
+
+    def _push(self, schedule: TestSchedule, now: float) -> None:
+        when = schedule.next_event(now)
+        if when is None or (now >= schedule.start and not schedule.in_progress):
+            when = now
+        schedule.token = next(self._counter)
+        heapq.heappush(self._heap, (when, schedule.token, schedule.test_id))
+        self._wakeup.set()
+
+    async def _fire_due_events(self) -> None:
+        now = time.time()
+        started, completed = [], []
+        while self._heap and self._heap[0][0] <= now:
+            _, token, test_id = heapq.heappop(self._heap)
+            schedule = self._schedules.get(test_id)
+            if schedule is None or schedule.token != token:
+                continue
+            if now >= schedule.end:
+                completed.append(test_id)
+                self.forget(test_id)
+                continue
+            if now >= schedule.start and not schedule.in_progress:
+                schedule.in_progress = True
+                started.append(test_id)
+            self._push(schedule, now)
+        if started or completed:
+            await self._write_statuses(started, completed)
+
+    async def _write_statuses(self, started: List[UUID], completed: List[UUID]) -> None:
+        async with AsyncSessionLocal() as session:
+            changed, finished = [], []
+            if started:
+                result = await session.execute(
+                    update(Test)
+                    .where(Test.id.in_(started), Test.status == TestStatus.SCHEDULED.value)
+                    .values(status=TestStatus.IN_PROGRESS.value)
+                    .returning(Test.id)
+                )
+                changed += result.scalars().all()
+            if completed:
+                result = await session.execute(
+                    update(Test)
+                    .where(Test.id.in_(completed), Test.status != TestStatus.COMPLETED.value)
+                    .values(status=TestStatus.COMPLETED.value)
+                    .returning(Test.id)
+                )
+                finished = result.scalars().all()
+                changed += finished
+            await record_changes_bulk(session, "test", changed, "update")
+            await session.commit()
+        schedule_final_artifacts(finished)
+
+    async def sync(self) -> None:
+        """Reload every active test, its cycles and its taken slots from the database.
+
+        The database is the only shared record between workers, so cycles added and
+        readings recorded through another worker are picked up here. Three queries,
+        whatever the number of tests.
+        """
+        active = Test.status != TestStatus.COMPLETED.value
+        async with AsyncSessionLocal() as session:
+            tests = (await session.execute(select(Test).where(active))).scalars().all()
+            cycles = (await session.execute(
+                select(Bank.test_id, Cycle.bank_id, Cycle.cycle_number, Cycle.id)
+                .join(Cycle, Cycle.bank_id == Bank.id)
+                .join(Test, Test.id == Bank.test_id)
+                .where(active)
+            )).all()
+            taken = (await session.execute(
+                select(Bank.test_id, Cycle.cycle_number, func.max(Reading.reading_number))
+                .join(Cycle, Cycle.bank_id == Bank.id)
+                .join(Reading, Reading.cycle_id == Cycle.id)
+                .join(Test, Test.id == Bank.test_id)
+                .where(active)
+                .group_by(Bank.test_id, Cycle.cycle_number)
+            )).all()
+
+        test_cycles: Dict[UUID, Dict[UUID, Dict[int, UUID]]] = {}
+        for test_id, bank_id, cycle_number, cycle_id in cycles:
+            test_cycles.setdefault(test_id, {}).setdefault(bank_id, {})[cycle_number] = cycle_id
+        recorded: Dict[UUID, int] = {}
+        for test_id, cycle_number, reading_number in taken:
+            slot = (cycle_number - 1) * settings.READINGS_PER_CYCLE + reading_number - 1
+            recorded[test_id] = max(recorded.get(test_id, -1), slot)
+
+        seen = set()
+        for test in tests:
+            if not test.start_time:
+                continue
+            seen.add(test.id)
+            schedule = self._schedule_for(test)
+            schedule.cycles = test_cycles.get(test.id, {})
+            schedule.recorded_slot = recorded.get(test.id, -1)
+        for test_id in set(self._schedules) - seen:
+            self.forget(test_id)
+        self._cycle_tests = {
+            cycle_id: (test_id, cycle_number)
+            for test_id, banks in test_cycles.items() if test_id in seen
+            for bank_cycles in banks.values()
+            for cycle_number, cycle_id in bank_cycles.items()
+        }
+
+    async def run(self) -> None:
+        await self.sync()
+        next_sync = time.monotonic() + settings.SCHEDULER_RESYNC_SECONDS
+        while True:
+            try:
+                await self._fire_due_events()
+                if time.monotonic() >= next_sync:
+                    await self.sync()
+                    next_sync = time.monotonic() + settings.SCHEDULER_RESYNC_SECONDS
+            except Exception:
+                logger.exception("Scheduler tick failed")
+            timeout = max(next_sync - time.monotonic(), 0.0)
+            if self._heap:
+                timeout = min(timeout, max(self._heap[0][0] - time.time(), 0.0))
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+scheduler = CycleScheduler()
@@ -0,0 +1,124 @@
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..db.models import Cycle, Reading, CellValue
+
+def minmax_indices(y: np.ndarray, points: int) -> np.ndarray:
+    """Indices of the first, the last and each bucket's minimum and maximum, at most `points`.
+
+    Buckets are split like `np.array_split` and laid out as rows of a padded
+    matrix, so every bucket's extremes come from one argmin and one argmax.
+    """
+    n = y.size
+    if n <= points or points < 2:
+        return np.arange(n)
+    # Two points per bucket, after the two endpoints
+    buckets = (points - 2) // 2
+    if buckets == 0:
+        return np.array([0, n - 1], dtype=np.int64)
+    size, larger = divmod(n, buckets)
+    starts = np.arange(buckets) * size + np.minimum(np.arange(buckets), larger)
+    lengths = np.where(np.arange(buckets) < larger, size + 1, size)
+    offsets = np.arange(size + 1 if larger else size)
+    padding = offsets[None, :] >= lengths[:, None]
+    window = y[np.minimum(starts[:, None] + offsets[None, :], n - 1)]
+    low = starts + np.argmin(np.where(padding, np.inf, window), axis=1)
+    high = starts + np.argmax(np.where(padding, -np.inf, window), axis=1)
+    # Sorted and deduplicated, so extremes stay in index order and coinciding ones appear once
+    return np.union1d(np.r_[low, high], [0, n - 1]).astype(np.int64)
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets selection of `points` indices.
+
+    Keeps the first and last points and, from every bucket in between, the point
+    forming the largest triangle with the previously kept point and the average
+    of the next bucket, which preserves the visual shape of the curve.
+    """
+    n = y.size
+    if n <= points or points < 2:
+        return np.arange(n)
+    if points == 2:
+        return np.array([0, n - 1], dtype=np.int64)
+    # Strictly increasing since n > points, so no bucket is empty
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    # Average of every bucket after the first, the last one running to the final point
+    counts = np.diff(np.r_[edges[1:], n])
+    next_x = np.add.reduceat(x, edges[1:]) / counts
+    next_y = np.add.reduceat(y, edges[1:]) / counts
+
+    indices = np.empty(points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    # Each choice depends on the point kept from the bucket before, so buckets are
+    # visited in order; the loop runs once per output point, not per input point
+    kept = 0
+    for bucket in range(points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[kept] - next_x[bucket]) * (y[start:end] - y[kept])
+            - (x[kept] - x[start:end]) * (next_y[bucket] - y[kept])
+        )
+        kept = start + int(np.argmax(area))
+        indices[bucket + 1] = kept
+    return indices
+
+DOWNSAMPLERS = {
+    "lttb": lambda x, y, points: lttb_indices(x, y, points),
+    "minmax": lambda x, y, points: minmax_indices(y, points),
+}
+
+def minmax_downsample(x: np.ndarray, y: np.ndarray, points: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce a series to at most `points` points, keeping its ends and each bucket's minimum and maximum.
+
+    NaN values are dropped; extremes are kept in their original order so spikes and
+    dips survive the reduction.
+    """
+    keep = ~np.isnan(y)
+    x, y = x[keep], y[keep]
+    indices = minmax_indices(y, points)
+    return x[indices], y[indices]
+
+class SeriesService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_cell_series(
+        self, bank_id: UUID, cells: Tuple[int, int], points: int, method: str = "lttb"
+    ) -> List[dict]:
+        """Voltage over time for each cell in range, downsampled to about `points` points."""
+        query = (
+            select(CellValue.cell_number, Reading.timestamp, CellValue.value)
+            .join(Reading, CellValue.reading_id == Reading.id)
+            .join(Cycle, Reading.cycle_id == Cycle.id)
+            .where(Cycle.bank_id == bank_id, CellValue.cell_number.between(*cells))
+            .order_by(CellValue.cell_number, Reading.timestamp)
+        )
+        rows = (await self.db.execute(query)).all()
+        if not rows:
+            return []
+        cell_col, time_col, value_col = zip(*rows)
+        cell_numbers = np.asarray(cell_col, dtype=np.int64)
+        timestamps = np.asarray(time_col, dtype="datetime64[us]")
+        seconds = timestamps.astype(np.int64) / 1e6
+        values = np.asarray(value_col, dtype=np.float64)
+
+        series = []
+        boundaries = np.flatnonzero(np.diff(cell_numbers)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, cell_numbers.size]):
+            indices = start + DOWNSAMPLERS[method](seconds[start:end], values[start:end], points)
+            series.append({
+                "cell_number": int(cell_numbers[start]),
+                "total_points": int(end - start),
+                "timestamps": timestamps[indices].tolist(),
+                "voltages": values[indices].tolist(),
+            })
+        return series
+
+    async def get_single_cell_series(
+        self, bank_id: UUID, cell_number: int, points: int, method: str = "lttb"
+    ) -> Optional[dict]:
+        series = await self.get_cell_series(bank_id, (cell_number, cell_number), points, method)
+        return series[0] if series else None
@@ -1,11 +1,36 @@
-from typing import List, Optional
+import json
+from typing import AsyncIterator, List, Optional, Tuple
+import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
-from sqlalchemy.orm import joinedload
-from uuid import UUID
+from sqlalchemy import Row, case, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+from uuid import UUID, uuid4
 
-from ..db.models import Test, Bank, Cycle, Reading, CellValue
-from ..schemas.test import TestCreate, TestUpdate, BankCreate, ReadingCreate
+from ..core.config import settings
+from ..db.models import Test, Bank, Cycle, Reading, CellValue, CellType, TestStatus
+from ..schemas.test import TestCreate, TestFullCreate, TestUpdate, BankCreate, ReadingCreate
+from .analysis import detect_anomalies
+from .change_feed import record_changes
+from .reports import schedule_final_artifacts
+from .scheduler import build_cycles, scheduler
+
+def _reading_loaders(cells: Optional[Tuple[int, int]], readings: Optional[Tuple[int, int]]):
+    """Relationship attributes for Cycle.readings and Reading.cell_values, narrowed to the ranges."""
+    readings_attr = Cycle.readings
+    if readings is not None:
+        readings_attr = Cycle.readings.and_(Reading.reading_number.between(*readings))
+    values_attr = Reading.cell_values
+    if cells is not None:
+        values_attr = Reading.cell_values.and_(CellValue.cell_number.between(*cells))
+    return readings_attr, values_attr
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+def _open_object(fields: dict, children: str) -> str:
+    """JSON for an object's scalar fields, left open at the start of its `children` array."""
+    return f'{json.dumps(fields, separators=(",", ":"))[:-1]},"{children}":['
 
 class TestService:
     def __init__(self, db: AsyncSession):
@@ -15,8 +40,28 @@ class TestService:
         """Create a new test record."""
         db_test = Test(**test_data.model_dump())
         self.db.add(db_test)
+        await self.db.flush()  # Get the test ID without committing
+        record_changes(self.db, "test", [db_test.id], "insert")
+        await self.db.commit()
+        # Load the (empty) banks collection too; lazy loading is not possible under asyncio
+        await self.db.refresh(db_test, ["banks"])
+        return db_test
+
+    async def create_test_full(self, test_data: TestFullCreate) -> Test:
+        """Create a test with its banks and scheduled cycles in one transaction."""
+        db_test = Test(id=uuid4(), banks=[], **test_data.model_dump(exclude={"banks"}))
+        for bank_data in test_data.banks:
+            # Ids are assigned up front so the whole tree is inserted in a single flush
+            db_bank = Bank(id=uuid4(), test_id=db_test.id, **bank_data.model_dump())
+            db_bank.cycles = build_cycles(db_test, db_bank.id)
+            db_test.banks.append(db_bank)
+        self.db.add(db_test)
+        await self.db.flush()
+        record_changes(self.db, "test", [db_test.id], "insert")
+        record_changes(self.db, "bank", [bank.id for bank in db_test.banks], "insert")
+        record_changes(self.db, "cycle", [cycle.id for bank in db_test.banks for cycle in bank.cycles], "insert")
         await self.db.commit()
-        await self.db.refresh(db_test)
+        scheduler.register(db_test, db_test.banks)
         return db_test
 
     async def get_test(self, test_id: UUID) -> Optional[Test]:
@@ -25,11 +70,146 @@ class TestService:
             joinedload(Test.banks).joinedload(Bank.cycles).joinedload(Cycle.readings).joinedload(Reading.cell_values)
         ).where(Test.id == test_id)
         result = await self.db.execute(query)
-        return result.scalar_one_or_none()
+        return result.unique().scalar_one_or_none()
+
+    async def stream_test(self, test_id: UUID) -> Optional[AsyncIterator[bytes]]:
+        """Get a test as TestResponse JSON chunks built from Core rows, or None if it does not exist.
+
+        Banks and cycles are read up front; each cycle's readings and cell values are
+        streamed with a server-side cursor and written out as they arrive, so memory
+        stays bounded by the fetch size rather than the size of the test.
+        """
+        test = (await self.db.execute(
+            select(Test.id, Test.job_number, Test.customer_name, Test.number_of_cycles,
+                   Test.time_interval, Test.status, Test.created_at)
+            .where(Test.id == test_id)
+        )).one_or_none()
+        if test is None:
+            return None
+        return self._stream_test(test)
+
+    async def _stream_test(self, test: Row) -> AsyncIterator[bytes]:
+        banks = (await self.db.execute(
+            select(Bank.id, Bank.bank_number, Bank.cell_type, Bank.cell_rate, Bank.percentage_capacity,
+                   Bank.number_of_cells, Bank.discharge_current)
+            .where(Bank.test_id == test.id)
+            .order_by(Bank.bank_number)
+        )).all()
+        cycles = (await self.db.execute(
+            select(Cycle.id, Cycle.bank_id, Cycle.cycle_number, Cycle.reading_type, Cycle.start_time,
+                   Cycle.end_time, Cycle.duration)
+            .where(Cycle.bank_id.in_([bank.id for bank in banks]))
+            .order_by(Cycle.cycle_number)
+        )).all()
+
+        parts: List[str] = []
+        size = 0
+
+        def write(text: str) -> None:
+            nonlocal size
+            parts.append(text)
+            size += len(text)
+
+        def flush() -> bytes:
+            nonlocal size
+            chunk = "".join(parts).encode()
+            parts.clear()
+            size = 0
+            return chunk
+
+        write(_open_object({
+            "job_number": test.job_number,
+            "customer_name": test.customer_name,
+            "number_of_cycles": test.number_of_cycles,
+            "time_interval": test.time_interval,
+            "id": str(test.id),
+            "status": TestStatus(test.status).value,
+            "created_at": _isoformat(test.created_at),
+        }, "banks"))
+        for bank_index, bank in enumerate(banks):
+            write("," if bank_index else "")
+            write(_open_object({
+                "bank_number": bank.bank_number,
+                "cell_type": CellType(bank.cell_type).value,
+                "cell_rate": bank.cell_rate,
+                "percentage_capacity": bank.percentage_capacity,
+                "number_of_cells": bank.number_of_cells,
+                "discharge_current": bank.discharge_current,
+                "id": str(bank.id),
+                "test_id": str(test.id),
+            }, "cycles"))
+            bank_cycles = [cycle for cycle in cycles if cycle.bank_id == bank.id]
+            for cycle_index, cycle in enumerate(bank_cycles):
+                write("," if cycle_index else "")
+                write(_open_object({
+                    "id": str(cycle.id),
+                    "cycle_number": cycle.cycle_number,
+                    "reading_type": cycle.reading_type,
+                    "start_time": _isoformat(cycle.start_time),
+                    "end_time": _isoformat(cycle.end_time),
+                    "duration": cycle.duration,
+                }, "readings"))
+                query = (
+                    select(Reading.id, Reading.reading_number, Reading.is_ocv, Reading.timestamp,
+                           CellValue.cell_number, CellValue.value, CellValue.flags)
+                    .outerjoin(CellValue, CellValue.reading_id == Reading.id)
+                    .where(Reading.cycle_id == cycle.id)
+                    .order_by(Reading.reading_number, Reading.id, CellValue.cell_number)
+                    .execution_options(yield_per=settings.STREAM_YIELD_PER)
+                )
+                result = await self.db.stream(query)
+                reading_id = None
+                async for rows in result.partitions():
+                    for row in rows:
+                        if row.id != reading_id:
+                            # Close the previous reading's cell values and open the next reading
+                            write("]}," if reading_id is not None else "")
+                            write(_open_object({
+                                "reading_number": row.reading_number,
+                                "is_ocv": row.is_ocv,
+                                "id": str(row.id),
+                                "timestamp": _isoformat(row.timestamp),
+                            }, "cell_values"))
+                            reading_id = row.id
+                            separator = ""
+                        if row.cell_number is not None:
+                            write(f'{separator}{{"cell_number":{row.cell_number},'
+                                  f'"value":{json.dumps(row.value)},"flags":{row.flags or 0}}}')
+                            separator = ","
+                    if size >= settings.STREAM_CHUNK_BYTES:
+                        yield flush()
+                write("]}" if reading_id is not None else "")
+                write("]}")
+            write("]}")
+        write("]}")
+        yield flush()
 
     async def list_tests(self, skip: int = 0, limit: int = 100) -> List[Test]:
-        """List all tests with pagination."""
-        query = select(Test).offset(skip).limit(limit)
+        """List tests with their banks and cycles, without readings."""
+        query = select(Test).options(
+            selectinload(Test.banks).selectinload(Bank.cycles)
+        ).offset(skip).limit(limit)
+        result = await self.db.execute(query)
+        return result.scalars().all()
+
+    async def search_tests(self, q: str, limit: int = 10) -> List[Test]:
+        """Find tests whose job number or customer name contains `q`, prefix matches first."""
+        escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        prefix, contains = f"{escaped}%", f"%{escaped}%"
+        rank = case(
+            (Test.job_number.ilike(prefix, escape="\\"), 0),
+            (Test.customer_name.ilike(prefix, escape="\\"), 1),
+            else_=2,
+        )
+        query = (
+            select(Test)
+            .where(or_(
+                Test.job_number.ilike(contains, escape="\\"),
+                Test.customer_name.ilike(contains, escape="\\"),
+            ))
+            .order_by(rank, Test.job_number)
+            .limit(limit)
+        )
         result = await self.db.execute(query)
         return result.scalars().all()
 
@@ -37,15 +217,31 @@ class TestService:
         """Update a test's status."""
         query = update(Test).where(Test.id == test_id).values(**test_data.model_dump())
         await self.db.execute(query)
+        record_changes(self.db, "test", [test_id], "update")
         await self.db.commit()
-        return await self.get_test(test_id)
+        test = await self.get_test(test_id)
+        if test:
+            scheduler.register(test, test.banks)
+            if test.status == TestStatus.COMPLETED:
+                # The data is frozen now; build the stored report artifacts in the background
+                schedule_final_artifacts([test.id])
+        return test
 
     async def create_bank(self, bank_data: BankCreate) -> Bank:
-        """Create a new bank for a test."""
+        """Create a new bank for a test, with its scheduled cycles."""
         db_bank = Bank(**bank_data.model_dump())
         self.db.add(db_bank)
+        await self.db.flush()  # Get the bank ID without committing
+
+        db_test = await self.db.get(Test, db_bank.test_id)
+        cycles = build_cycles(db_test, db_bank.id)
+        self.db.add_all(cycles)
+        await self.db.flush()
+        record_changes(self.db, "bank", [db_bank.id], "insert")
+        record_changes(self.db, "cycle", [cycle.id for cycle in cycles], "insert")
         await self.db.commit()
-        await self.db.refresh(db_bank)
+        await self.db.refresh(db_bank, ["cycles"])
+        scheduler.register(db_test, [db_bank])
         return db_bank
 
     async def create_reading(self, reading_data: ReadingCreate, cycle_id: UUID) -> Reading:
@@ -54,51 +250,218 @@ class TestService:
         db_reading = Reading(
             cycle_id=cycle_id,
             reading_number=reading_data.reading_number,
-            is_ocv=reading_data.is_ocv
+            is_ocv=reading_data.is_ocv,
+            idempotency_key=reading_data.idempotency_key,
+            cell_values=[]
         )
         self.db.add(db_reading)
         await self.db.flush()  # Get the reading ID without committing
 
+        # Flag weak, reversed and dead cells for the whole reading at once
+        values = np.asarray(reading_data.cell_values, dtype=np.float64)
+        previous_ccv = None
+        if not reading_data.is_ocv:
+            previous_ccv = await self._previous_ccv_values(cycle_id, reading_data.reading_number)
+        flags = detect_anomalies(values, previous_ccv).tolist()
+
         # Create cell values
         cell_values = [
             CellValue(
                 reading_id=db_reading.id,
                 cell_number=i + 1,
-                value=value
+                value=value,
+                flags=cell_flags
             )
-            for i, value in enumerate(reading_data.cell_values)
+            for i, (value, cell_flags) in enumerate(zip(reading_data.cell_values, flags))
         ]
-        self.db.add_all(cell_values)
+        # Filling the loaded collection lets the response serialize without lazy loads
+        db_reading.cell_values.extend(cell_values)
+        record_changes(self.db, "reading", [db_reading.id], "insert")
         await self.db.commit()
-        await self.db.refresh(db_reading)
+        scheduler.record_reading(cycle_id, db_reading.reading_number)
         return db_reading
 
+    async def reading_number_taken(self, cycle_id: UUID, reading_number: int) -> bool:
+        query = select(Reading.id).where(Reading.cycle_id == cycle_id, Reading.reading_number == reading_number)
+        result = await self.db.execute(query)
+        return result.first() is not None
+
+    async def get_reading_by_key(self, idempotency_key: str) -> Optional[Reading]:
+        """Get the reading created with an idempotency key, with its cell values."""
+        query = (
+            select(Reading)
+            .options(selectinload(Reading.cell_values))
+            .where(Reading.idempotency_key == idempotency_key)
+        )
+        result = await self.db.execute(query)
+        return result.scalar_one_or_none()
+
+    async def create_reading_once(self, reading_data: ReadingCreate) -> Tuple[Reading, bool]:
+        """Create a reading unless its idempotency key was used before; returns (reading, created).
+
+        Raises ValueError if another reading already has its reading number in the cycle.
+        """
+        key = reading_data.idempotency_key
+        if key:
+            existing = await self.get_reading_by_key(key)
+            if existing:
+                return existing, False
+        try:
+            return await self.create_reading(reading_data, reading_data.cycle_id), True
+        except IntegrityError:
+            # A concurrent submission with the same key committed first, or the slot is taken
+            await self.db.rollback()
+            existing = await self.get_reading_by_key(key) if key else None
+            if existing is not None:
+                return existing, False
+            if await self.reading_number_taken(reading_data.cycle_id, reading_data.reading_number):
+                raise ValueError(f"Reading {reading_data.reading_number} is already recorded for this cycle")
+            raise
+
+    async def create_reading_values(
+        self, cycle_id: UUID, reading_number: int, is_ocv: bool, values: np.ndarray
+    ) -> tuple:
+        """Create a reading from a validated array of cell voltages.
+
+        Cell values are written with one bulk INSERT instead of ORM objects.
+        Returns the reading and its per-cell flags; raises ValueError if the reading
+        number is already taken in the cycle.
+        """
+        db_reading = Reading(cycle_id=cycle_id, reading_number=reading_number, is_ocv=is_ocv)
+        self.db.add(db_reading)
+        try:
+            await self.db.flush()
+        except IntegrityError:
+            await self.db.rollback()
+            if await self.reading_number_taken(cycle_id, reading_number):
+                raise ValueError(f"Reading {reading_number} is already recorded for this cycle")
+            raise
+
+        previous_ccv = None
+        if not is_ocv:
+            previous_ccv = await self._previous_ccv_values(cycle_id, reading_number)
+        flags = detect_anomalies(values, previous_ccv)
+
+        await self.db.execute(insert(CellValue), [
+            {"id": uuid4(), "reading_id": db_reading.id, "cell_number": number, "value": value, "flags": cell_flags}
+            for number, value, cell_flags in zip(range(1, values.size + 1), values.tolist(), flags.tolist())
+        ])
+        record_changes(self.db, "reading", [db_reading.id], "insert")
+        await self.db.commit()
+        scheduler.record_reading(cycle_id, reading_number)
+        return db_reading, flags
+
+    async def _previous_ccv_values(self, cycle_id: UUID, reading_number: int) -> Optional[np.ndarray]:
+        """Cell values of the latest CCV reading before `reading_number` in a cycle."""
+        previous = (
+            select(Reading.id)
+            .where(
+                Reading.cycle_id == cycle_id,
+                Reading.is_ocv.is_(False),
+                Reading.reading_number < reading_number,
+            )
+            .order_by(Reading.reading_number.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        query = (
+            select(CellValue.value)
+            .where(CellValue.reading_id == previous)
+            .order_by(CellValue.cell_number)
+        )
+        result = await self.db.execute(query)
+        values = result.scalars().all()
+        return np.asarray(values, dtype=np.float64) if values else None
+
+    async def get_bank_anomalies(self, bank_id: UUID, reading_id: Optional[UUID] = None) -> List[Row]:
+        """Get every flagged cell value of a bank, newest reading first."""
+        query = (
+            select(
+                Reading.id.label("reading_id"),
+                Cycle.cycle_number,
+                Reading.reading_number,
+                Reading.is_ocv,
+                Reading.timestamp,
+                CellValue.cell_number,
+                CellValue.value,
+                CellValue.flags,
+            )
+            .join(Reading, CellValue.reading_id == Reading.id)
+            .join(Cycle, Reading.cycle_id == Cycle.id)
+            .where(Cycle.bank_id == bank_id, CellValue.flags != 0)
+            .order_by(Cycle.cycle_number.desc(), Reading.reading_number.desc(), CellValue.cell_number)
+        )
+        if reading_id is not None:
+            query = query.where(Reading.id == reading_id)
+        result = await self.db.execute(query)
+        return result.all()
+
     async def get_test_by_job_number(self, job_number: str) -> Optional[Test]:
         """Get a test by job number."""
         query = select(Test).where(Test.job_number == job_number)
         result = await self.db.execute(query)
         return result.scalar_one_or_none()
 
-    async def get_bank(self, bank_id: UUID) -> Optional[Bank]:
-        """Get a bank by ID with all related data."""
+    async def get_bank(
+        self,
+        bank_id: UUID,
+        cells: Optional[Tuple[int, int]] = None,
+        readings: Optional[Tuple[int, int]] = None,
+    ) -> Optional[Bank]:
+        """Get a bank by ID with its cycles, readings and the cell values in range."""
+        readings_attr, values_attr = _reading_loaders(cells, readings)
         query = select(Bank).options(
-            joinedload(Bank.cycles).joinedload(Cycle.readings).joinedload(Reading.cell_values)
+            selectinload(Bank.cycles).selectinload(readings_attr).selectinload(values_attr)
         ).where(Bank.id == bank_id)
         result = await self.db.execute(query)
         return result.scalar_one_or_none()
 
+    async def test_exists(self, test_id: UUID) -> bool:
+        """Check whether a test exists without loading its banks."""
+        result = await self.db.execute(select(Test.id).where(Test.id == test_id))
+        return result.scalar_one_or_none() is not None
+
+    async def bank_exists(self, bank_id: UUID) -> bool:
+        """Check whether a bank exists without loading its readings."""
+        result = await self.db.execute(select(Bank.id).where(Bank.id == bank_id))
+        return result.scalar_one_or_none() is not None
+
+    async def get_cycle_cell_count(self, cycle_id: UUID) -> Optional[int]:
+        """Number of cells in the cycle's bank, or None if the cycle does not exist."""
+        result = await self.db.execute(
+            select(Bank.number_of_cells).join(Cycle, Cycle.bank_id == Bank.id).where(Cycle.id == cycle_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def cycle_exists(self, cycle_id: UUID) -> bool:
+        """Check whether a cycle exists without loading its readings."""
+        result = await self.db.execute(select(Cycle.id).where(Cycle.id == cycle_id))
+        return result.scalar_one_or_none() is not None
+
+    async def get_bank_row(self, bank_id: UUID) -> Optional[Bank]:
+        """Get a bank without its cycles and readings."""
+        return await self.db.get(Bank, bank_id)
+
     async def get_cycle(self, cycle_id: UUID) -> Optional[Cycle]:
         """Get a cycle by ID with all related data."""
         query = select(Cycle).options(
             joinedload(Cycle.readings).joinedload(Reading.cell_values)
         ).where(Cycle.id == cycle_id)
         result = await self.db.execute(query)
-        return result.scalar_one_or_none()
+        return result.unique().scalar_one_or_none()
 
-    async def get_readings_by_cycle(self, cycle_id: UUID) -> List[Reading]:
-        """Get all readings for a cycle."""
+    async def get_readings_by_cycle(
+        self,
+        cycle_id: UUID,
+        cells: Optional[Tuple[int, int]] = None,
+        readings: Optional[Tuple[int, int]] = None,
+    ) -> List[Reading]:
+        """Get the readings of a cycle with the cell values in range."""
+        _, values_attr = _reading_loaders(cells, None)
         query = select(Reading).options(
-            joinedload(Reading.cell_values)
-        ).where(Reading.cycle_id == cycle_id)
+            selectinload(values_attr)
+        ).where(Reading.cycle_id == cycle_id).order_by(Reading.reading_number)
+        if readings is not None:
+            query = query.where(Reading.reading_number.between(*readings))
         result = await self.db.execute(query)
-        return result.scalars().all() 
\ No newline at end of file
+        return result.scalars().all() 
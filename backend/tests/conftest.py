@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Importing the app creates its engine, so point it at an embedded database before any test imports it
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,77 @@
+import numpy as np
+
+from app.db.models import CellFlag
+from app.services.analysis import detect_anomalies, flag_names
+
+def bank(n: int = 20, voltage: float = 1.30) -> np.ndarray:
+    """A healthy bank with a little spread between cells."""
+    return voltage + np.linspace(-0.005, 0.005, n)
+
+def flagged(flags: np.ndarray, flag: CellFlag) -> list:
+    return np.flatnonzero(flags & flag).tolist()
+
+def test_healthy_bank_has_no_flags():
+    assert not detect_anomalies(bank()).any()
+
+def test_reversed_and_dead_cells():
+    values = bank()
+    values[[2, 5, 7]] = [-0.4, 0.0, 0.08]
+    flags = detect_anomalies(values)
+    assert flagged(flags, CellFlag.REVERSED) == [2]
+    assert flagged(flags, CellFlag.DEAD) == [5, 7]
+
+def test_dead_cells_do_not_skew_the_bank_statistics():
+    values = bank()
+    values[:4] = 0.0
+    flags = detect_anomalies(values)
+    assert flagged(flags, CellFlag.DEAD) == [0, 1, 2, 3]
+    assert not flags[4:].any()
+
+def test_single_weak_cell_is_flagged_by_z_and_mad():
+    values = bank()
+    values[9] = 1.0
+    flags = detect_anomalies(values)
+    assert flagged(flags, CellFlag.DEVIATION_Z) == [9]
+    assert flagged(flags, CellFlag.DEVIATION_MAD) == [9]
+
+def test_mad_catches_weak_cells_that_mask_each_other_in_the_z_score():
+    values = bank()
+    values[:5] = 1.0
+    flags = detect_anomalies(values)
+    assert flagged(flags, CellFlag.DEVIATION_Z) == []
+    assert flagged(flags, CellFlag.DEVIATION_MAD) == [0, 1, 2, 3, 4]
+
+def test_mad_of_zero_falls_back_to_mean_absolute_deviation():
+    values = np.full(20, 1.30)
+    values[3] = 1.0
+    flags = detect_anomalies(values)
+    assert flagged(flags, CellFlag.DEVIATION_MAD) == [3]
+
+def test_identical_cells_are_not_flagged():
+    assert not detect_anomalies(np.full(20, 1.30)).any()
+
+def test_fast_drop_since_previous_ccv():
+    previous = bank()
+    values = previous - 0.05 + np.linspace(-0.002, 0.002, previous.size)
+    values[11] = previous[11] - 0.25
+    # A cell recovering is never a fast drop
+    values[4] = previous[4] + 0.1
+    flags = detect_anomalies(values, previous)
+    assert flagged(flags, CellFlag.FAST_DROP) == [11]
+
+def test_fast_drop_needs_a_matching_previous_reading():
+    values = bank()
+    values[11] = 1.05
+    assert flagged(detect_anomalies(values, bank(19)), CellFlag.FAST_DROP) == []
+    assert flagged(detect_anomalies(values, None), CellFlag.FAST_DROP) == []
+
+def test_fast_drop_ignores_cells_dead_in_the_previous_reading():
+    previous = bank()
+    previous[0] = 0.0
+    values = previous - 0.05
+    values[0] = 0.5
+    assert flagged(detect_anomalies(values, previous), CellFlag.FAST_DROP) == []
+
+def test_flag_names():
+    assert flag_names(CellFlag.REVERSED | CellFlag.DEVIATION_MAD) == ["DEVIATION_MAD", "REVERSED"]
+    assert flag_names(0) == []
@@ -0,0 +1,70 @@
+import numpy as np
+from pytest import approx
+
+from app.services.capacity import analyze_bank, capacity_trend, time_to_cutoff
+
+HOURS = np.array([0.0, 1.0, 2.0])
+
+def cutoff_at(voltages: list, cutoff: float = 1.0, hours: np.ndarray = HOURS) -> tuple:
+    """Time to cutoff of a single cell read at `hours`."""
+    to_cutoff, reached = time_to_cutoff(hours, np.array(voltages, dtype=np.float64)[:, None], cutoff)
+    return float(to_cutoff[0]), bool(reached[0])
+
+def test_cell_that_never_crosses_has_no_time():
+    to_cutoff, reached = cutoff_at([1.30, 1.20, 1.10])
+    assert np.isnan(to_cutoff) and not reached
+
+def test_crossing_between_readings_is_interpolated():
+    assert cutoff_at([1.30, 1.10, 0.90]) == (approx(1.5), True)
+
+def test_reading_at_the_cutoff_is_not_below_it():
+    # Crosses between 1 h (exactly at cutoff) and 2 h, so the interpolation lands on 1 h
+    assert cutoff_at([1.30, 1.00, 0.80]) == (approx(1.0), True)
+
+def test_cell_below_cutoff_from_the_first_reading():
+    assert cutoff_at([0.90, 0.85, 0.80]) == (approx(0.0), True)
+
+def test_only_the_first_crossing_counts():
+    assert cutoff_at([1.10, 0.90, 1.10]) == (approx(0.5), True)
+
+def test_missing_reading_before_the_crossing_falls_back_to_the_crossing_reading():
+    assert cutoff_at([1.30, np.nan, 0.90]) == (approx(2.0), True)
+
+def test_single_reading():
+    single = np.array([0.0])
+    to_cutoff, reached = cutoff_at([1.20], hours=single)
+    assert np.isnan(to_cutoff) and not reached
+    assert cutoff_at([0.90], hours=single) == (approx(0.0), True)
+
+def test_cells_are_independent():
+    voltages = np.array([
+        [1.30, 1.30, 0.90],
+        [1.10, 1.20, 0.80],
+        [0.90, 1.15, 0.70],
+    ])
+    to_cutoff, reached = time_to_cutoff(HOURS, voltages, 1.0)
+    assert reached.tolist() == [True, False, True]
+    assert to_cutoff[0] == approx(1.5) and np.isnan(to_cutoff[1]) and to_cutoff[2] == 0.0
+
+def test_capacity_trend_is_the_slope_per_cycle():
+    capacities = np.array([
+        [10.0, 5.0],
+        [9.0, 5.0],
+        [8.0, 5.0],
+    ])
+    assert capacity_trend(np.array([1.0, 2.0, 3.0]), capacities).tolist() == [-1.0, 0.0]
+
+def test_capacity_trend_needs_two_cycles():
+    assert np.isnan(capacity_trend(np.array([1.0]), np.array([[10.0, 9.0]]))).all()
+
+def test_analyze_bank_counts_cells_above_cutoff_up_to_the_last_reading():
+    voltages = np.array([
+        [1.30, 1.30],
+        [1.10, 1.20],
+        [0.90, 1.15],
+    ])
+    analysis = analyze_bank({1: (HOURS, voltages)}, discharge_current=2.0, cell_rate=10.0, cutoff=1.0)
+    cycle = analysis["cycles"][0]
+    assert cycle["capacity_ah"].tolist() == approx([3.0, 4.0])
+    assert cycle["percent_of_rated"].tolist() == approx([30.0, 40.0])
+    assert np.isnan(analysis["capacity_trend_ah_per_cycle"]).all()
@@ -0,0 +1,58 @@
+import numpy as np
+
+from app.services.grading import assign_grades, cluster_groups, window_groups
+
+def members(groups: list) -> list:
+    """Groups as sorted lists of cell indexes, in a stable order for comparison."""
+    return sorted(sorted(group.tolist()) for group in groups)
+
+def test_window_groups_split_sorted_runs():
+    values = np.array([1.05, 1.00, 1.04, 1.01, 1.03, 1.02])
+    assert members(window_groups(values, 3)) == [[0, 2, 4], [1, 3, 5]]
+
+def test_window_groups_drop_a_straggler_at_the_top():
+    values = np.array([1.00, 1.01, 1.02, 1.03, 1.04, 1.05, 2.00])
+    assert members(window_groups(values, 3)) == [[0, 1, 2], [3, 4, 5]]
+
+def test_window_groups_drop_a_straggler_at_the_bottom():
+    values = np.array([0.00, 1.00, 1.01, 1.02, 1.03, 1.04, 1.05])
+    assert members(window_groups(values, 3)) == [[1, 2, 3], [4, 5, 6]]
+
+def test_window_groups_drop_a_straggler_in_a_gap():
+    values = np.array([1.00, 1.01, 1.02, 1.50, 2.00, 2.01, 2.02])
+    assert members(window_groups(values, 3)) == [[0, 1, 2], [4, 5, 6]]
+
+def test_window_groups_drop_stragglers_in_different_places():
+    # Leftover of two: one below the first group, one between the groups
+    values = np.array([0.0, 1.00, 1.01, 1.02, 3.0, 5.00, 5.01, 5.02])
+    assert members(window_groups(values, 3)) == [[1, 2, 3], [5, 6, 7]]
+
+def test_window_groups_need_at_least_k_cells():
+    assert window_groups(np.array([1.0, 1.1]), 3) == []
+
+def test_cluster_groups_follow_the_principal_axis():
+    first = np.array([1.0, 2.0, 3.0, 10.0, 11.0, 12.0])
+    features = np.column_stack([first, 2 * first + 0.5])
+    assert members(cluster_groups(features, 3)) == [[0, 1, 2], [3, 4, 5]]
+
+def test_cluster_groups_ignore_constant_metrics():
+    features = np.column_stack([
+        np.array([12.0, 1.0, 11.0, 2.0, 10.0, 3.0]),
+        np.full(6, 1.3),
+    ])
+    assert members(cluster_groups(features, 3)) == [[0, 2, 4], [1, 3, 5]]
+
+def test_cluster_groups_of_identical_cells_keep_their_order():
+    groups = cluster_groups(np.ones((6, 2)), 2)
+    assert [group.tolist() for group in groups] == [[0, 1], [2, 3], [4, 5]]
+
+def test_assign_grades_picks_the_first_grade_met():
+    metrics = {
+        "ocv": np.array([1.30, 1.25, np.nan, 1.10]),
+        "end_voltage": np.array([1.0, 1.0, 1.0, 1.0]),
+        "capacity_percent": np.array([100.0, 90.0, 95.0, 80.0]),
+    }
+    grades = [{"min_ocv": 1.28}, {"min_ocv": 1.2, "min_capacity_percent": 85.0}]
+    assert assign_grades(metrics, grades).tolist() == [0, 1, -1, -1]
+    # A grade without thresholds takes every cell left, even one with a missing metric
+    assert assign_grades(metrics, grades + [{}]).tolist() == [0, 1, 2, 2]
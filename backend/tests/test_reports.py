@@ -0,0 +1,40 @@
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.reports import load_job, report_banks, save_job
+
+def job(status: str) -> dict:
+    return {
+        "id": str(uuid.uuid4()), "status": status, "error": None,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+def test_unfinished_job_without_progress_is_failed(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "REPORTS_DIR", str(tmp_path))
+    fresh, stuck, done = job("running"), job("running"), job("completed")
+    for item in (fresh, stuck, done):
+        save_job(item)
+    monkeypatch.setattr(settings, "REPORT_JOB_TIMEOUT_SECONDS", -1.0)
+    assert load_job(stuck["id"])["status"] == "failed"
+    assert load_job(done["id"])["status"] == "completed"
+    monkeypatch.setattr(settings, "REPORT_JOB_TIMEOUT_SECONDS", 600.0)
+    # Saved as failed, so it stays failed once the timeout no longer applies
+    assert load_job(stuck["id"])["error"] == "Report job timed out"
+    assert load_job(fresh["id"])["status"] == "running"
+
+def test_report_banks_pivot_rows_into_labelled_matrices():
+    start = datetime(2024, 1, 1)
+    readings = [
+        ("ocv", 1, start, True),
+        ("ccv1", 1, start + timedelta(hours=1), False),
+        ("ccv2", 1, start + timedelta(hours=2), False),
+    ]
+    values = [("ocv", 1, 1.3), ("ocv", 2, 1.31), ("ccv1", 1, 1.2), ("ccv2", 2, 1.1)]
+    bank, = report_banks([{"id": "b", "first_cell": 1, "width": 2, "readings": readings, "values": values}])
+    assert bank["columns"] == ["OCV", "CCV 1", "CCV 2"]
+    assert bank["hours"].tolist() == [0.0, 1.0, 2.0]
+    np.testing.assert_array_equal(bank["matrix"], [[1.3, 1.2, np.nan], [1.31, np.nan, 1.1]])
+    assert "readings" not in bank and "values" not in bank
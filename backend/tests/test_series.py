@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from app.services.series import lttb_indices, minmax_downsample, minmax_indices
+
+def series(n: int = 1000) -> tuple:
+    """A discharge-like curve with some noise and one dip."""
+    rng = np.random.default_rng(7)
+    x = np.arange(n, dtype=np.float64) * 60.0
+    y = 1.35 - np.linspace(0.0, 0.4, n) + rng.normal(0.0, 0.005, n)
+    y[n // 3] = 0.5
+    return x, y
+
+DOWNSAMPLERS = {
+    "lttb": lttb_indices,
+    "minmax": lambda x, y, points: minmax_indices(y, points),
+}
+
+@pytest.mark.parametrize("method", DOWNSAMPLERS)
+@pytest.mark.parametrize("points", [2, 3, 4, 5, 50, 999])
+def test_indices_keep_the_ends_in_order_within_budget(method, points):
+    x, y = series()
+    indices = DOWNSAMPLERS[method](x, y, points)
+    assert indices.size <= points
+    assert indices[0] == 0 and indices[-1] == y.size - 1
+    assert (np.diff(indices) > 0).all()
+
+@pytest.mark.parametrize("method", DOWNSAMPLERS)
+def test_short_series_are_returned_whole(method):
+    x, y = series(20)
+    assert DOWNSAMPLERS[method](x, y, 20).tolist() == list(range(20))
+
+@pytest.mark.parametrize("method", DOWNSAMPLERS)
+def test_dip_survives(method):
+    x, y = series()
+    assert y.size // 3 in DOWNSAMPLERS[method](x, y, 50)
+
+def test_lttb_returns_exactly_the_requested_points():
+    x, y = series()
+    assert lttb_indices(x, y, 50).size == 50
+
+def test_lttb_keeps_the_corner_of_a_step():
+    x = np.arange(9, dtype=np.float64)
+    y = np.array([1.0, 1.0, 1.0, 1.0, 1.0, 0.0, 0.0, 0.0, 0.0])
+    # Buckets [1, 4) and [4, 8): the first keeps its point nearest the drop, the second the first low point
+    assert lttb_indices(x, y, 4).tolist() == [0, 3, 5, 8]
+
+def test_minmax_keeps_each_bucket_extremes():
+    y = np.array([5.0, 1.0, 9.0, 2.0, 8.0, 3.0, 7.0, 4.0, 6.0, 0.0])
+    # Two buckets of five: [5, 1, 9, 2, 8] and [3, 7, 4, 6, 0]
+    assert minmax_indices(y, 6).tolist() == [0, 1, 2, 6, 9]
+
+def test_minmax_downsample_drops_nan():
+    x = np.arange(6, dtype=np.float64)
+    y = np.array([1.0, np.nan, 2.0, 3.0, np.nan, 4.0])
+    kept_x, kept_y = minmax_downsample(x, y, 10)
+    assert kept_x.tolist() == [0.0, 2.0, 3.0, 5.0]
+    assert kept_y.tolist() == [1.0, 2.0, 3.0, 4.0]
@@ -1,8 +1,9 @@
 import streamlit as st
 import httpx
-import pandas as pd
 from datetime import datetime
-from uuid import UUID
+import uuid
+
+from api import api_client
 
 # Configure page
 st.set_page_config(
@@ -11,20 +12,88 @@ st.set_page_config(
     layout="wide"
 )
 
+# Seconds between refreshes of the live progress panel
+PROGRESS_REFRESH_SECONDS = 10
+
 # Initialize session state
 if "api_base_url" not in st.session_state:
     st.session_state.api_base_url = "http://localhost:8000/api/v1"
+if "api_headers" not in st.session_state:
+    # Gives each browser session its own rate-limit bucket on the backend
+    st.session_state.api_headers = {"X-Client-Id": str(uuid.uuid4())}
+if "progress" not in st.session_state:
+    # Change feed cursor, in-progress tests and the latest reading seen per bank
+    st.session_state.progress = {"cursor": 0, "tests": [], "latest": {}}
+
+def fetch_summary():
+    """Fetch the dashboard summary from the API."""
+    try:
+        with api_client() as client:
+            response = client.get(f"{st.session_state.api_base_url}/dashboard/summary")
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPError as e:
+        st.error(f"Error fetching dashboard: {str(e)}")
+        return None
 
-def fetch_tests():
-    """Fetch all tests from the API."""
+def fetch_progress(since: int):
+    """Fetch in-progress tests and statistics of readings recorded after a cursor."""
     try:
-        with httpx.Client() as client:
-            response = client.get(f"{st.session_state.api_base_url}/tests")
+        with api_client() as client:
+            response = client.get(
+                f"{st.session_state.api_base_url}/dashboard/progress",
+                params={"since": since}
+            )
             response.raise_for_status()
             return response.json()
     except httpx.HTTPError as e:
-        st.error(f"Error fetching tests: {str(e)}")
-        return []
+        st.error(f"Error fetching progress: {str(e)}")
+        return None
+
+@st.fragment(run_every=PROGRESS_REFRESH_SECONDS)
+def live_progress():
+    """Latest reading of every bank under test; reruns on its own without rerunning the page."""
+    progress = st.session_state.progress
+    update = fetch_progress(progress["cursor"])
+    if update:
+        progress["cursor"] = update["cursor"]
+        progress["tests"] = update["tests"]
+        for reading in update["readings"]:
+            seen = progress["latest"].get(reading["bank_id"])
+            if seen is None or seen["timestamp"] <= reading["timestamp"]:
+                progress["latest"][reading["bank_id"]] = reading
+
+    tests = {test["id"]: test for test in progress["tests"]}
+    # Forget banks of tests that are no longer in progress
+    progress["latest"] = {
+        bank_id: reading for bank_id, reading in progress["latest"].items() if reading["test_id"] in tests
+    }
+
+    st.subheader("Live Progress")
+    if not tests:
+        st.info("No tests in progress.")
+        return
+    rows = []
+    for reading in sorted(progress["latest"].values(), key=lambda r: (tests[r["test_id"]]["job_number"], r["bank_number"])):
+        test = tests[reading["test_id"]]
+        rows.append({
+            "Job Number": test["job_number"],
+            "Bank": reading["bank_number"],
+            "Cycle": f"{reading['cycle_number']} of {test['number_of_cycles']}",
+            "Reading": f"{'OCV' if reading['is_ocv'] else 'CCV'} {reading['reading_number']}",
+            "Time": datetime.fromisoformat(reading["timestamp"]).strftime("%Y-%m-%d %H:%M"),
+            "Min (V)": reading["min"],
+            "Mean (V)": round(reading["mean"], 3) if reading["mean"] is not None else None,
+            "Max (V)": reading["max"],
+            "Flagged": reading["flagged"],
+        })
+    waiting = [test["job_number"] for test_id, test in tests.items()
+               if not any(r["test_id"] == test_id for r in progress["latest"].values())]
+    if rows:
+        st.dataframe(rows, use_container_width=True, hide_index=True)
+    if waiting:
+        st.caption(f"Waiting for first readings: {', '.join(waiting)}")
+    st.caption(f"Updated {datetime.now().strftime('%H:%M:%S')}, every {PROGRESS_REFRESH_SECONDS}s")
 
 def format_test_status(status):
     """Format test status with color."""
@@ -46,34 +115,50 @@ Welcome to the Battery Test Application. This application helps you manage and t
 - Generate test reports
 """)
 
+summary = fetch_summary()
+
+# Overview
+if summary:
+    counts = summary["status_counts"]
+    metric_cols = st.columns(4)
+    metric_cols[0].metric("Scheduled", counts.get("scheduled", 0))
+    metric_cols[1].metric("In Progress", counts.get("in_progress", 0))
+    metric_cols[2].metric("Completed", counts.get("completed", 0))
+    metric_cols[3].metric("Readings (24h)", summary["readings_last_24h"])
+
 # Main content
 col1, col2 = st.columns([2, 1])
 
 with col1:
     st.subheader("Recent Tests")
-    tests = fetch_tests()
+    tests = summary["recent_tests"] if summary else []
     
     if tests:
-        # Convert tests to DataFrame for better display
+        # Rows are passed straight to st.dataframe so the page does not need pandas
         test_data = []
         for test in tests:
             test_data.append({
                 "Job Number": test["job_number"],
                 "Customer": test["customer_name"],
                 "Status": format_test_status(test["status"]),
-                "Start Date": datetime.fromisoformat(test["start_date"]).strftime("%Y-%m-%d"),
-                "Cycles": test["number_of_cycles"],
-                "ID": test["id"]
+                "Start Date": datetime.fromisoformat(test["start_date"]).strftime("%Y-%m-%d")
             })
         
-        df = pd.DataFrame(test_data)
         st.dataframe(
-            df.drop("ID", axis=1),
+            test_data,
             use_container_width=True,
             hide_index=True
         )
     else:
         st.info("No tests found. Create a new test to get started.")
+    
+    live_progress()
+    
+    if summary and summary["readings_per_hour"]:
+        st.subheader("Readings per Hour")
+        st.bar_chart(
+            {row["hour"][11:16]: row["readings"] for row in summary["readings_per_hour"]}
+        )
 
 with col2:
     st.subheader("Quick Actions")
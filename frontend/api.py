@@ -0,0 +1,27 @@
+import httpx
+import streamlit as st
+
+from outbox import PIN_HEADER, Outbox
+
+@st.cache_resource
+def get_outbox(api_base_url: str) -> Outbox:
+    """Process-wide outbox; its sender thread keeps running across reruns and sessions."""
+    return Outbox(api_base_url)
+
+def _remember_pin(response: httpx.Response) -> None:
+    pin = response.headers.get(PIN_HEADER)
+    if pin:
+        st.session_state.api_headers[PIN_HEADER] = pin
+
+def api_client(**kwargs) -> httpx.Client:
+    """Client for the backend that reads this session's own writes.
+
+    The backend answers a write with a pin, the time until which the writer must read
+    from the primary instead of a replica. The pin is kept in the session's headers and
+    sent with every later request, along with the pin of the latest outbox flush.
+    """
+    headers = dict(st.session_state.api_headers)
+    flushed = get_outbox(st.session_state.api_base_url).read_primary_until
+    if flushed > float(headers.get(PIN_HEADER, 0)):
+        headers[PIN_HEADER] = f"{flushed:.3f}"
+    return httpx.Client(headers=headers, event_hooks={"response": [_remember_pin]}, **kwargs)
@@ -0,0 +1,231 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+
+# SQLite file holding submissions until the backend has them; survives restarts
+OUTBOX_PATH = os.getenv(
+    "OUTBOX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "outbox.sqlite3")
+)
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 20  # a submission still unsent after this many tries is marked failed
+RETRY_BASE_SECONDS = 2.0
+RETRY_MAX_SECONDS = 300.0
+SENT_RETENTION_SECONDS = 24 * 3600.0  # sent submissions are deleted after this long
+PRUNE_INTERVAL_SECONDS = 3600.0
+
+QUEUED, SENT, FAILED = "queued", "sent", "failed"
+
+# Response header with the time until which a client that wrote must read from the primary
+PIN_HEADER = "X-Read-Primary-Until"
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    idempotency_key TEXT PRIMARY KEY,
+    label TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    sent_at REAL,
+    flagged_cells TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_submissions_due ON submissions (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS ix_submissions_created ON submissions (created_at);
+"""
+
+class Outbox:
+    """Durable queue of reading submissions, sent to the API in batches by a background thread.
+
+    `submit` only writes to the local SQLite file, so entering readings never waits on
+    the backend. Each submission carries an idempotency key, so a batch that is resent
+    after a timeout or restart does not create duplicate readings.
+    """
+
+    def __init__(self, api_base_url: str, path: str = OUTBOX_PATH):
+        self.api_base_url = api_base_url
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.executescript(SCHEMA)
+        self._pruned_at = 0.0
+        self.read_primary_until = 0.0  # pin returned by the latest flush
+        self._thread = threading.Thread(target=self._run, name="reading-outbox", daemon=True)
+        self._thread.start()
+
+    def submit(self, label: str, reading: dict) -> str:
+        """Queue a reading for sending; returns its idempotency key."""
+        key = str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO submissions (idempotency_key, label, payload, status, next_attempt_at, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, label, json.dumps({**reading, "idempotency_key": key}), QUEUED, now, now),
+            )
+        self._wake.set()
+        return key
+
+    def retry_failed(self) -> None:
+        """Queue failed submissions again."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE submissions SET status = ?, attempts = 0, next_attempt_at = ?, error = NULL WHERE status = ?",
+                (QUEUED, time.time(), FAILED),
+            )
+        self._wake.set()
+
+    def counts(self) -> dict:
+        with self._lock:
+            rows = self._db.execute("SELECT status, count(*) FROM submissions GROUP BY status").fetchall()
+        return {QUEUED: 0, SENT: 0, FAILED: 0, **{status: count for status, count in rows}}
+
+    def queued_reading_numbers(self, cycle_id: str) -> List[int]:
+        """Reading numbers of a cycle that are queued but not yet sent."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT json_extract(payload, '$.reading_number') FROM submissions"
+                " WHERE status = ? AND json_extract(payload, '$.cycle_id') = ?",
+                (QUEUED, str(cycle_id)),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def recent(self, limit: int = 20) -> List[dict]:
+        """Latest submissions, newest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT idempotency_key, label, status, attempts, created_at, sent_at, flagged_cells, error"
+                " FROM submissions ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [
+            {**dict(row), "flagged_cells": json.loads(row["flagged_cells"]) if row["flagged_cells"] else []}
+            for row in rows
+        ]
+
+    def _due(self) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT idempotency_key, payload, attempts FROM submissions"
+                " WHERE status = ? AND next_attempt_at <= ? ORDER BY created_at LIMIT ?",
+                (QUEUED, time.time(), BATCH_SIZE),
+            ).fetchall()
+
+    def _next_due_in(self) -> Optional[float]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT min(next_attempt_at) FROM submissions WHERE status = ?", (QUEUED,)
+            ).fetchone()
+        return None if row[0] is None else max(row[0] - time.time(), 0.0)
+
+    def _retry_later(self, rows: List[sqlite3.Row], error: str, delay: Optional[float] = None) -> None:
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                attempts = row["attempts"] + 1
+                backoff = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+                # Rows already settled earlier in a split batch keep their status
+                self._db.execute(
+                    "UPDATE submissions SET status = ?, attempts = ?, next_attempt_at = ?, error = ?"
+                    " WHERE idempotency_key = ? AND status = ?",
+                    (FAILED if attempts >= MAX_ATTEMPTS else QUEUED, attempts,
+                     now + max(backoff, delay or 0.0), error, row["idempotency_key"], QUEUED),
+                )
+
+    def flush(self) -> int:
+        """Send one batch of due submissions; returns how many were settled."""
+        rows = self._due()
+        if not rows:
+            return 0
+        try:
+            return self._send(rows, split=True)
+        except Exception as e:  # e.g. an unexpected response body; back off like any other failure
+            logger.exception("Outbox batch failed")
+            self._retry_later(rows, f"Send failed: {e}")
+            return 0
+
+    def _prune(self) -> None:
+        """Delete submissions sent more than SENT_RETENTION_SECONDS ago."""
+        now = time.time()
+        if now - self._pruned_at < PRUNE_INTERVAL_SECONDS:
+            return
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM submissions WHERE status = ? AND sent_at < ?", (SENT, now - SENT_RETENTION_SECONDS)
+            )
+        self._pruned_at = now
+
+    def _send(self, rows: List[sqlite3.Row], split: bool) -> int:
+        try:
+            with httpx.Client(timeout=30.0, headers={"X-Client-Id": "outbox"}) as client:
+                response = client.post(
+                    f"{self.api_base_url}/readings/batch",
+                    json={"readings": [json.loads(row["payload"]) for row in rows]},
+                )
+        except httpx.HTTPError as e:
+            self._retry_later(rows, f"Backend unreachable: {e}")
+            return 0
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After", "")
+            self._retry_later(
+                rows, f"Backend busy ({response.status_code})",
+                float(retry_after) if retry_after.isdigit() else None,
+            )
+            return 0
+        if response.status_code >= 400:
+            if split and len(rows) > 1:
+                # A refused batch most likely holds one malformed item; send each alone so only it fails
+                return sum(self._send([row], split=False) for row in rows)
+            # Resending the same payload cannot succeed
+            with self._lock:
+                self._db.executemany(
+                    "UPDATE submissions SET status = ?, error = ? WHERE idempotency_key = ?",
+                    [(FAILED, f"Rejected ({response.status_code}): {response.text[:500]}", row["idempotency_key"])
+                     for row in rows],
+                )
+            return len(rows)
+
+        pin = response.headers.get(PIN_HEADER)
+        if pin:
+            self.read_primary_until = max(self.read_primary_until, float(pin))
+        now = time.time()
+        with self._lock:
+            for result in response.json()["results"]:
+                if result["status"] == "rejected":
+                    self._db.execute(
+                        "UPDATE submissions SET status = ?, error = ? WHERE idempotency_key = ?",
+                        (FAILED, result["detail"], result["idempotency_key"]),
+                    )
+                else:
+                    self._db.execute(
+                        "UPDATE submissions SET status = ?, sent_at = ?, flagged_cells = ?, error = NULL"
+                        " WHERE idempotency_key = ?",
+                        (SENT, now, json.dumps(result["flagged_cells"]), result["idempotency_key"]),
+                    )
+        return len(rows)
+
+    def _run(self) -> None:
+        while True:
+            try:
+                while self.flush():
+                    pass
+                self._prune()
+                wait = self._next_due_in()
+            except Exception:  # keep the sender alive; submissions stay queued
+                logger.exception("Outbox flush failed")
+                wait = RETRY_BASE_SECONDS
+            self._wake.wait(timeout=wait if wait is not None else 60.0)
+            self._wake.clear()
@@ -1,9 +1,9 @@
 import streamlit as st
 import httpx
-import pandas as pd
 from datetime import datetime
 from uuid import UUID
-import numpy as np
+
+from api import api_client, get_outbox
 
 # Configure page
 st.set_page_config(
@@ -21,11 +21,30 @@ if "current_cycle" not in st.session_state:
     st.session_state.current_cycle = None
 if "reading_values" not in st.session_state:
     st.session_state.reading_values = []
+if "next_reading_numbers" not in st.session_state:
+    st.session_state.next_reading_numbers = {}  # cycle id -> next reading number
+
+# Seconds between refreshes of the outbox status
+OUTBOX_REFRESH_SECONDS = 5
+
+def search_tests(query: str, limit: int = 20):
+    """Search tests by job number or customer name."""
+    try:
+        with api_client() as client:
+            response = client.get(
+                f"{st.session_state.api_base_url}/tests/search",
+                params={"q": query, "limit": limit}
+            )
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPError as e:
+        st.error(f"Error searching tests: {str(e)}")
+        return []
 
 def fetch_test(test_id: UUID):
     """Fetch test details from API."""
     try:
-        with httpx.Client() as client:
+        with api_client() as client:
             response = client.get(f"{st.session_state.api_base_url}/tests/{test_id}")
             response.raise_for_status()
             return response.json()
@@ -36,7 +55,7 @@ def fetch_test(test_id: UUID):
 def fetch_bank(bank_id: UUID):
     """Fetch bank details from API."""
     try:
-        with httpx.Client() as client:
+        with api_client() as client:
             response = client.get(f"{st.session_state.api_base_url}/banks/{bank_id}")
             response.raise_for_status()
             return response.json()
@@ -44,27 +63,63 @@ def fetch_bank(bank_id: UUID):
         st.error(f"Error fetching bank: {str(e)}")
         return None
 
-def submit_readings(cycle_id: UUID, is_ocv: bool, values: list):
-    """Submit readings to API."""
+@st.cache_data(ttl=300)
+def fetch_limits(api_base_url: str):
+    """Fetch the configured limits, including the readings per cycle and the accepted cell voltages."""
     try:
-        reading_data = {
-            "cycle_id": str(cycle_id),
-            "reading_number": 1,  # This should be determined based on existing readings
-            "is_ocv": is_ocv,
-            "cell_values": values
-        }
-        
-        with httpx.Client() as client:
-            response = client.post(
-                f"{st.session_state.api_base_url}/readings",
-                json=reading_data
-            )
+        with api_client() as client:
+            response = client.get(f"{api_base_url}/limits")
             response.raise_for_status()
-            return True, "Readings submitted successfully!"
-    except httpx.HTTPError as e:
-        return False, f"Error submitting readings: {str(e)}"
+            return response.json()
+    except httpx.HTTPError:
+        return {"readings_per_cycle": 5, "cell_voltage_min": 0.0, "cell_voltage_max": 10.0}
+
+def next_reading_number(cycle_id: str) -> int:
+    """The reading number after those stored for a cycle and those still queued in the outbox.
+
+    Kept in the session once known, so editing cells does not refetch it.
+    """
+    if cycle_id not in st.session_state.next_reading_numbers:
+        taken = get_outbox(st.session_state.api_base_url).queued_reading_numbers(cycle_id)
+        try:
+            with api_client() as client:
+                # One cell per reading is enough to learn the reading numbers
+                response = client.get(
+                    f"{st.session_state.api_base_url}/readings/cycle/{cycle_id}",
+                    params={"cells": "1-1"}
+                )
+                response.raise_for_status()
+                taken += [reading["reading_number"] for reading in response.json()]
+        except httpx.HTTPError as e:
+            st.error(f"Error fetching readings: {str(e)}")
+            return None
+        st.session_state.next_reading_numbers[cycle_id] = max(taken, default=0) + 1
+    return st.session_state.next_reading_numbers[cycle_id]
 
-def create_reading_grid(num_cells: int, num_cols: int = 10):
+def submit_readings(cycle_id: UUID, reading_number: int, is_ocv: bool, values: list, label: str):
+    """Queue readings in the local outbox; they are sent to the API in the background."""
+    reading_data = {
+        "cycle_id": str(cycle_id),
+        "reading_number": reading_number,
+        "is_ocv": is_ocv,
+        "cell_values": values
+    }
+    get_outbox(st.session_state.api_base_url).submit(label, reading_data)
+    return True, "Readings queued for sending"
+
+def current_cycle(cycles: list):
+    """Pick the cycle in progress now, else the latest that has started, else the first."""
+    if not cycles:
+        return None
+    now = datetime.now()
+    ordered = sorted(cycles, key=lambda c: c["cycle_number"])
+    started = [c for c in ordered if datetime.fromisoformat(c["start_time"]) <= now]
+    for cycle in started:
+        if not cycle["end_time"] or now < datetime.fromisoformat(cycle["end_time"]):
+            return cycle
+    return started[-1] if started else ordered[0]
+
+def create_reading_grid(num_cells: int, limits: dict, num_cols: int = 10):
     """Create a grid for entering cell readings."""
     num_rows = (num_cells + num_cols - 1) // num_cols
     
@@ -81,8 +136,8 @@ def create_reading_grid(num_cells: int, num_cols: int = 10):
                 with cols[col]:
                     st.session_state.reading_values[cell_index] = st.number_input(
                         f"Cell {cell_index + 1}",
-                        min_value=0.0,
-                        max_value=10.0,
+                        min_value=limits["cell_voltage_min"],
+                        max_value=limits["cell_voltage_max"],
                         value=st.session_state.reading_values[cell_index],
                         step=0.001,
                         format="%.3f"
@@ -91,6 +146,8 @@ def create_reading_grid(num_cells: int, num_cols: int = 10):
 def show_reading_summary():
     """Show summary statistics for the readings."""
     if st.session_state.reading_values:
+        import numpy as np
+
         values = np.array(st.session_state.reading_values)
         stats = {
             "Minimum": np.min(values),
@@ -111,15 +168,107 @@ def show_reading_summary():
         with col4:
             st.metric("Std Dev", f"{stats['Standard Deviation']:.3f}V")
 
+@st.fragment
+def reading_entry(bank):
+    """Reading type, cell grid, summary and submit; editing a cell reruns only this section."""
+    st.markdown("### Enter Readings")
+    cycle = current_cycle(bank["cycles"])
+    reading_number = next_reading_number(cycle["id"]) if cycle else None
+    limits = fetch_limits(st.session_state.api_base_url)
+    readings_per_cycle = limits["readings_per_cycle"]
+    reading_type = st.radio(
+        "Reading Type",
+        options=["OCV", "CCV"],
+        # The first reading of a cycle is the OCV
+        index=0 if reading_number == 1 else 1,
+        horizontal=True
+    )
+    
+    # Create reading grid
+    create_reading_grid(bank["number_of_cells"], limits)
+    
+    # Show summary
+    show_reading_summary()
+    
+    if reading_number:
+        st.caption(
+            f"Recording reading {reading_number} of {readings_per_cycle} "
+            f"for cycle {cycle['cycle_number']} of {len(bank['cycles'])}"
+        )
+    
+    # Submit button
+    if st.button("Submit Readings", type="primary", use_container_width=True):
+        if not cycle:
+            st.error("This bank has no scheduled cycles")
+        elif reading_number is None:
+            st.error("Could not determine the next reading number")
+        elif reading_number > readings_per_cycle:
+            st.error(f"All {readings_per_cycle} readings of cycle {cycle['cycle_number']} are recorded")
+        elif all(v != 0 for v in st.session_state.reading_values):
+            success, message = submit_readings(
+                cycle["id"],
+                reading_number,
+                reading_type == "OCV",
+                st.session_state.reading_values,
+                f"{st.session_state.current_test['job_number']} bank {bank['bank_number']} "
+                f"cycle {cycle['cycle_number']} reading {reading_number} {reading_type}"
+            )
+            if success:
+                st.success(message)
+                st.session_state.reading_values = []
+                st.session_state.next_reading_numbers[cycle["id"]] = reading_number + 1
+            else:
+                st.error(message)
+        else:
+            # Zero marks a cell that was not measured
+            st.error("All cells must have non-zero readings")
+
+@st.fragment(run_every=OUTBOX_REFRESH_SECONDS)
+def outbox_status():
+    """Queued, sent and failed submissions, refreshed on a timer."""
+    outbox = get_outbox(st.session_state.api_base_url)
+    counts = outbox.counts()
+    st.markdown("### Submissions")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Queued", counts["queued"])
+    with col2:
+        st.metric("Sent", counts["sent"])
+    with col3:
+        st.metric("Failed", counts["failed"])
+
+    recent = outbox.recent()
+    if recent:
+        st.dataframe(
+            [
+                {
+                    "Reading": entry["label"],
+                    "Queued At": datetime.fromtimestamp(entry["created_at"]).strftime("%H:%M:%S"),
+                    "Status": entry["status"],
+                    "Attempts": entry["attempts"],
+                    "Flagged Cells": ", ".join(map(str, entry["flagged_cells"])),
+                    "Error": entry["error"] or "",
+                }
+                for entry in recent
+            ],
+            hide_index=True,
+            use_container_width=True
+        )
+    if counts["failed"] and st.button("Retry Failed"):
+        outbox.retry_failed()
+        st.rerun(scope="fragment")
+
 # Page header
 st.title("Test Readings")
 
 # Test selection
-tests = []  # This should be fetched from API
+query = st.text_input("Search Tests", placeholder="Job number or customer name")
+tests = search_tests(query) if query else []
+test_labels = {test["id"]: f"{test['job_number']} - {test['customer_name']}" for test in tests}
 test_id = st.selectbox(
     "Select Test",
-    options=[test["id"] for test in tests] if tests else [],
-    format_func=lambda x: next((t["job_number"] for t in tests if t["id"] == x), x)
+    options=list(test_labels),
+    format_func=test_labels.get
 )
 
 if test_id:
@@ -147,33 +296,6 @@ if test_id:
                 bank = next((b for b in test["banks"] if b["id"] == bank_id), None)
                 if bank:
                     st.session_state.current_bank = bank
-                    
-                    # Reading input
-                    st.markdown("### Enter Readings")
-                    reading_type = st.radio(
-                        "Reading Type",
-                        options=["OCV", "CCV"],
-                        horizontal=True
-                    )
-                    
-                    # Create reading grid
-                    create_reading_grid(bank["number_of_cells"])
-                    
-                    # Show summary
-                    show_reading_summary()
-                    
-                    # Submit button
-                    if st.button("Submit Readings", type="primary", use_container_width=True):
-                        if all(v > 0 for v in st.session_state.reading_values):
-                            success, message = submit_readings(
-                                bank["cycles"][0]["id"],  # This should be the current cycle
-                                reading_type == "OCV",
-                                st.session_state.reading_values
-                            )
-                            if success:
-                                st.success(message)
-                                st.session_state.reading_values = []
-                            else:
-                                st.error(message)
-                        else:
-                            st.error("All cells must have readings greater than 0") 
\ No newline at end of file
+                    reading_entry(bank)
+
+outbox_status()
@@ -1,10 +1,10 @@
 import streamlit as st
 import httpx
-import pandas as pd
 from datetime import datetime
 from uuid import UUID
 import io
-import numpy as np
+
+from api import api_client
 
 # Configure page
 st.set_page_config(
@@ -13,21 +13,24 @@ st.set_page_config(
     layout="wide"
 )
 
-def fetch_tests():
-    """Fetch all tests from API."""
+def search_tests(query: str, limit: int = 20):
+    """Search tests by job number or customer name."""
     try:
-        with httpx.Client() as client:
-            response = client.get(f"{st.session_state.api_base_url}/tests")
+        with api_client() as client:
+            response = client.get(
+                f"{st.session_state.api_base_url}/tests/search",
+                params={"q": query, "limit": limit}
+            )
             response.raise_for_status()
             return response.json()
     except httpx.HTTPError as e:
-        st.error(f"Error fetching tests: {str(e)}")
+        st.error(f"Error searching tests: {str(e)}")
         return []
 
 def fetch_test(test_id: UUID):
     """Fetch test details from API."""
     try:
-        with httpx.Client() as client:
+        with api_client() as client:
             response = client.get(f"{st.session_state.api_base_url}/tests/{test_id}")
             response.raise_for_status()
             return response.json()
@@ -35,19 +38,173 @@ def fetch_test(test_id: UUID):
         st.error(f"Error fetching test: {str(e)}")
         return None
 
-def fetch_readings(cycle_id: UUID):
-    """Fetch readings for a cycle."""
+@st.cache_data(ttl=300)
+def fetch_limits(api_base_url: str):
+    """Fetch the configured limits, including the most cells one request may ask for."""
     try:
-        with httpx.Client() as client:
-            response = client.get(f"{st.session_state.api_base_url}/readings/cycle/{cycle_id}")
+        with api_client() as client:
+            response = client.get(f"{api_base_url}/limits")
             response.raise_for_status()
             return response.json()
+    except httpx.HTTPError:
+        return {"cell_page_size": 500}
+
+def fetch_readings(cycle_id: UUID, number_of_cells: int):
+    """Fetch readings for a cycle, one page of cells at a time."""
+    page_size = fetch_limits(st.session_state.api_base_url)["cell_page_size"]
+    try:
+        readings = {}
+        with api_client() as client:
+            for first in range(1, number_of_cells + 1, page_size):
+                last = min(first + page_size - 1, number_of_cells)
+                response = client.get(
+                    f"{st.session_state.api_base_url}/readings/cycle/{cycle_id}",
+                    params={"cells": f"{first}-{last}"}
+                )
+                response.raise_for_status()
+                for reading in response.json():
+                    merged = readings.setdefault(reading["id"], {**reading, "cell_values": []})
+                    merged["cell_values"].extend(reading["cell_values"])
+        return list(readings.values())
     except httpx.HTTPError as e:
         st.error(f"Error fetching readings: {str(e)}")
         return []
 
+def fetch_final_report(test_id: UUID):
+    """Fetch the report stored when a completed test finished."""
+    try:
+        with api_client() as client:
+            response = client.get(f"{st.session_state.api_base_url}/reports/final/{test_id}")
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPError as e:
+        st.error(f"Error fetching stored report: {str(e)}")
+        return None
+
+def fetch_statistics(url: str):
+    """Fetch the stored statistics of a bank."""
+    try:
+        with api_client() as client:
+            response = client.get(url)
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPError as e:
+        st.error(f"Error fetching statistics: {str(e)}")
+        return None
+
+def fetch_series(bank_id: UUID, first_cell: int, last_cell: int, points: int = 300):
+    """Fetch downsampled voltage series for a range of cells."""
+    try:
+        with api_client() as client:
+            response = client.get(
+                f"{st.session_state.api_base_url}/banks/{bank_id}/series",
+                params={"cells": f"{first_cell}-{last_cell}", "points": points}
+            )
+            response.raise_for_status()
+            return response.json()["cells"]
+    except httpx.HTTPError as e:
+        st.error(f"Error fetching series: {str(e)}")
+        return []
+
+def show_cell_chart(bank):
+    """Plot voltage over time for a few cells from server-side downsampled series."""
+    import pandas as pd
+
+    st.markdown("### Cell Voltage Over Time")
+    col1, col2 = st.columns(2)
+    with col1:
+        first_cell = st.number_input("First cell", min_value=1, max_value=bank["number_of_cells"], value=1)
+    with col2:
+        last_cell = st.number_input(
+            "Last cell",
+            min_value=first_cell,
+            max_value=min(first_cell + 19, bank["number_of_cells"]),
+            value=min(first_cell + 4, bank["number_of_cells"])
+        )
+    series = fetch_series(bank["id"], first_cell, last_cell)
+    if series:
+        df = pd.DataFrame([
+            {"Time": timestamp, "Voltage": voltage, "Cell": f"Cell {cell['cell_number']}"}
+            for cell in series
+            for timestamp, voltage in zip(cell["timestamps"], cell["voltages"])
+        ])
+        df["Time"] = pd.to_datetime(df["Time"])
+        st.line_chart(df, x="Time", y="Voltage", color="Cell")
+
+def request_report(test_id: UUID, bank_id: UUID, report_format: str):
+    """Queue a full report for background rendering."""
+    try:
+        with api_client() as client:
+            response = client.post(
+                f"{st.session_state.api_base_url}/reports",
+                json={"test_id": str(test_id), "bank_id": str(bank_id), "format": report_format}
+            )
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPError as e:
+        st.error(f"Error requesting report: {str(e)}")
+        return None
+
+def fetch_report_job(job_id: str):
+    """Fetch the status of a report job."""
+    try:
+        with api_client() as client:
+            response = client.get(f"{st.session_state.api_base_url}/reports/{job_id}")
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPError as e:
+        st.error(f"Error fetching report status: {str(e)}")
+        return None
+
+def download_report(url: str):
+    """Download a finished report."""
+    try:
+        with api_client() as client:
+            response = client.get(url)
+            response.raise_for_status()
+            return response.content
+    except httpx.HTTPError as e:
+        st.error(f"Error downloading report: {str(e)}")
+        return None
+
+def show_full_report(test, bank):
+    """Request a CSV/XLSX/PDF report rendered by the backend and offer it for download."""
+    st.markdown("### Full Report")
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        report_format = st.selectbox("Format", options=["csv", "xlsx", "pdf"], key="report_format")
+    with col2:
+        st.write("")
+        if st.button("Generate Report", use_container_width=True):
+            job = request_report(test["id"], bank["id"], report_format)
+            if job:
+                st.session_state.report_job = job["id"]
+
+    job_id = st.session_state.get("report_job")
+    if not job_id:
+        return
+    job = fetch_report_job(job_id)
+    if not job:
+        return
+    if job["status"] == "completed":
+        content = download_report(job["download_url"])
+        if content:
+            st.download_button(
+                label=f"📥 Download {job['format'].upper()} Report",
+                data=content,
+                file_name=f"{test['job_number']}_bank{bank['bank_number']}_report.{job['format']}",
+                use_container_width=True
+            )
+    elif job["status"] == "failed":
+        st.error(f"Report failed: {job['error']}")
+    else:
+        st.progress(job["progress"], text="Rendering report...")
+        st.button("Refresh status")
+
 def generate_csv(test, bank, readings):
     """Generate CSV report for a bank."""
+    import pandas as pd
+
     # Create buffer
     output = io.StringIO()
     
@@ -104,12 +261,14 @@ def generate_csv(test, bank, readings):
 st.title("Test Reports")
 
 # Test selection
-tests = fetch_tests()
+query = st.text_input("Search Tests", placeholder="Job number or customer name")
+tests = search_tests(query) if query else []
 if tests:
+    test_labels = {test["id"]: f"{test['job_number']} - {test['customer_name']}" for test in tests}
     test_id = st.selectbox(
         "Select Test",
-        options=[test["id"] for test in tests],
-        format_func=lambda x: next((f"{t['job_number']} - {t['customer_name']}" for t in tests if t["id"] == x), x)
+        options=list(test_labels),
+        format_func=test_labels.get
     )
     
     if test_id:
@@ -144,16 +303,27 @@ if tests:
                         - **Number of Cells**: {bank['number_of_cells']}
                         """)
                         
-                        # Get readings for all cycles
-                        all_readings = []
-                        for cycle in bank["cycles"]:
-                            readings = fetch_readings(cycle["id"])
-                            all_readings.extend(readings)
+                        # Completed tests are served from the report stored at completion
+                        final_bank = None
+                        if test["status"] == "completed":
+                            final_report = fetch_final_report(test_id)
+                            if final_report:
+                                final_bank = next((b for b in final_report["banks"] if b["bank_id"] == bank_id), None)
                         
-                        if all_readings:
-                            # Generate CSV
-                            csv_data = generate_csv(test, bank, all_readings)
-                            
+                        statistics = None
+                        if final_bank:
+                            csv_data = download_report(final_bank["report_url"])
+                            csv_data = csv_data.decode() if csv_data else None
+                            statistics = fetch_statistics(final_bank["statistics_url"])
+                        else:
+                            # Get readings for all cycles
+                            all_readings = []
+                            for cycle in bank["cycles"]:
+                                readings = fetch_readings(cycle["id"], bank["number_of_cells"])
+                                all_readings.extend(readings)
+                            csv_data = generate_csv(test, bank, all_readings) if all_readings else None
+                        
+                        if csv_data:
                             # Download button
                             st.download_button(
                                 label="📥 Download CSV Report",
@@ -163,29 +333,44 @@ if tests:
                                 use_container_width=True
                             )
                             
+                            show_full_report(test, bank)
+                            
                             # Preview data
+                            import pandas as pd
+
                             st.markdown("### Data Preview")
-                            df = pd.read_csv(io.StringIO(csv_data))
+                            # Skip the metadata header and blank line above the table
+                            df = pd.read_csv(io.StringIO(csv_data), skiprows=9)
                             st.dataframe(df, use_container_width=True)
                             
                             # Show statistics
                             st.markdown("### Statistics")
-                            col1, col2 = st.columns(2)
-                            
-                            with col1:
-                                st.markdown("#### OCV Statistics")
-                                ocv_stats = df["OCV"].describe()
-                                st.dataframe(ocv_stats)
+                            if statistics:
+                                st.dataframe(
+                                    pd.DataFrame(statistics["readings"]).set_index("reading"),
+                                    use_container_width=True
+                                )
+                            else:
+                                col1, col2 = st.columns(2)
+                                
+                                with col1:
+                                    st.markdown("#### OCV Statistics")
+                                    ocv_stats = df["OCV"].describe()
+                                    st.dataframe(ocv_stats)
+                                
+                                with col2:
+                                    st.markdown("#### CCV Statistics")
+                                    ccv_cols = [col for col in df.columns if col.startswith("CCV")]
+                                    if ccv_cols:
+                                        ccv_stats = df[ccv_cols].mean().describe()
+                                        st.dataframe(ccv_stats)
                             
-                            with col2:
-                                st.markdown("#### CCV Statistics")
-                                ccv_cols = [col for col in df.columns if col.startswith("CCV")]
-                                if ccv_cols:
-                                    ccv_stats = df[ccv_cols].mean().describe()
-                                    st.dataframe(ccv_stats)
+                            show_cell_chart(bank)
                         else:
                             st.warning("No readings found for this bank.")
             else:
                 st.warning("No banks found for this test.")
+elif query:
+    st.info("No tests match your search.")
 else:
-    st.info("No tests found. Create a new test to generate reports.") 
\ No newline at end of file
+    st.info("Search by job number or customer name to generate a report.") 
\ No newline at end of file
@@ -1,7 +1,8 @@
 import streamlit as st
 import httpx
 from datetime import datetime, date, time
-import json
+
+from api import api_client
 
 # Configure page
 st.set_page_config(
@@ -26,6 +27,19 @@ if "test_setup_form" not in st.session_state:
         "start_time": time(hour=8, minute=0)
     }
 
+@st.cache_data(ttl=300)
+def fetch_limits(api_base_url: str):
+    """Fetch the configured bank, cell and cycle limits."""
+    try:
+        with api_client() as client:
+            response = client.get(f"{api_base_url}/limits")
+            response.raise_for_status()
+            return response.json()
+    except httpx.HTTPError:
+        return {"max_banks_per_test": 2, "max_cells_per_bank": 200, "max_cycles_per_test": 5}
+
+limits = fetch_limits(st.session_state.api_base_url)
+
 def calculate_discharge_current(cell_rate: float, percentage_capacity: float) -> float:
     """Calculate discharge current based on cell rate and percentage capacity."""
     return (percentage_capacity * cell_rate) / 100
@@ -37,46 +51,31 @@ def create_test():
     # Combine date and time
     start_datetime = datetime.combine(form["start_date"], form["start_time"])
     
-    # Prepare test data
+    # Prepare test data with its bank; cycles are generated by the backend
     test_data = {
         "job_number": form["job_number"],
         "customer_name": form["customer_name"],
         "number_of_cycles": form["number_of_cycles"],
         "time_interval": form["time_interval"],
         "start_date": start_datetime.isoformat(),
-        "start_time": start_datetime.isoformat()
-    }
-    
-    # Prepare bank data
-    bank_data = {
-        "bank_number": form["bank_number"],
-        "cell_type": form["cell_type"],
-        "cell_rate": form["cell_rate"],
-        "percentage_capacity": form["percentage_capacity"],
-        "number_of_cells": form["number_of_cells"],
-        "discharge_current": calculate_discharge_current(
-            form["cell_rate"],
-            form["percentage_capacity"]
-        )
+        "start_time": start_datetime.isoformat(),
+        "banks": [{
+            "bank_number": form["bank_number"],
+            "cell_type": form["cell_type"],
+            "cell_rate": form["cell_rate"],
+            "percentage_capacity": form["percentage_capacity"],
+            "number_of_cells": form["number_of_cells"],
+        }]
     }
     
     try:
-        with httpx.Client() as client:
-            # Create test
+        with api_client() as client:
+            # Create the test and its bank in one transaction
             response = client.post(
-                f"{st.session_state.api_base_url}/tests",
+                f"{st.session_state.api_base_url}/tests/full",
                 json=test_data
             )
             response.raise_for_status()
-            test = response.json()
-            
-            # Create bank with test ID
-            bank_data["test_id"] = test["id"]
-            response = client.post(
-                f"{st.session_state.api_base_url}/banks",
-                json=bank_data
-            )
-            response.raise_for_status()
             
             return True, "Test created successfully!"
     except httpx.HTTPError as e:
@@ -148,7 +147,7 @@ with col1:
     st.session_state.test_setup_form["number_of_cells"] = st.number_input(
         "Number of Cells",
         min_value=10,
-        max_value=200,
+        max_value=limits["max_cells_per_bank"],
         value=st.session_state.test_setup_form["number_of_cells"]
     )
 
@@ -156,16 +155,16 @@ with col2:
     st.session_state.test_setup_form["number_of_cycles"] = st.number_input(
         "Number of Test Cycles",
         min_value=1,
-        max_value=5,
+        max_value=limits["max_cycles_per_test"],
         value=st.session_state.test_setup_form["number_of_cycles"]
     )
 
 with col3:
-    st.session_state.test_setup_form["bank_number"] = st.radio(
+    st.session_state.test_setup_form["bank_number"] = st.number_input(
         "Bank Number",
-        options=[1, 2],
-        index=st.session_state.test_setup_form["bank_number"] - 1,
-        horizontal=True
+        min_value=1,
+        max_value=limits["max_banks_per_test"],
+        value=st.session_state.test_setup_form["bank_number"]
     )
 
 # Schedule
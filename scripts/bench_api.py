@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime
+
+import httpx
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from run import backend_command, parse_args as parse_run_args, wait_until_ready
+
+async def hammer(client: httpx.AsyncClient, method: str, url: str, payload_factory, duration: float, latencies: list,
+                 client_id: str):
+    """Issue requests back to back until the duration elapses, as one bench."""
+    headers = {"X-Client-Id": client_id}
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        payload = payload_factory() if payload_factory else None
+        if isinstance(payload, bytes):
+            response = await client.request(
+                method, url, content=payload, headers={**headers, "Content-Type": "application/octet-stream"}
+            )
+        else:
+            response = await client.request(method, url, json=payload, headers=headers)
+        if response.status_code < 400:
+            latencies.append(time.perf_counter() - started)
+
+async def run_load(base_url: str, method: str, path: str, payload_factory, concurrency: int, duration: float):
+    latencies = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30.0) as client:
+        await asyncio.gather(*(
+            hammer(client, method, path, payload_factory, duration, latencies, f"bench-{worker}")
+            for worker in range(concurrency)
+        ))
+    latencies.sort()
+    if not latencies:
+        return 0.0, 0.0, 0.0
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)] * 1000
+    return len(latencies) / duration, p50, p99
+
+def seed(base_url: str, cells: int):
+    """Create a throwaway test and bank to benchmark against; returns (test_id, cycle_id)."""
+    now = datetime.now().isoformat()
+    with httpx.Client(base_url=base_url, timeout=30.0) as client:
+        test = client.post("/api/v1/tests", json={
+            "job_number": f"BENCH-{uuid.uuid4().hex[:8]}",
+            "customer_name": "Benchmark",
+            "number_of_cycles": 1,
+            "time_interval": 1,
+            "start_date": now,
+            "start_time": now,
+        }).raise_for_status().json()
+        bank = client.post("/api/v1/banks", json={
+            "test_id": test["id"],
+            "bank_number": 1,
+            "cell_type": "KPL",
+            "cell_rate": 100,
+            "percentage_capacity": 20,
+            "number_of_cells": cells,
+        }).raise_for_status().json()
+        cycle = client.get(f"/api/v1/banks/{bank['id']}").raise_for_status().json()["cycles"][0]
+    return test["id"], cycle["id"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure API throughput across worker counts")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to compare")
+    parser.add_argument("--test-id", help="Test used for the read benchmark (a new one is created if omitted)")
+    parser.add_argument("--cycle-id", help="Cycle used for the ingest benchmark")
+    parser.add_argument("--cells", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=8001)
+    args = parser.parse_args()
+
+    reading_number = iter(range(1, 10**9))
+
+    def reading_payload():
+        return {
+            "cycle_id": args.cycle_id,
+            "reading_number": next(reading_number),
+            "is_ocv": False,
+            "cell_values": [round(random.uniform(1.1, 1.4), 3) for _ in range(args.cells)],
+        }
+
+    def binary_payload():
+        return np.random.uniform(1.1, 1.4, args.cells).astype("<f4").tobytes()
+
+    print(f"{'workers':>7} {'scenario':>8} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for workers in [int(w) for w in args.workers.split(",")]:
+        run_args = parse_run_args(["--prod", "--workers", str(workers), "--port", str(args.port)])
+        server = subprocess.Popen(backend_command(run_args), cwd="backend")
+        try:
+            if not wait_until_ready(args.port):
+                print(f"Backend with {workers} workers did not become healthy", file=sys.stderr)
+                continue
+            base_url = f"http://127.0.0.1:{args.port}"
+            if not args.test_id:
+                args.test_id, args.cycle_id = seed(base_url, args.cells)
+            scenarios = [("read", "GET", f"/api/v1/tests/{args.test_id}", None)]
+            if args.cycle_id:
+                scenarios.append(("ingest", "POST", "/api/v1/readings", reading_payload))
+                binary_path = f"/api/v1/readings/binary?cycle_id={args.cycle_id}&reading_number=2&is_ocv=false"
+                scenarios.append(("ingest-bin", "POST", binary_path, binary_payload))
+            for name, method, path, payload_factory in scenarios:
+                rps, p50, p99 = asyncio.run(
+                    run_load(base_url, method, path, payload_factory, args.concurrency, args.duration)
+                )
+                print(f"{workers:>7} {name:>8} {rps:>10.1f} {p50:>8.1f} {p99:>8.1f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
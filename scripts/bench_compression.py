@@ -0,0 +1,67 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+# The bench issues requests back to back from one client
+os.environ.setdefault("ADMISSION_ENABLED", "false")
+
+from app.core.compression import CODECS
+from app.core.config import settings
+from app.main import app
+
+async def cpu_ms(client: httpx.AsyncClient, url: str, encoding: str, repeat: int) -> tuple:
+    """CPU time of the first request and the mean of `repeat` more, and the body size on the wire."""
+    headers = {"Accept-Encoding": encoding}
+
+    async def fetch() -> tuple:
+        started = time.process_time()
+        size = 0
+        async with client.stream("GET", url, headers=headers) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_raw():
+                size += len(chunk)
+        return (time.process_time() - started) * 1000, size, response.headers.get("content-encoding", "identity")
+
+    first, size, served = await fetch()
+    total = 0.0
+    for _ in range(repeat):
+        total += (await fetch())[0]
+    return first, total / repeat, size, served
+
+async def bench(args) -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120.0) as client:
+        endpoints = [("test tree (streamed)", f"{settings.API_V1_STR}/tests/{args.test_id}")]
+        if args.completed_test_id:
+            response = await client.get(f"{settings.API_V1_STR}/reports/final/{args.completed_test_id}")
+            response.raise_for_status()
+            bank = response.json()["banks"][0]
+            endpoints += [
+                ("report.csv (file)", httpx.URL(bank["report_url"]).path),
+                ("series.json (file)", httpx.URL(bank["series_url"]).path),
+            ]
+
+        print(f"{'endpoint':<22} {'encoding':>8} {'served':>8} {'size KiB':>9} {'first ms':>9} {'repeat ms':>10}")
+        for name, url in endpoints:
+            for encoding in ["identity", *CODECS]:
+                first, repeat, size, served = await cpu_ms(client, url, encoding, args.repeat)
+                print(f"{name:<22} {encoding:>8} {served:>8} {size / 1024:>9.0f} {first:>9.2f} {repeat:>10.2f}")
+    print("ms = CPU time in this process per request, database and serialization included")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="CPU time per request of the streamed test tree and stored report files for each encoding"
+    )
+    parser.add_argument("--test-id", required=True, help="Test served by GET /tests/{id}")
+    parser.add_argument("--completed-test-id", help="Completed test whose stored report files are fetched")
+    parser.add_argument("--repeat", type=int, default=20)
+    asyncio.run(bench(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
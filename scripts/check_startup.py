@@ -0,0 +1,99 @@
+import argparse
+import ast
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from run import backend_command, parse_args as parse_run_args
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def import_time_ms(code: str, cwd: str) -> tuple:
+    """Run code under -X importtime and return (total ms, slowest top-level modules)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        # Import time records keep interleaving with the traceback, so skip them
+        errors = [line for line in result.stderr.splitlines() if line.strip() and not line.startswith("import time:")]
+        raise RuntimeError(errors[-1] if errors else f"exited with status {result.returncode}")
+
+    # Lines look like "import time:   self [us] | cumulative | imported package"
+    top_level = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            top_level.append((int(cumulative) / 1000, name.strip()))
+    top_level.sort(reverse=True)
+    return sum(ms for ms, _ in top_level), top_level[:5]
+
+def page_imports(path: str) -> str:
+    """Extract a Streamlit page's module-level imports without running the page."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    return "\n".join(
+        ast.unparse(node) for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+def time_to_first_response(port: int, timeout: float = 60.0) -> float:
+    """Start a backend worker and time until it serves a database-backed request."""
+    run_args = parse_run_args(["--prod", "--workers", "1", "--port", str(port)])
+    started = time.perf_counter()
+    server = subprocess.Popen(backend_command(run_args), cwd=os.path.join(ROOT, "backend"))
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/api/v1/tests?limit=1", timeout=1.0)
+                if response.status_code == 200:
+                    return (time.perf_counter() - started) * 1000
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.05)
+        raise RuntimeError("backend did not respond in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="Check cold-start import and first-response budgets")
+    parser.add_argument("--backend-budget-ms", type=float, default=1500.0)
+    parser.add_argument("--page-budget-ms", type=float, default=800.0)
+    parser.add_argument("--first-response-budget-ms", type=float, default=5000.0)
+    parser.add_argument("--first-response", action="store_true", help="Also start the backend and time its first response")
+    parser.add_argument("--port", type=int, default=8002)
+    args = parser.parse_args()
+
+    checks = [("backend app.main", "import app.main", os.path.join(ROOT, "backend"), args.backend_budget_ms)]
+    pages_dir = os.path.join(ROOT, "frontend", "pages")
+    for page in ["Home.py"] + [os.path.join("pages", name) for name in sorted(os.listdir(pages_dir)) if name.endswith(".py")]:
+        code = page_imports(os.path.join(ROOT, "frontend", page))
+        checks.append((f"frontend {page}", code, os.path.join(ROOT, "frontend"), args.page_budget_ms))
+
+    failed = False
+    for name, code, cwd, budget in checks:
+        total, slowest = import_time_ms(code, cwd)
+        status = "ok" if total <= budget else "OVER BUDGET"
+        failed |= total > budget
+        print(f"{name:<32} {total:8.1f} ms (budget {budget:.0f} ms) {status}")
+        for ms, module in slowest:
+            print(f"    {module:<28} {ms:8.1f} ms")
+
+    if args.first_response:
+        elapsed = time_to_first_response(args.port)
+        status = "ok" if elapsed <= args.first_response_budget_ms else "OVER BUDGET"
+        failed |= elapsed > args.first_response_budget_ms
+        print(f"{'first response':<32} {elapsed:8.1f} ms (budget {args.first_response_budget_ms:.0f} ms) {status}")
+
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
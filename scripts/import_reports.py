@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import csv
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import insert, select
+
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.app.core.config import settings
+from backend.app.db.base import make_engine
+from backend.app.db.models import Test, Bank, Cycle, Reading, CellValue, Change, CellType, TestStatus
+from backend.app.services.analysis import detect_anomalies
+
+# Metadata rows of a report, as written by generate_csv and the report renderer
+METADATA_FIELDS = {
+    "Job Number": ("job_number", str),
+    "Customer Name": ("customer_name", str),
+    "Bank Number": ("bank_number", int),
+    "Cell Type": ("cell_type", str),
+    "Cell Rate": ("cell_rate", float),
+    "Percentage Capacity": ("percentage_capacity", float),
+    "Discharge Current": ("discharge_current", float),
+    "Number of Cells": ("number_of_cells", int),
+}
+
+# Discharge current is derived from rate and capacity when blank
+REQUIRED_FIELDS = {"Job Number", "Bank Number", "Cell Type", "Cell Rate", "Percentage Capacity", "Number of Cells"}
+
+def find_reports(paths: List[str]) -> List[str]:
+    """CSV files named on the command line or found under named directories."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.lower().endswith(".csv"))
+        else:
+            files.append(path)
+    return sorted(files)
+
+def read_job_number(path: str) -> Optional[str]:
+    """Job number from a report's first line, None if the file is not a report."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        row = next(csv.reader(f), [])
+    return row[1].strip() if len(row) >= 2 and row[0] == "Job Number" else None
+
+def _finish_bank(path: str, bank: dict, columns: List[str], rows: List[List[str]]) -> dict:
+    missing = [label for label, (name, _) in METADATA_FIELDS.items() if name not in bank and label in REQUIRED_FIELDS]
+    if missing:
+        raise ValueError(f"{path}: bank is missing {', '.join(missing)}")
+    if bank["cell_type"] not in {cell_type.value for cell_type in CellType}:
+        raise ValueError(f"{path}: unknown cell type {bank['cell_type']!r}")
+    if not columns:
+        raise ValueError(f"{path}: bank {bank['bank_number']} has no readings table")
+    try:
+        cells = np.asarray([int(row[0]) for row in rows], dtype=np.int64)
+        matrix = np.asarray(
+            [[float(value) if value.strip() else np.nan for value in row[1:len(columns) + 1]] for row in rows],
+            dtype=np.float64,
+        ).reshape(len(rows), len(columns))
+    except ValueError as exc:
+        raise ValueError(f"{path}: bad readings table ({exc})") from None
+
+    # Each OCV column starts a cycle; the CCV columns after it are that cycle's readings
+    cycles, previous_ccv = [], None
+    for index, label in enumerate(columns):
+        is_ocv = label.startswith("OCV")
+        if is_ocv or not cycles:
+            cycles.append([])
+            previous_ccv = None
+        values = matrix[:, index]
+        measured = ~np.isnan(values)
+        flags = np.zeros(values.size, dtype=np.int64)
+        if measured.any():
+            flags[measured] = detect_anomalies(
+                values[measured], previous_ccv[measured] if previous_ccv is not None else None
+            )
+        cycles[-1].append({"is_ocv": is_ocv, "cells": cells[measured], "values": values[measured], "flags": flags[measured]})
+        if not is_ocv:
+            previous_ccv = values
+    return {**bank, "cycles": cycles}
+
+def parse_report(path: str) -> List[dict]:
+    """Banks in one report file, each with its readings split into cycles and anomaly flags."""
+    banks, bank, columns, rows = [], None, [], []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.reader(f):
+            if not row or not any(value.strip() for value in row):
+                continue
+            key = row[0].strip()
+            if key == "Job Number":
+                if bank is not None:
+                    banks.append(_finish_bank(path, bank, columns, rows))
+                bank, columns, rows = {}, [], []
+            if bank is None:
+                raise ValueError(f"{path}: does not start with a Job Number row")
+            if key in METADATA_FIELDS:
+                name, convert = METADATA_FIELDS[key]
+                value = row[1].strip() if len(row) > 1 else ""
+                if value:
+                    try:
+                        bank[name] = convert(float(value)) if convert is int else convert(value)
+                    except ValueError:
+                        raise ValueError(f"{path}: bad {key} {value!r}") from None
+            elif key == "Cell Number":
+                columns = [label.strip() for label in row[1:]]
+            else:
+                rows.append(row)
+    if bank is None:
+        raise ValueError(f"{path}: empty file")
+    banks.append(_finish_bank(path, bank, columns, rows))
+    return banks
+
+def parse_job(paths: List[str]) -> dict:
+    """Parse every report of one job into a single test; runs in a worker process."""
+    banks: Dict[int, dict] = {}
+    for path in paths:
+        for bank in parse_report(path):
+            banks.setdefault(bank["bank_number"], bank)
+    first = next(iter(banks.values()))
+    return {
+        "job_number": first["job_number"],
+        "customer_name": first.get("customer_name", ""),
+        "started": datetime.fromtimestamp(min(os.path.getmtime(path) for path in paths)),
+        "files": len(paths),
+        "banks": [banks[number] for number in sorted(banks)],
+    }
+
+def build_rows(job: dict, time_interval: int) -> dict:
+    """Rows for every table of one parsed job, laid out like the cycle scheduler would."""
+    test_id = uuid.uuid4()
+    readings_per_cycle = max(
+        [settings.READINGS_PER_CYCLE] + [len(cycle) for bank in job["banks"] for cycle in bank["cycles"]]
+    )
+    interval = timedelta(hours=time_interval)
+    cycle_length = interval * readings_per_cycle
+    start = job["started"]
+    rows = {"tests": [], "banks": [], "cycles": [], "readings": [], "cell_values": [], "cells": 0}
+    rows["tests"].append((
+        test_id, job["job_number"], job["customer_name"], start, start,
+        max(len(bank["cycles"]) for bank in job["banks"]), time_interval,
+        TestStatus.COMPLETED.value, datetime.utcnow(),
+    ))
+    for bank in job["banks"]:
+        bank_id = uuid.uuid4()
+        discharge_current = bank.get("discharge_current") or bank["cell_rate"] * bank["percentage_capacity"] / 100
+        rows["banks"].append((
+            bank_id, test_id, bank["bank_number"], bank["cell_type"], bank["cell_rate"],
+            bank["percentage_capacity"], discharge_current, bank["number_of_cells"],
+        ))
+        for cycle_number, readings in enumerate(bank["cycles"], start=1):
+            cycle_id = uuid.uuid4()
+            cycle_start = start + cycle_length * (cycle_number - 1)
+            rows["cycles"].append((
+                cycle_id, bank_id, cycle_number, "discharge", cycle_start,
+                cycle_start + cycle_length, int(cycle_length.total_seconds() // 60),
+            ))
+            for reading_number, reading in enumerate(readings, start=1):
+                reading_id = uuid.uuid4()
+                rows["readings"].append((
+                    reading_id, cycle_id, reading_number,
+                    cycle_start + interval * (reading_number - 1), reading["is_ocv"],
+                ))
+                rows["cell_values"].extend(
+                    (uuid.uuid4(), reading_id, cell, value, flags)
+                    for cell, value, flags in zip(
+                        reading["cells"].tolist(), reading["values"].tolist(), reading["flags"].tolist()
+                    )
+                )
+                rows["cells"] += reading["values"].size
+    return rows
+
+TABLE_COLUMNS = {
+    "tests": (Test, ["id", "job_number", "customer_name", "start_date", "start_time",
+                     "number_of_cycles", "time_interval", "status", "created_at"]),
+    "banks": (Bank, ["id", "test_id", "bank_number", "cell_type", "cell_rate",
+                     "percentage_capacity", "discharge_current", "number_of_cells"]),
+    "cycles": (Cycle, ["id", "bank_id", "cycle_number", "reading_type", "start_time", "end_time", "duration"]),
+    "readings": (Reading, ["id", "cycle_id", "reading_number", "timestamp", "is_ocv"]),
+    "cell_values": (CellValue, ["id", "reading_id", "cell_number", "value", "flags"]),
+}
+
+async def copy_rows(conn, model, columns: List[str], rows: List[tuple]) -> None:
+    """Bulk load rows with COPY on PostgreSQL, or one executemany INSERT elsewhere."""
+    if not rows:
+        return
+    if conn.dialect.name == "postgresql":
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(model.__tablename__, records=rows, columns=columns)
+    else:
+        await conn.execute(insert(model), [dict(zip(columns, row)) for row in rows])
+
+async def load_jobs(engine, jobs: List[dict], time_interval: int) -> int:
+    """Load parsed jobs in one transaction; returns the number of cell values written."""
+    if not jobs:
+        return 0
+    tables = {name: [] for name in TABLE_COLUMNS}
+    cells = 0
+    for job in jobs:
+        rows = build_rows(job, time_interval)
+        cells += rows.pop("cells")
+        for name, table_rows in rows.items():
+            tables[name].extend(table_rows)
+    async with engine.begin() as conn:
+        for name, (model, columns) in TABLE_COLUMNS.items():
+            await copy_rows(conn, model, columns, tables[name])
+        # Let change feed clients pick up the imported tests
+        await conn.execute(insert(Change), [
+            {"entity_type": "test", "entity_id": row[0], "operation": "insert", "changed_at": datetime.utcnow()}
+            for row in tables["tests"]
+        ])
+    return cells
+
+async def import_reports(args) -> None:
+    files = find_reports(args.paths)
+    groups: Dict[str, List[str]] = {}
+    skipped = 0
+    for path in files:
+        job_number = read_job_number(path)
+        if job_number is None:
+            skipped += 1
+        else:
+            groups.setdefault(job_number, []).append(path)
+
+    engine = make_engine(settings.DATABASE_URL)
+    # Jobs already in the database were imported by an earlier, possibly interrupted, run
+    async with engine.connect() as conn:
+        existing = set((await conn.execute(select(Test.job_number))).scalars().all())
+    pending = [paths for job_number, paths in groups.items() if job_number not in existing]
+    print(f"{len(files)} files, {len(groups)} jobs: {len(groups) - len(pending)} already imported, "
+          f"{len(pending)} to import, {skipped} files are not reports")
+
+    batches = [pending[i:i + args.batch_size] for i in range(0, len(pending), args.batch_size)]
+    loaded_files = loaded_cells = failed = 0
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        def submit(batch):
+            return [loop.run_in_executor(executor, parse_job, paths) for paths in batch]
+
+        # Parse the next batch while the current one loads
+        upcoming = submit(batches[0]) if batches else []
+        for index in range(len(batches)):
+            futures, upcoming = upcoming, submit(batches[index + 1]) if index + 1 < len(batches) else []
+            jobs = []
+            for future in futures:
+                try:
+                    jobs.append(await future)
+                except ValueError as exc:
+                    failed += 1
+                    print(f"Skipped job: {exc}", file=sys.stderr)
+            try:
+                loaded_cells += await load_jobs(engine, jobs, args.time_interval)
+                loaded_files += sum(job["files"] for job in jobs)
+            except Exception as exc:
+                # The batch was rolled back; load its jobs one by one so only the bad ones are lost
+                print(f"Batch {index + 1} failed to load ({str(exc).splitlines()[0]}); retrying job by job",
+                      file=sys.stderr)
+                for job in jobs:
+                    try:
+                        loaded_cells += await load_jobs(engine, [job], args.time_interval)
+                        loaded_files += job["files"]
+                    except Exception as job_exc:
+                        failed += 1
+                        print(f"Skipped job {job['job_number']}: {str(job_exc).splitlines()[0]}", file=sys.stderr)
+            elapsed = time.perf_counter() - started
+            print(f"batch {index + 1}/{len(batches)}: {loaded_files} files, {loaded_cells} cells, "
+                  f"{loaded_files / elapsed:.1f} files/s, {loaded_cells / elapsed:.0f} cells/s")
+    await engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    print(f"Imported {loaded_files} files ({loaded_cells} cells) in {elapsed:.1f}s; {failed} jobs failed")
+
+def main():
+    parser = argparse.ArgumentParser(description="Import historical CSV reports as completed tests")
+    parser.add_argument("paths", nargs="+", help="Report files or directories searched for *.csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Parsing processes")
+    parser.add_argument("--batch-size", type=int, default=100, help="Jobs loaded per transaction")
+    parser.add_argument("--time-interval", type=int, default=1, choices=[1, 2],
+                        help="Hours between readings, which reports do not record")
+    args = parser.parse_args()
+    asyncio.run(import_reports(args))
+
+if __name__ == "__main__":
+    main()
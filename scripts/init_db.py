@@ -1,6 +1,6 @@
 import asyncio
 import os
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy import text
 from alembic.config import Config
 from alembic import command
 import sys
@@ -9,21 +9,28 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from backend.app.core.config import settings
-from backend.app.db.base import Base
+from backend.app.db.base import Base, is_sqlite, make_engine
+from backend.app.db import models  # noqa: F401  registers the tables on Base.metadata
 
 async def init_db():
     """Initialize the database."""
     # Create async engine
-    engine = create_async_engine(settings.DATABASE_URL)
+    engine = make_engine(settings.DATABASE_URL)
+    embedded = is_sqlite(settings.DATABASE_URL)
     
     # Create all tables
     async with engine.begin() as conn:
+        if not embedded:
+            # Trigram indexes on tests need pg_trgm
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
         await conn.run_sync(Base.metadata.drop_all)
         await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
     
-    # Run Alembic migrations
-    alembic_cfg = Config("backend/alembic.ini")
-    command.upgrade(alembic_cfg, "head")
+    # Run Alembic migrations; an embedded database is always created from the current models
+    if not embedded:
+        alembic_cfg = Config("backend/alembic.ini")
+        command.upgrade(alembic_cfg, "head")
 
 if __name__ == "__main__":
     asyncio.run(init_db()) 
\ No newline at end of file
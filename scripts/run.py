@@ -1,23 +1,95 @@
+import argparse
+import importlib.util
+import os
 import subprocess
 import sys
-import os
+import time
 from concurrent.futures import ThreadPoolExecutor
 
-def run_backend():
+import httpx
+
+BACKEND_PORT = 8000
+
+def default_workers() -> int:
+    """One async worker per core; each one already serves many requests concurrently."""
+    return os.cpu_count() or 1
+
+def backend_command(args) -> list:
+    """Build the command line for the backend server."""
+    if not args.prod:
+        return [sys.executable, "-m", "uvicorn", "app.main:app", "--reload", "--port", str(args.port)]
+
+    # Gunicorn gives us preloading and worker recycling with jitter; it is not available on Windows
+    if sys.platform != "win32" and importlib.util.find_spec("gunicorn"):
+        return [
+            sys.executable, "-m", "gunicorn", "app.main:app",
+            "--worker-class", "uvicorn.workers.UvicornWorker",
+            "--workers", str(args.workers),
+            "--bind", f"0.0.0.0:{args.port}",
+            "--preload",
+            "--max-requests", str(args.max_requests),
+            "--max-requests-jitter", str(max(args.max_requests // 10, 1)),
+            "--graceful-timeout", str(args.graceful_timeout),
+            "--keep-alive", "5",
+        ]
+
+    command = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "0.0.0.0",
+        "--port", str(args.port),
+        "--workers", str(args.workers),
+        "--limit-max-requests", str(args.max_requests),
+        "--timeout-graceful-shutdown", str(args.graceful_timeout),
+        "--no-access-log",
+    ]
+    if importlib.util.find_spec("uvloop"):
+        command += ["--loop", "uvloop"]
+    if importlib.util.find_spec("httptools"):
+        command += ["--http", "httptools"]
+    return command
+
+def wait_until_ready(port: int, timeout: float = 60.0) -> bool:
+    """Poll the health endpoint until the backend accepts requests."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    return False
+
+def run_backend(args):
     """Run the FastAPI backend server."""
-    os.chdir("backend")
-    subprocess.run([sys.executable, "-m", "uvicorn", "app.main:app", "--reload", "--port", "8000"])
+    # The backend splits its connection pool and report processes across the workers
+    env = {**os.environ, "WEB_CONCURRENCY": str(args.workers if args.prod else 1)}
+    subprocess.run(backend_command(args), cwd="backend", env=env)
+
+def run_frontend(args):
+    """Run the Streamlit frontend once the backend is ready."""
+    if not wait_until_ready(args.port):
+        print(f"Backend did not become healthy on port {args.port}", file=sys.stderr)
+        return
+    subprocess.run([sys.executable, "-m", "streamlit", "run", "Home.py"], cwd="frontend")
 
-def run_frontend():
-    """Run the Streamlit frontend."""
-    os.chdir("frontend")
-    subprocess.run([sys.executable, "-m", "streamlit", "run", "Home.py"])
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Battery Test Application")
+    parser.add_argument("--prod", action="store_true", help="Run multiple backend workers without autoreload")
+    parser.add_argument("--backend-only", action="store_true", help="Do not start the Streamlit frontend")
+    parser.add_argument("--port", type=int, default=BACKEND_PORT)
+    parser.add_argument("--workers", type=int, default=default_workers())
+    parser.add_argument("--max-requests", type=int, default=10000, help="Recycle a worker after this many requests")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="Seconds to drain in-flight requests on SIGTERM")
+    return parser.parse_args(argv)
 
 def main():
     """Run both servers concurrently."""
+    args = parse_args()
     with ThreadPoolExecutor(max_workers=2) as executor:
-        executor.submit(run_backend)
-        executor.submit(run_frontend)
+        executor.submit(run_backend, args)
+        if not args.backend_only:
+            executor.submit(run_frontend, args)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()